@@ -88,12 +88,46 @@ class PuzzleAction(Action):
         return f"Move {self.move.name}"
 
 class EightPuzzleProblem(Problem):
+    # Formato degli stati codificati, per salvarli su disco
+    key_format = '9B'
     initial_state = PuzzleState((7, 2, 4, 5, 0, 6, 8, 3, 1))
 
     def possible_actions(self, state: PuzzleState):
         for i in PuzzleMoves:
             yield PuzzleAction(i)
 
+    def encode_state(self, state: PuzzleState) -> tuple[int, ...]:
+        return state.slots
+
+    def decode_state(self, key: tuple[int, ...]) -> PuzzleState:
+        return PuzzleState(key)
+
+    def state_count(self) -> int:
+        # Tutte le permutazioni delle 9 caselle
+        return 362880
+
+    def rank_state(self, state: PuzzleState) -> int:
+        # Codice di Lehmer della permutazione
+        rank = 0
+        slots = state.slots
+        for i in range(9):
+            smaller = 0
+            for j in range(i + 1, 9):
+                if slots[j] < slots[i]:
+                    smaller += 1
+            rank = rank * (9 - i) + smaller
+        return rank
+
+    def unrank_state(self, rank: int) -> PuzzleState:
+        digits = []
+        for base in range(1, 10):
+            rank, d = divmod(rank, base)
+            digits.append(d)
+        digits.reverse()
+
+        remaining = list(range(9))
+        return PuzzleState([remaining.pop(d) for d in digits])
+
 def misplaced_tiles(state: PuzzleState):
     h = 0
     for i, v in enumerate(state.slots):
@@ -101,13 +135,6 @@ def misplaced_tiles(state: PuzzleState):
             h += 1
     return h
 
-print("Solving with h(n) = number of misplaced tiles")
-problem = EightPuzzleProblem(misplaced_tiles)
-sol1 = problem.astar(show=False)
-if sol1 is None: print("  No solution found!")
-else: print(f"Solution is {len(sol1)} steps")
-
-
 def total_manhattan_distance(state: PuzzleState):
     h = 0
     for i, v in enumerate(state.slots):
@@ -115,17 +142,39 @@ def total_manhattan_distance(state: PuzzleState):
         ax, ay = PuzzleAction.index_to_coords(v - 1 if v != 0 else 8)
         h += abs(x - ax) + abs(y - ay)
     return h
-print()
-print("Solving with h(n) = total Manhattan distance")
-problem = EightPuzzleProblem(total_manhattan_distance)
-sol2 = problem.astar(show=False)
-if sol2 is None: print("  No solution found!")
-else: 
-    print(f"Best solution in {len(sol2)} steps:")
-    state = problem.initial_state
-    for i, a in enumerate(sol2):
-        state = a.apply(state)
-        print(f"{i:3}) {a}")
-
-        sstr = '\n     '.join(str(state).split(' || '))
-        print("     " + sstr)
\ No newline at end of file
+
+
+def total_manhattan_distance_batch(packed):
+    """Versione vettoriale di `total_manhattan_distance`, per `batch_heuristic`"""
+    import numpy as np
+    # Posizione di arrivo di ogni casella (la vuota va in fondo)
+    target = np.where(packed == 0, 8, packed - 1)
+    index = np.arange(9)
+    return (np.abs(index % 3 - target % 3) + np.abs(index // 3 - target // 3)).sum(axis=1)
+
+
+def main():
+    print("Solving with h(n) = number of misplaced tiles")
+    problem = EightPuzzleProblem(misplaced_tiles)
+    sol1 = problem.astar(show=False)
+    if sol1 is None: print("  No solution found!")
+    else: print(f"Solution is {len(sol1)} steps")
+
+    print()
+    print("Solving with h(n) = total Manhattan distance")
+    problem = EightPuzzleProblem(total_manhattan_distance)
+    sol2 = problem.astar(show=False)
+    if sol2 is None: print("  No solution found!")
+    else: 
+        print(f"Best solution in {len(sol2)} steps:")
+        state = problem.initial_state
+        for i, a in enumerate(sol2):
+            state = a.apply(state)
+            print(f"{i:3}) {a}")
+
+            sstr = '\n     '.join(str(state).split(' || '))
+            print("     " + sstr)
+
+
+if __name__ == "__main__":
+    main()
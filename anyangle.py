@@ -0,0 +1,350 @@
+# Percorsi a qualsiasi angolo sui labirinti (Theta* e Lazy Theta*)
+#
+# I percorsi di `LabirinthProblem` sono fatti di mosse tra caselle vicine;
+# qui invece un percorso è una lista di punti di passaggio (centri delle
+# caselle) uniti da segmenti in linea retta, con costo pari alla loro
+# lunghezza. Theta* è A* sulle stesse caselle, ma quando raggiunge una
+# casella prova a collegarla direttamente al predecessore dello stato
+# espanso, se tra i due c'è visibilità. Lazy Theta* fa la stessa cosa
+# assumendo che la visibilità ci sia, e la controlla solo quando la
+# casella viene estratta dalla frontiera: i controlli calano molto.
+#
+#   waypoints = theta_star(problem, lazy=True)
+#
+#   python anyangle.py --size 128
+import argparse
+import contextlib
+import heapq
+import io
+import math
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from labirinth import MOVES, LabAction, LabirinthProblem
+
+if TYPE_CHECKING:
+    import numpy as np
+
+Point_t = tuple[int, int]
+
+
+class LineOfSight:
+    """
+    Visibilità tra le caselle di un labirinto.
+
+    Un segmento tra i centri di due caselle è libero se tutte le caselle
+    che attraversa sono libere: vengono trovate con una traversata alla
+    Bresenham in aritmetica intera, vettoriale su tutte le colonne (o
+    righe) del segmento. Se il segmento passa esattamente per l'angolo
+    tra quattro caselle, con `corner_cutting` (come le mosse diagonali di
+    `LabAction`) le due caselle ai lati non contano, altrimenti devono
+    essere libere anche loro.
+
+    I risultati vengono tenuti in una cache LRU per coppia di caselle;
+    se la mappa cambia va chiamata `clear`.
+    """
+    free: 'np.ndarray'
+    width: int
+    height: int
+    corner_cutting: bool
+    max_entries: int
+    # Visibilità per coppia di indici di casella (y * width + x), il minore prima
+    cache: OrderedDict[tuple[int, int], bool]
+    stats: dict[str, int]
+
+    def __init__(self, labirinth, corner_cutting=True, max_entries: int = 1 << 16):
+        import numpy as np
+        self.free = np.asarray(labirinth) == 0
+        self.height, self.width = self.free.shape
+        self.corner_cutting = corner_cutting
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.stats = {'checks': 0, 'hits': 0, 'misses': 0}
+
+    def clear(self):
+        self.cache.clear()
+
+    def cells(self, a: Point_t, b: Point_t) -> tuple['np.ndarray', 'np.ndarray']:
+        """Ritorna le coordinate (x, y) delle caselle attraversate dal segmento tra `a` e `b`"""
+        import numpy as np
+        x0, y0 = a
+        x1, y1 = b
+        # Asse principale lungo x, con dx > 0 e dy >= 0: le altre
+        # direzioni vengono riflesse e le caselle riportate indietro
+        steep = abs(y1 - y0) > abs(x1 - x0)
+        if steep:
+            x0, y0, x1, y1 = y0, x0, y1, x1
+        flip_x, flip_y = x1 < x0, y1 < y0
+        if flip_x:
+            x0, x1 = -x0 - 1, -x1 - 1
+        if flip_y:
+            y0, y1 = -y0 - 1, -y1 - 1
+        dx, dy = x1 - x0, y1 - y0
+
+        cols = np.arange(x0, x1 + 1)
+        if dx == 0:
+            xs, ys = cols, np.array([y0])
+        else:
+            # La y del segmento in X vale num / (2 dx), con
+            # num = base + dy * 2X: bordi sinistro e destro di ogni colonna
+            # (il primo e l'ultimo partono e finiscono al centro)
+            den = 2 * dx
+            base = (2 * y0 + 1) * dx - dy * (2 * x0 + 1)
+            left = 2 * cols
+            left[0] = 2 * x0 + 1
+            right = 2 * cols + 2
+            right[-1] = 2 * x1 + 1
+            num_left = base + dy * left
+            low = num_left // den
+            high = -(-(base + dy * right) // den) - 1
+            # Con pendenza al più 1, ogni colonna attraversa una o due righe
+            xs, ys = np.concatenate((cols, cols)), np.concatenate((low, high))
+            if not self.corner_cutting and dy > 0:
+                corner = (num_left % den == 0) & (cols > x0)
+                cx, cy = cols[corner], low[corner]
+                xs = np.concatenate((xs, cx - 1, cx))
+                ys = np.concatenate((ys, cy, cy - 1))
+
+        if flip_x:
+            xs = -xs - 1
+        if flip_y:
+            ys = -ys - 1
+        return (ys, xs) if steep else (xs, ys)
+
+    def visible(self, a: Point_t, b: Point_t) -> bool:
+        """Ritorna se il segmento tra i centri delle caselle `a` e `b` non tocca muri"""
+        self.stats['checks'] += 1
+        free = self.free
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        if -1 <= dx <= 1 and -1 <= dy <= 1:
+            # Caselle vicine: nessuna casella in mezzo, NumPy costerebbe più del controllo
+            if not (free[a[1], a[0]] and free[b[1], b[0]]):
+                return False
+            return bool(self.corner_cutting or dx == 0 or dy == 0
+                        or (free[a[1], b[0]] and free[b[1], a[0]]))
+
+        w = self.width
+        ra, rb = a[1] * w + a[0], b[1] * w + b[0]
+        key = (ra, rb) if ra <= rb else (rb, ra)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.stats['hits'] += 1
+            return cached
+
+        self.stats['misses'] += 1
+        xs, ys = self.cells(a, b)
+        result = bool(free[ys, xs].all())
+        self.cache[key] = result
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return result
+
+
+def distance(a: Point_t, b: Point_t) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def path_length(waypoints: list[Point_t]) -> float:
+    """Lunghezza del percorso tra i punti di passaggio"""
+    return sum(distance(a, b) for a, b in zip(waypoints, waypoints[1:]))
+
+
+def line_of_sight(problem: LabirinthProblem, max_entries: int = 1 << 16) -> LineOfSight:
+    """Crea la visibilità per il labirinto del problema, con le sue regole sulle diagonali"""
+    return LineOfSight(problem.labirinth, problem.allow_diagonal, max_entries)
+
+
+def theta_star(problem: LabirinthProblem, lazy=False,
+               los: LineOfSight = None) -> list[Point_t] | None:
+    """
+    Cerca un percorso a qualsiasi angolo dalla posizione iniziale del
+    problema a `end_pos`, con Theta* o (con `lazy=True`) Lazy Theta*.
+
+    + `los`: visibilità da usare, da condividere tra più ricerche sulla
+                stessa mappa per riusarne la cache (di default ne viene
+                creata una con `line_of_sight`)
+
+    Le caselle vicine sono quelle delle mosse del problema (con o senza
+    diagonali), e l'euristica è la distanza in linea retta dall'arrivo.
+    Riporta i punti di passaggio, dalla partenza all'arrivo compresi,
+    oppure `None` se l'arrivo non è raggiungibile; le statistiche della
+    ricerca finiscono in `problem.stats`.
+    """
+    if problem.terrain is not None:
+        raise ValueError("Any-angle search does not support terrain costs")
+    if los is None:
+        los = line_of_sight(problem)
+    checks, hits = los.stats['checks'], los.stats['hits']
+
+    start = (problem.initial_state.x, problem.initial_state.y)
+    goal = problem.end_pos
+    free = problem.labirinth
+    w, h = problem.width, problem.height
+    moves = [(dx, dy) for name, (dx, dy, _, _) in MOVES.items()
+             if problem.allow_diagonal or '-' not in name]
+
+    def is_free(cell: Point_t) -> bool:
+        x, y = cell
+        return 0 <= x < w and 0 <= y < h and free[y][x] == 0
+
+    def neighbours(cell: Point_t):
+        x, y = cell
+        for dx, dy in moves:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h and free[ny][nx] == 0:
+                yield nx, ny
+
+    start_time = time.perf_counter()
+    expanded = 0
+    g: dict[Point_t, float] = {start: 0.0}
+    parent: dict[Point_t, Point_t] = {start: start}
+    closed: set[Point_t] = set()
+    # Frontiera come heap di (f, ordine di inserimento, casella)
+    fringe = [(distance(start, goal), 0, start)]
+    inserted = 1
+    found = False
+    # Partenza o arrivo su un muro (o fuori dalla mappa): nessun percorso
+    if is_free(start) and is_free(goal) and not problem.is_unreachable(problem.initial_state):
+        while fringe:
+            cell = heapq.heappop(fringe)[2]
+            if cell in closed:
+                continue
+            if lazy and not los.visible(parent[cell], cell):
+                # La visibilità assunta non c'è: il predecessore diventa
+                # il migliore tra i vicini già espansi
+                g[cell], parent[cell] = min((g[n] + distance(n, cell), n)
+                                            for n in neighbours(cell) if n in closed)
+            if cell == goal:
+                found = True
+                break
+            closed.add(cell)
+            expanded += 1
+
+            for n in neighbours(cell):
+                if n in closed:
+                    continue
+                p = parent[cell]
+                if not lazy and not los.visible(p, n):
+                    p = cell
+                new_g = g[p] + distance(p, n)
+                if new_g < g.get(n, math.inf):
+                    g[n] = new_g
+                    parent[n] = p
+                    heapq.heappush(fringe, (new_g + distance(n, goal), inserted, n))
+                    inserted += 1
+
+    waypoints = None
+    if found:
+        waypoints = [goal]
+        while waypoints[-1] != start:
+            waypoints.append(parent[waypoints[-1]])
+        waypoints.reverse()
+    problem.stats = {
+        'expanded': expanded,
+        'elapsed': time.perf_counter() - start_time,
+        'cost': g[goal] if found else None,
+        'waypoints': len(waypoints) if found else 0,
+        'los_checks': los.stats['checks'] - checks,
+        'los_hits': los.stats['hits'] - hits,
+    }
+    return waypoints
+
+
+def smooth_path(los: LineOfSight, start: Point_t, actions: list[LabAction]) -> list[Point_t]:
+    """
+    Riduce un percorso di `LabAction` a punti di passaggio, saltando
+    ogni casella da cui la successiva è visibile dall'ultimo punto tenuto
+    (per confronto con `theta_star`, che non ha bisogno di questo passo).
+    """
+    positions = [start]
+    x, y = start
+    for a in actions:
+        x, y = x + a.dx, y + a.dy
+        positions.append((x, y))
+
+    waypoints = [start]
+    for i in range(1, len(positions) - 1):
+        if not los.visible(waypoints[-1], positions[i + 1]):
+            waypoints.append(positions[i])
+    if len(positions) > 1:
+        waypoints.append(positions[-1])
+    return waypoints
+
+
+def encode_waypoints(waypoints: list[Point_t]) -> str:
+    """Codifica i punti di passaggio in forma compatta, ad esempio `0,0;12,5;31,31`"""
+    return ";".join(f"{x},{y}" for x, y in waypoints)
+
+
+def decode_waypoints(encoded: str) -> list[Point_t]:
+    """Ricostruisce i punti di passaggio codificati con `encode_waypoints`"""
+    return [tuple(int(v) for v in p.split(",")) for p in encoded.split(";")] if encoded else []
+
+
+def render_waypoints(labirinth, waypoints: list[Point_t], los: LineOfSight) -> str:
+    """Disegna il percorso sul labirinto: `o` per i punti di passaggio, `·` per i segmenti"""
+    path: dict[Point_t, str] = {}
+    for a, b in zip(waypoints, waypoints[1:]):
+        xs, ys = los.cells(a, b)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            path[(x, y)] = "·"
+    for p in waypoints:
+        path[p] = "o"
+
+    lines = []
+    for y, row in enumerate(labirinth):
+        lines.append("".join(path.get((x, y), "█" if n == 1 else " ") for x, n in enumerate(row)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from benchmark import maze_labirinth, random_labirinth, rooms_labirinth
+
+    parser = argparse.ArgumentParser(description="Compare grid A* paths with Theta* and Lazy Theta*")
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show", action="store_true", help="draw the Lazy Theta* paths")
+    args = parser.parse_args(argv)
+
+    size = args.size
+    maze_end = ((size - 1) // 2 * 2, (size - 1) // 2 * 2)
+    maps = {
+        "random": (random_labirinth(size, size, density=0.2, seed=args.seed), (size - 1, size - 1)),
+        "rooms": (rooms_labirinth(size, size, seed=args.seed), (size - 1, size - 1)),
+        "maze": (maze_labirinth(size, size, seed=args.seed), maze_end),
+    }
+    for name, (lab, end_pos) in maps.items():
+        def heuristic(state):
+            return math.floor(math.hypot(state.x - end_pos[0], state.y - end_pos[1]))
+        problem = LabirinthProblem(lab, heuristic, end_pos, (0, 0), allow_diagonal=True)
+
+        # Percorso sulla griglia, poi ridotto a punti di passaggio
+        los = line_of_sight(problem)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            actions = problem.astar(show=False)
+        if actions is None:
+            print(f"{name:<7} no path")
+            continue
+        smoothed = smooth_path(los, (0, 0), actions)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<7} {'grid+smooth':<12} length={path_length(smoothed):8.1f} "
+              f"waypoints={len(smoothed):<5} steps={len(actions):<5} "
+              f"los={los.stats['checks']:<6} {elapsed * 1000:8.1f} ms")
+
+        for mode, lazy in (("theta*", False), ("lazy-theta*", True)):
+            los = line_of_sight(problem)
+            waypoints = theta_star(problem, lazy, los)
+            stats = problem.stats
+            print(f"{name:<7} {mode:<12} length={stats['cost']:8.1f} "
+                  f"waypoints={stats['waypoints']:<5} expanded={stats['expanded']:<6} "
+                  f"los={stats['los_checks']:<6} hits={stats['los_hits']:<6} "
+                  f"{stats['elapsed'] * 1000:8.1f} ms")
+            if args.show and lazy:
+                print(render_waypoints(lab, waypoints, los))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 from abc import abstractmethod
-from typing import Callable, Generator
+from typing import TYPE_CHECKING, Callable, Generator, Iterable
+import heapq
+import math
 import time
 
+if TYPE_CHECKING:
+    import numpy as np
+    from checkpoint import Checkpointer
+    from profiling import SearchProfiler
+
 class State:
     parent: 'State' = None  # Stato di partenza per arrivare a questo stato
     action: 'Action' = None  # Azione per passare da parent a questo stato
 
     h: int = 0 # La salvo per non doverla ricalcolare ad ogni iterazione
+    g: int = 0 # Costo del percorso per arrivare a questo stato
+    seq: int = 0 # Ordine di inserimento nella frontiera
 
     @abstractmethod
     def is_invalid(self) -> bool:
@@ -38,13 +47,46 @@ class Action:
 CostFunction_t = Callable[[State], int]
 
 
+# Criteri per scegliere tra stati con lo stesso f(n): ognuno riporta
+# una chiave secondaria da minimizzare
+TIE_BREAKS: dict[str, CostFunction_t] = {
+    'high-g': lambda s: -s.g,   # Preferisci gli stati più lontani dalla partenza
+    'low-h': lambda s: s.h,     # Preferisci gli stati più vicini all'arrivo
+    'fifo': lambda s: s.seq,    # Preferisci gli stati inseriti prima
+    'lifo': lambda s: -s.seq,   # Preferisci gli stati inseriti dopo
+}
+
+
+def tie_break_cost(cost: CostFunction_t, tie_break: str | tuple[str, ...] = None) -> CostFunction_t:
+    """
+    Estende la funzione di costo con i criteri di spareggio dati
+    (un nome di `TIE_BREAKS` o una tupla di nomi, applicati in ordine).
+    """
+    if not tie_break:
+        return cost
+    if isinstance(tie_break, str):
+        tie_break = (tie_break,)
+    keys = [TIE_BREAKS[name] for name in tie_break]
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda s: (cost(s), key(s))
+    return lambda s: (cost(s), *[key(s) for key in keys])
+
+
+# Strategie di ricerca di `Problem.solve`
+STRATEGIES = ('astar', 'weighted', 'greedy', 'beam')
+
+
 class StatePQueue:
     array: list[State]
     cost: CostFunction_t
+    # Numero di inserimenti fatti, usato per l'ordine FIFO/LIFO
+    inserted: int
 
     def __init__(self, cost: CostFunction_t):
         self.array = []
         self.cost = cost
+        self.inserted = 0
 
     def is_root(self, i: int) -> bool:
         return i == 0
@@ -77,6 +119,8 @@ class StatePQueue:
         self[b] = temp
 
     def insert(self, state: State):
+        state.seq = self.inserted
+        self.inserted += 1
         # Trova il nuovo ultimo nodo in cui aggiungere il nuovo elemento
         w = len(self.array)
         # Inserisci l'elemento nella posizione trovata
@@ -84,6 +128,15 @@ class StatePQueue:
         # Ripristina la proprietà di ordinamento con UpHeap sul nuovo nodo
         self._upheap(w)
 
+    def snapshot(self) -> list[State]:
+        """Ritorna gli stati nell'ordine interno della coda, per `restore`"""
+        return list(self.array)
+
+    def restore(self, states: list[State], inserted: int):
+        """Ricostruisce la coda esattamente com'era al momento di `snapshot`"""
+        self.array = list(states)
+        self.inserted = inserted
+
     def _upheap(self, z: int):
         # Ripristina la proprietà di min-heap dopo l'inserimento
         if self.is_root(z):
@@ -126,6 +179,9 @@ class StatePQueue:
     def empty(self):
         return len(self.array) == 0
 
+    def __len__(self):
+        return len(self.array)
+
     def __str__(self):
         s = ""
         for i in self.array:
@@ -133,6 +189,117 @@ class StatePQueue:
         return s
 
 
+class BucketOverflow(Exception):
+    """Lo stato non può stare in una `BucketPQueue` (f non intero o troppo grande)"""
+
+
+# Valore massimo di f gestito dalla coda a bucket
+BUCKET_LIMIT = 1 << 16
+
+
+class BucketPQueue:
+    """
+    Coda di priorità a bucket per costi interi piccoli.
+
+    Gli stati sono divisi in bucket per f = g + h e, dentro ogni bucket,
+    per h: inserimento ed estrazione non richiedono confronti, e tra
+    stati con lo stesso f viene estratto prima quello con h minore
+    (e tra questi l'ultimo inserito).
+    """
+    # buckets[f][h] è la pila degli stati con quei valori di f e h
+    buckets: list[dict[int, list[State]] | None]
+    limit: int
+    size: int
+    inserted: int
+    # Il bucket non vuoto con f minore è sicuramente >= min_f
+    min_f: int
+
+    def __init__(self, limit: int = BUCKET_LIMIT):
+        self.buckets = []
+        self.limit = limit
+        self.size = 0
+        self.inserted = 0
+        self.min_f = 0
+
+    def fits(self, state: State) -> bool:
+        """Ritorna se lo stato può essere inserito in questa coda"""
+        f, h = state.g + state.h, state.h
+        return type(f) is int and type(h) is int and 0 <= h <= f <= self.limit
+
+    def insert(self, state: State):
+        if not self.fits(state):
+            raise BucketOverflow(state)
+        state.seq = self.inserted
+        self.inserted += 1
+        self._place(state)
+
+    def _place(self, state: State):
+        f = state.g + state.h
+        while len(self.buckets) <= f:
+            self.buckets.append(None)
+        bucket = self.buckets[f]
+        if bucket is None:
+            bucket = self.buckets[f] = {}
+        stack = bucket.get(state.h)
+        if stack is None:
+            bucket[state.h] = [state]
+        else:
+            stack.append(state)
+
+        self.size += 1
+        if f < self.min_f:
+            self.min_f = f
+
+    def remove(self) -> State:
+        while not self.buckets[self.min_f]:
+            self.min_f += 1
+        bucket = self.buckets[self.min_f]
+        h = min(bucket)
+        stack = bucket[h]
+        state = stack.pop()
+        if not stack:
+            del bucket[h]
+        self.size -= 1
+        return state
+
+    def empty(self):
+        return self.size == 0
+
+    def __len__(self):
+        return self.size
+
+    def snapshot(self) -> list[State]:
+        """Ritorna gli stati nell'ordine interno della coda, per `restore`"""
+        return list(self.states())
+
+    def restore(self, states: list[State], inserted: int):
+        """Ricostruisce la coda esattamente com'era al momento di `snapshot`"""
+        for state in states:
+            self._place(state)
+        self.inserted = inserted
+
+    def states(self) -> Generator[State, None, None]:
+        """Ritorna tutti gli stati nella coda, in ordine qualsiasi"""
+        for bucket in self.buckets:
+            if bucket:
+                for stack in bucket.values():
+                    yield from stack
+
+    def to_heap(self, cost: CostFunction_t) -> StatePQueue:
+        """Sposta gli stati in una `StatePQueue` con la funzione di costo data"""
+        heap = StatePQueue(cost)
+        heap.inserted = self.inserted
+        for state in sorted(self.states(), key=lambda s: s.seq):
+            seq = state.seq
+            heap.insert(state)
+            # Mantieni l'ordine di inserimento originale
+            state.seq = seq
+        return heap
+
+    def __str__(self):
+        return " ".join(str(s) for s in self.states())
+
+
 class SState(State):
     def __init__(self, a: int): self.a = a
     def __str__(self): return f"{self.a}"
@@ -142,6 +309,16 @@ class Problem:
     """Definizione del problema di ricerca da risolvere"""
     initial_state: State
     heuristic: CostFunction_t
+    # Criterio di spareggio di default per A* (vedi `TIE_BREAKS`)
+    tie_break: str | tuple[str, ...] = None
+    # Formato `struct` della tupla di `encode_state` (ad esempio '2I'),
+    # necessario per salvare gli stati su disco in record di dimensione fissa
+    key_format: str = None
+    # Euristica vettoriale (opzionale): riceve una matrice NumPy con una
+    # riga per stato, codificata con `encode_state`, e riporta un array di h
+    batch_heuristic: Callable[['np.ndarray'], 'np.ndarray'] = None
+    # Statistiche dell'ultima ricerca eseguita
+    stats: dict[str, float] = {}
 
     def __init__(self, heuristic: CostFunction_t):
         self.heuristic = heuristic
@@ -151,7 +328,158 @@ class Problem:
         """Ritorna le azioni possibili a partire dallo stato dato"""
         return None
 
-    def astar(self, state: State = None, show=True) -> list[Action]:
+    def encode_state(self, state: State) -> tuple:
+        """
+        Ritorna una rappresentazione compatta dello stato (una tupla di
+        interi), senza riferimenti al problema o agli stati precedenti.
+        Serve per spostare gli stati tra processi o salvarli su disco.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot encode its states")
+
+    def decode_state(self, key: tuple) -> State:
+        """Ricostruisce lo stato a partire dalla tupla di `encode_state`"""
+        raise NotImplementedError(f"{type(self).__name__} cannot decode its states")
+
+    def state_count(self) -> int:
+        """Ritorna il numero di indici usati da `rank_state` (da 0 a `state_count() - 1`)"""
+        raise NotImplementedError(f"{type(self).__name__} cannot rank its states")
+
+    def rank_state(self, state: State) -> int:
+        """
+        Ritorna un indice intero univoco per lo stato, compreso tra 0
+        e `state_count() - 1`, usato per indicizzare tabelle compatte.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot rank its states")
+
+    def unrank_state(self, rank: int) -> State:
+        """Ricostruisce lo stato a partire dall'indice di `rank_state`"""
+        raise NotImplementedError(f"{type(self).__name__} cannot rank its states")
+
+    def evaluate_heuristic(self, states: list[State]) -> list[int]:
+        """
+        Calcola l'euristica di una lista di stati, con una sola chiamata
+        a `batch_heuristic` se il problema la definisce.
+        """
+        if self.batch_heuristic is None:
+            return [self.heuristic(s) for s in states]
+
+        import numpy as np
+        packed = np.array([self.encode_state(s) for s in states])
+        # Riporta valori Python, così restano validi per la coda a bucket
+        return np.asarray(self.batch_heuristic(packed)).tolist()
+
+    def is_unreachable(self, state: State) -> bool:
+        """
+        Ritorna se da questo stato è sicuramente impossibile
+        arrivare ad uno stato finale.
+
+        Di default riporta sempre `False`: i problemi che possono
+        scoprirlo in modo economico (ad esempio con un indice
+        precalcolato) la ridefiniscono per evitare una ricerca inutile.
+        """
+        return False
+
+    def has_unit_costs(self) -> bool | None:
+        """
+        Ritorna se tutte le azioni del problema costano 1, oppure `None`
+        se il problema non lo sa dire senza provarle: in quel caso chi
+        ne ha bisogno guarda le azioni di uno stato.
+        """
+        return None
+
+    def walk_back(self, state: State) -> Generator[Action, None, None]:
+        """
+        Ritorna una per volta le azioni che hanno portato allo stato dato,
+        dall'ultima alla prima, senza costruire liste intermedie.
+        """
+        while state.parent != None:
+            yield state.action
+            state = state.parent
+
+    def path_to(self, state: State) -> list[Action]:
+        """Ricostruisce la sequenza di azioni per arrivare allo stato dato"""
+        actions = list(self.walk_back(state))
+        actions.reverse()
+        return actions
+
+    def uniform_cost(self, state: State = None,
+                     targets: set[int] = None) -> dict[int, State]:
+        """
+        Esegue una ricerca a costo uniforme (Dijkstra) a partire da `state`
+        (di default `initial_state`), senza usare l'euristica.
+
+        + `targets`: hash degli stati da raggiungere; la ricerca si ferma
+                     appena sono stati tutti estratti dalla frontiera
+                     (di default esplora tutti gli stati raggiungibili)
+
+        Riporta gli stati estratti, indicizzati per hash, ognuno con il
+        costo minimo `g` e i riferimenti per ricostruirne il percorso.
+        """
+        if not state:
+            state = self.initial_state
+        state.g = 0
+        pending = set(targets) if targets is not None else None
+
+        best_g: dict[int, int] = {hash(state): 0}
+        settled: dict[int, State] = {}
+        fringe: StatePQueue = StatePQueue(lambda s: s.g)
+        fringe.insert(state)
+
+        while not fringe.empty():
+            extracted = fringe.remove()
+            key = hash(extracted)
+            # Lo stato può essere in frontiera più volte: conta solo la prima
+            if key in settled:
+                continue
+            settled[key] = extracted
+
+            if pending is not None:
+                pending.discard(key)
+                if not pending:
+                    break
+
+            for a in self.possible_actions(extracted):
+                new_state = a.apply(extracted)
+                if new_state == None:
+                    continue
+                new_key = hash(new_state)
+                g = extracted.g + a.cost
+                if new_key not in settled and g < best_g.get(new_key, math.inf):
+                    best_g[new_key] = g
+                    new_state.g = g
+                    fringe.insert(new_state)
+
+        return settled
+
+    def search_many(self, goals: Iterable[State],
+                    state: State = None) -> list[tuple[list[Action], int] | None]:
+        """
+        Trova in una sola ricerca i percorsi minimi da `state`
+        (di default `initial_state`) verso ognuno degli stati in `goals`.
+
+        Riporta, nello stesso ordine di `goals`, una coppia
+        (azioni, costo) per ogni obiettivo, oppure `None`
+        per quelli che non è possibile raggiungere.
+        """
+        goals = list(goals)
+        settled = self.uniform_cost(state, {hash(goal) for goal in goals})
+
+        results = []
+        for goal in goals:
+            reached = settled.get(hash(goal))
+            if reached is None:
+                results.append(None)
+            else:
+                results.append((self.path_to(reached), reached.g))
+        return results
+
+    def astar(self, state: State = None, show=True,
+              tie_break: str | tuple[str, ...] = None,
+              queue: str = 'auto', batch_size: int = 1,
+              profiler: 'SearchProfiler' = None, checkpoint: 'str | Checkpointer' = None,
+              checkpoint_interval: float = 60.0, weight: float = 1,
+              deadline: float = None, progress: Callable[[dict[str, float]], None] = None,
+              progress_interval: float = 1.0) -> list[Action]:
         """
         Risolve il problema con A* e riporta il percorso 
         per arrivare alla soluzione come lista di azioni:
@@ -159,6 +487,33 @@ class Problem:
         + `state`: stato dal quale far partire l'algoritmo
                     (di default lo stato definito come `initial_state` per il problema)
         + `show`: se mostrare i passi mentre esegue (default `False`)
+        + `tie_break`: criterio di spareggio tra stati con lo stesso f(n),
+                    tra quelli di `TIE_BREAKS` (di default `self.tie_break`)
+        + `queue`: frontiera da usare: `'heap'`, `'bucket'` (solo con costi ed
+                    euristica interi) oppure `'auto'` (default), che sceglie
+                    la coda a bucket quando è possibile e passa allo heap
+                    appena compare un costo che non vi può stare
+        + `batch_size`: numero di stati estratti insieme dalla frontiera; i loro
+                    successori vengono valutati con una sola chiamata a
+                    `batch_heuristic`, se il problema la definisce (default 1)
+        + `profiler`: `SearchProfiler` con cui misurare le fasi della ricerca
+                    (di default nessuno, e la ricerca non viene strumentata)
+        + `checkpoint`: file (o `Checkpointer`) su cui salvare la ricerca ogni
+                    `checkpoint_interval` secondi; se il file esiste già la
+                    ricerca riprende da lì, e a ricerca completata viene
+                    cancellato (richiede `key_format`, vedi `checkpoint.py`)
+        + `weight`: peso dell'euristica, per A* pesato con f(n) = g(n) + w·h(n)
+                    (default 1): con w > 1 la ricerca espande meno stati, e
+                    se l'euristica è ammissibile la soluzione costa al più
+                    w volte l'ottimo (riportato in `stats['bound']`)
+        + `deadline`: istante (di `time.time()`) oltre il quale la ricerca
+                    viene interrotta: riporta `None`, con `stats['timeout']`
+                    a `True`, e un eventuale salvataggio resta su file
+        + `progress`: funzione chiamata ogni `progress_interval` secondi con
+                    stati espansi, secondi trascorsi, dimensione della
+                    frontiera e f dell'ultimo stato estratto (un limite
+                    inferiore del costo della soluzione), come il
+                    `progress` di `SearchProfiler` ma senza strumentare la ricerca
 
         Riporta un percorso di azioni per arrivare alla soluzione
         a partire dallo stato iniziale passato come ingresso,
@@ -173,76 +528,410 @@ class Problem:
             print("You started in an invalid state")
             return None
 
+        # Scarta subito le richieste che non possono avere soluzione
+        if self.is_unreachable(state):
+            if show: print("The final state is unreachable")
+            return None
+
         # Memorizza gli stati visitati come coppie (hash dello stato, g per lo stato)
         visited_g: dict[int, int] = {hash(state): 0}
-        state.h = self.heuristic(state)
+        state.g = 0
+        state.h = self.evaluate_heuristic([state])[0] * weight
 
         # Frontiera: dove inserire ed estrarre gli stati da analizzare
-        fringe: StatePQueue = StatePQueue(lambda s: s.h + visited_g[hash(s)])
+        if tie_break is None:
+            tie_break = self.tie_break
+        cost = tie_break_cost(lambda s: s.h + s.g, tie_break)
+        fringe: StatePQueue | BucketPQueue = StatePQueue(cost)
+        # La coda a bucket estrae già per h minore e poi LIFO
+        if queue == 'bucket' or (queue == 'auto' and tie_break in (None, 'low-h', ('low-h', 'lifo'))):
+            bucket_fringe = BucketPQueue()
+            if bucket_fringe.fits(state):
+                fringe = bucket_fringe
+            elif queue == 'bucket':
+                raise BucketOverflow(state)
         fringe.insert(state)
 
-        # Oggetto della classe State con i riferimenti per ricostruire il percorso
+        def push(new_state: State):
+            nonlocal fringe
+            try:
+                fringe.insert(new_state)
+            except BucketOverflow:
+                if queue == 'bucket':
+                    raise
+                fringe = fringe.to_heap(cost)
+                if profiler is not None:
+                    profiler.instrument_queue(fringe)
+                fringe.insert(new_state)
+
+        # Con l'euristica a blocchi, gli stati raggiunti aspettano qui
+        # finché non viene calcolata l'euristica di tutto il blocco
+        batched = self.batch_heuristic is not None
+        pending: list[State] = []
+
+        # Oggetto della classe State con i riferimenti per ricostruire il percorso:
+        # con costi diversi tra loro, il primo stato finale raggiunto può non
+        # essere il migliore, e la ricerca continua finché non lo è di sicuro
         final_state: State = None
+        done = False
+        # A* pesato non riapre gli stati già espansi: con l'euristica
+        # gonfiata le riaperture sarebbero moltissime, e il limite
+        # sul costo vale anche senza
+        closed: set[int] | None = set() if weight != 1 else None
+
+        # Le fasi della ricerca passano da riferimenti locali, che il
+        # profiler sostituisce con le versioni misurate (senza toccare le classi,
+        # così le altre ricerche nello stesso processo non ne risentono)
+        possible_actions = self.possible_actions
+        heuristic = self.heuristic
+        evaluate_heuristic = self.evaluate_heuristic
+        state_hash = hash
+        if profiler is not None:
+            profiler.instrument_queue(fringe)
+            possible_actions = profiler.wrap_generator('possible_actions', possible_actions,
+                                                       profiler.instrument_action)
+            state_hash = profiler.wrap('hash', hash)
+            heuristic = profiler.wrap('heuristic', heuristic)
+            evaluate_heuristic = profiler.wrap('heuristic', evaluate_heuristic)
+            profiler.start()
+        if weight != 1:
+            # A* pesato: ogni h viene moltiplicata per il peso
+            plain_heuristic, plain_evaluate = heuristic, evaluate_heuristic
+            heuristic = lambda s: plain_heuristic(s) * weight
+            evaluate_heuristic = lambda states: [h * weight for h in plain_evaluate(states)]
 
         # Tempo impiegato dall'algoritmo (in passi e secondi)
         extracted_count = 0
         start_time = time.perf_counter()
+        timed_out = False
+        # Ultimo stato estratto e istante del prossimo avviso di `progress`
+        extracted = state
+        next_progress = start_time + progress_interval
+
+        checkpointer: 'Checkpointer' = None
+        if checkpoint is not None:
+            from checkpoint import Checkpointer
+            checkpointer = checkpoint if isinstance(checkpoint, Checkpointer) \
+                else Checkpointer(checkpoint, checkpoint_interval)
+            if checkpointer.exists():
+                saved = checkpointer.load(self, cost)
+                if saved['initial_state'] is not None and \
+                        self.encode_state(saved['initial_state']) != self.encode_state(state):
+                    raise ValueError(f"{checkpointer.path} was saved by a search "
+                                     "from a different state")
+                fringe = saved['fringe']
+                if profiler is not None:
+                    profiler.instrument_queue(fringe)
+                visited_g = saved['visited_g']
+                if closed is not None:
+                    # Gli stati visitati senza una voce valida in frontiera sono già stati espansi
+                    closed = set(visited_g).difference(
+                        hash(s) for s in fringe.snapshot() if s.g == visited_g[hash(s)])
+                final_state = saved['final_state']
+                extracted_count = saved['extracted_count']
+                # Il tempo già speso prima dell'interruzione conta nel totale
+                start_time -= saved['elapsed']
+                if show: print(f"Resuming from {checkpointer.path} after {extracted_count} states")
+
+        try:
+            # Finché ci sono stati nella frontiera
+            while not fringe.empty() and not done:
+                if deadline is not None and time.time() > deadline:
+                    timed_out = True
+                    break
+                if progress is not None and time.perf_counter() >= next_progress:
+                    next_progress = time.perf_counter() + progress_interval
+                    progress({'expanded': extracted_count,
+                              'elapsed': time.perf_counter() - start_time,
+                              'fringe': len(fringe), 'f': extracted.g + extracted.h})
+                # Tra due iterazioni tutti gli stati raggiunti sono in frontiera
+                if checkpointer is not None and checkpointer.due():
+                    checkpointer.save(self, fringe, visited_g, final_state, extracted_count,
+                                      time.perf_counter() - start_time)
+
+                block = [fringe.remove()]
+                while len(block) < batch_size and not fringe.empty():
+                    block.append(fringe.remove())
+                # Se lo stato estratto ha ancora f minimo tra quelli da espandere: non
+                # più, nel blocco, appena uno stato precedente genera dei successori
+                # (che possono avere f minore e non sono ancora in frontiera)
+                best = True
+
+                for extracted in block:
+                    # Stato raggiunto di nuovo, in seguito, con un costo minore
+                    if extracted.g > visited_g[state_hash(extracted)]:
+                        continue
+                    # Nessuno stato in frontiera può migliorare la soluzione trovata
+                    if final_state and extracted.g + extracted.h >= final_state.g:
+                        if best:
+                            done = True
+                            break
+                        # Da verificare di nuovo, insieme ai successori appena generati
+                        push(extracted)
+                        continue
+                    generated = False
+
+                    extracted_count += 1
+                    if closed is not None:
+                        closed.add(state_hash(extracted))
+                    if profiler is not None:
+                        profiler.expansion(len(fringe), extracted.g + extracted.h)
 
-        # Finché ci sono stati nella frontiera
-        while not fringe.empty() and not final_state:
-            extracted = fringe.remove()
-            extracted_count += 1
+                    if show:
+                        g = visited_g[state_hash(extracted)]
+                        print()
+                        print(f"Popped n = `{extracted}`")
+                        print(f" with f(n)={g + extracted.h} h(n)={extracted.h} g(n)={g}")
+                        print("Applyable actions:")
+
+                    for a in possible_actions(extracted):
+                        # Prova ad applicare l'azione a allo stato estratto
+                        new_state = a.apply(extracted)
+
+                        # Se questa porta ad uno stato valido
+                        if new_state != None:
+                            if show:
+                                print(f" > {a}")
+                            new_g = visited_g[state_hash(extracted)] + a.cost
+
+                            # Se questo stato è finale, ricordalo
+                            if new_state.is_final():
+                                if not final_state or new_g < final_state.g:
+                                    new_state.g = new_g
+                                    final_state = new_state
+                                    if show:
+                                        print(f"    Final state `{new_state}`")
+                                # Nessuna soluzione costa meno di f(n): se questa
+                                # non costa di più, interrompi il ciclo
+                                if best and final_state.g <= extracted.g + extracted.h:
+                                    done = True
+                                    break
+                                continue
+
+                            # Che non è già stato visitato (o solo con un costo maggiore)
+                            old_g = visited_g.get(state_hash(new_state), None)
+                            if old_g == None or new_g < old_g and \
+                                    (closed is None or state_hash(new_state) not in closed):
+                                # Aggiungilo alla lista degli stati visitati
+                                visited_g[state_hash(new_state)] = new_g
+                                new_state.g = new_g
+                                generated = True
+                                # ...e alla frontiera
+                                if batched:
+                                    pending.append(new_state)
+                                else:
+                                    new_state.h = heuristic(new_state)
+                                    push(new_state)
+
+                                if show:
+                                    print(f"    Reached `{new_state}`")
+                            else:
+                                if show:
+                                    print("    ALREADY VISITED!")
+                    if done:
+                        break
+                    if generated:
+                        best = False
+
+                if pending:
+                    for new_state, h in zip(pending, evaluate_heuristic(pending)):
+                        new_state.h = h
+                        push(new_state)
+                    pending = []
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            if checkpointer is not None:
+                # Se la ricerca è stata interrotta, l'ultimo salvataggio resta completo
+                checkpointer.wait()
+        elapsed = time.perf_counter() - start_time
+        self.stats = {'expanded': extracted_count, 'elapsed': elapsed, 'bound': weight}
+        if deadline is not None:
+            self.stats['timeout'] = timed_out
+        if checkpointer is not None:
+            self.stats['checkpoints'] = checkpointer.saved
+            if not timed_out:
+                checkpointer.finish()
+        print(
+            f"Parsed {extracted_count} states in {round(elapsed * 1000 * 100) / 100} ms")
+
+        if timed_out:
+            if show: print("... but the deadline expired")
+            return None
+        # Se sei arrivato ad uno stato finale
+        if final_state == None:
+            if show: print("... but no solution was found")
+            return None
+        # Ricostruisci la sequenza di azioni
+        return self.path_to(final_state)
+
+    def greedy_search(self, state: State = None, show=True) -> list[Action]:
+        """
+        Ricerca best-first greedy: espande sempre lo stato con h(n) minore,
+        senza considerare il costo per arrivarci, e si ferma al primo stato
+        finale raggiunto. È in genere molto più veloce di A*, ma la soluzione
+        non ha garanzie sul costo (`stats['bound']` è `None`).
+
+        + `state`: stato dal quale partire (di default `initial_state`)
+        + `show`: se mostrare gli stati estratti
+
+        Riporta il percorso di azioni trovato, oppure `None`.
+        """
+        if not state:
+            state = self.initial_state
+        if state.is_final():
+            return []
+        if self.is_unreachable(state):
+            if show: print("The final state is unreachable")
+            return None
 
-            if show:
-                g = visited_g[hash(extracted)]
-                print()
-                print(f"Popped n = `{extracted}`")
-                print(f" with f(n)={g + extracted.h} h(n)={extracted.h} g(n)={g}")
-                print("Applyable actions:")
+        state.g = 0
+        state.h = self.evaluate_heuristic([state])[0]
+        visited: set[int] = {hash(state)}
+        # Frontiera come heap di (h, ordine di inserimento, stato): a parità
+        # di h viene estratto lo stato inserito prima
+        fringe: list[tuple] = [(state.h, 0, state)]
+        inserted = 1
+        batched = self.batch_heuristic is not None
 
+        final_state: State = None
+        extracted_count = 0
+        peak = 1
+        start_time = time.perf_counter()
+        while fringe and final_state is None:
+            extracted = heapq.heappop(fringe)[2]
+            extracted_count += 1
+            if show: print(f"Popped n = `{extracted}` with h(n)={extracted.h} g(n)={extracted.g}")
+
+            reached = []
             for a in self.possible_actions(extracted):
-                # Prova ad applicare l'azione a allo stato estratto
                 new_state = a.apply(extracted)
+                if new_state == None or hash(new_state) in visited:
+                    continue
+                visited.add(hash(new_state))
+                new_state.g = extracted.g + a.cost
+                if new_state.is_final():
+                    final_state = new_state
+                    break
+                reached.append(new_state)
+            if batched:
+                hs = self.evaluate_heuristic(reached) if reached else []
+            else:
+                hs = [self.heuristic(s) for s in reached]
+            for new_state, h in zip(reached, hs):
+                new_state.h = h
+                heapq.heappush(fringe, (h, inserted, new_state))
+                inserted += 1
+            peak = max(peak, len(fringe))
+
+        return self._finish_search(final_state, extracted_count, start_time, None, peak, show)
+
+    def beam_search(self, width: int, state: State = None, show=True) -> list[Action]:
+        """
+        Ricerca beam: visita gli stati per livelli (numero di azioni dalla
+        partenza) e di ogni livello tiene solo i `width` stati con f(n)
+        minore. La memoria usata dipende solo da `width` e dalla lunghezza
+        del percorso, ma la ricerca può non trovare una soluzione anche se
+        esiste, e la soluzione non ha garanzie sul costo (`stats['bound']`
+        è `None`).
+
+        + `width`: numero massimo di stati tenuti per livello
+        + `state`: stato dal quale partire (di default `initial_state`)
+        + `show`: se mostrare gli stati tenuti ad ogni livello
+
+        L'euristica dei successori di un livello viene calcolata con una
+        sola chiamata a `batch_heuristic`, se il problema la definisce.
+        Riporta il percorso di azioni trovato, oppure `None`.
+        """
+        if not state:
+            state = self.initial_state
+        if state.is_final():
+            return []
+        if self.is_unreachable(state):
+            if show: print("The final state is unreachable")
+            return None
 
-                # Se questa porta ad uno stato valido
-                if new_state != None:
-                    if show:
-                        print(f" > {a}")
+        state.g = 0
+        state.h = self.evaluate_heuristic([state])[0]
+        # Stati tenuti in un livello: non vengono più considerati nei successivi
+        kept: set[int] = {hash(state)}
+        beam = [state]
 
-                    # Se questo stato è finale, interrompi il ciclo
+        final_state: State = None
+        extracted_count = 0
+        peak = 1
+        start_time = time.perf_counter()
+        while beam:
+            # Successori del livello, con il g minore per ogni stato
+            reached: dict[int, State] = {}
+            for extracted in beam:
+                extracted_count += 1
+                for a in self.possible_actions(extracted):
+                    new_state = a.apply(extracted)
+                    if new_state == None:
+                        continue
+                    new_state.g = extracted.g + a.cost
                     if new_state.is_final():
-                        final_state = new_state
-                        if show:
-                            print(f"    Final state `{new_state}`")
-                        break
-
-                    # Che non è già stato visitato
-                    if visited_g.get(hash(new_state), None) == None:
-                        new_state.h = self.heuristic(new_state)
-                        # Aggiungilo alla lista degli stati visitati
-                        visited_g[hash(new_state)] = visited_g[hash(extracted)] + a.cost
-                        # ...e alla frontiera
-                        fringe.insert(new_state)
-
-                        if show:
-                            print(f"    Reached `{new_state}`")
-                    else:
-                        if show:
-                            print("    ALREADY VISITED!")
+                        if final_state is None or new_state.g < final_state.g:
+                            final_state = new_state
+                        continue
+                    key = hash(new_state)
+                    if key in kept:
+                        continue
+                    old = reached.get(key)
+                    if old is None or new_state.g < old.g:
+                        reached[key] = new_state
+            # Il primo livello che arriva ad uno stato finale conclude la ricerca
+            if final_state is not None:
+                break
+
+            candidates = list(reached.values())
+            if not candidates:
+                break
+            peak = max(peak, len(candidates))
+            for new_state, h in zip(candidates, self.evaluate_heuristic(candidates)):
+                new_state.h = h
+            beam = heapq.nsmallest(width, candidates, key=lambda s: (s.g + s.h, s.h))
+            kept.update(hash(s) for s in beam)
+            if show: print(f"Beam of {len(beam)} states, best f(n)={beam[0].g + beam[0].h}")
+
+        return self._finish_search(final_state, extracted_count, start_time, None, peak, show)
+
+    def _finish_search(self, final_state: State | None, extracted_count: int, start_time: float,
+                       bound: float | None, peak: int, show: bool) -> list[Action] | None:
+        # Statistiche e risultato comuni alle ricerche non ottime
         elapsed = time.perf_counter() - start_time
+        self.stats = {'expanded': extracted_count, 'elapsed': elapsed, 'bound': bound,
+                      'peak_fringe': peak}
         print(
             f"Parsed {extracted_count} states in {round(elapsed * 1000 * 100) / 100} ms")
-
-        # Se sei arrivato ad uno stato finale
         if final_state == None:
             if show: print("... but no solution was found")
             return None
-        # Ricostruisci la sequenza di azioni
-        actions: list[Action] = []
-        current_state = final_state
+        self.stats['cost'] = final_state.g
+        return self.path_to(final_state)
 
-        while current_state.parent != None:
-            actions.insert(0, current_state.action)
-            current_state = current_state.parent
+    def solve(self, strategy: str = 'astar', state: State = None, show=False,
+              weight: float = 2, beam_width: int = 64) -> list[Action]:
+        """
+        Risolve il problema con una delle strategie di `STRATEGIES`:
 
-        return actions
+        + `'astar'`: A*, soluzione ottima se l'euristica è ammissibile
+        + `'weighted'`: A* pesato con peso `weight`, soluzione entro `weight`
+                    volte l'ottimo
+        + `'greedy'`: best-first greedy, veloce ma senza garanzie
+        + `'beam'`: ricerca beam larga `beam_width`, con memoria limitata
+                    ma senza garanzie (e incompleta)
+
+        Dopo la ricerca `stats['bound']` riporta il fattore massimo tra il
+        costo della soluzione e l'ottimo, oppure `None` se non c'è.
+        """
+        if strategy == 'astar':
+            return self.astar(state, show)
+        if strategy == 'weighted':
+            return self.astar(state, show, weight=weight)
+        if strategy == 'greedy':
+            return self.greedy_search(state, show)
+        if strategy == 'beam':
+            return self.beam_search(beam_width, state, show)
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
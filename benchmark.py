@@ -0,0 +1,381 @@
+# Benchmark dei risolutori su scenari generati in modo riproducibile
+#
+#   python benchmark.py run --out results.json
+#   python benchmark.py compare old.json new.json --threshold 0.1
+#   python benchmark.py imports
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from astar import Problem
+from external_search import external_astar
+from frogger import FroggerProblem
+from labirinth import LabirinthProblem, LabState, manhattan_batch
+
+# Il nome del modulo inizia con una cifra, quindi va importato così
+puzzle = importlib.import_module("8puzzle")
+
+
+# ----------------------------------------------------------------------
+# Generatori di scenari
+# ----------------------------------------------------------------------
+
+def random_labirinth(width: int, height: int, density=0.3, seed=0) -> list[list[int]]:
+    """Labirinto con muri sparsi a caso (angoli in alto a sinistra e in basso a destra liberi)"""
+    rng = random.Random(seed)
+    lab = [[1 if rng.random() < density else 0 for _ in range(width)] for _ in range(height)]
+    lab[0][0] = lab[height - 1][width - 1] = 0
+    return lab
+
+
+def maze_labirinth(width: int, height: int, seed=0) -> list[list[int]]:
+    """
+    Labirinto perfetto scavato con una visita in profondità:
+    i corridoi passano per le caselle con entrambe le coordinate pari.
+    """
+    rng = random.Random(seed)
+    lab = [[1] * width for _ in range(height)]
+    lab[0][0] = 0
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [(x + dx, y + dy, dx // 2, dy // 2)
+                      for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                      if 0 <= x + dx < width and 0 <= y + dy < height
+                      and lab[y + dy][x + dx] == 1]
+        if not neighbours:
+            stack.pop()
+            continue
+        nx, ny, wx, wy = rng.choice(neighbours)
+        lab[y + wy][x + wx] = 0
+        lab[ny][nx] = 0
+        stack.append((nx, ny))
+    return lab
+
+
+def rooms_labirinth(width: int, height: int, room_size=8, seed=0) -> list[list[int]]:
+    """Griglia di stanze quadrate separate da muri con una porta per ogni lato"""
+    rng = random.Random(seed)
+    lab = [[0] * width for _ in range(height)]
+    walls_x = range(room_size - 1, width - 1, room_size)
+    walls_y = range(room_size - 1, height - 1, room_size)
+    for x in walls_x:
+        for y in range(height):
+            lab[y][x] = 1
+    for y in walls_y:
+        for x in range(width):
+            lab[y][x] = 1
+
+    # Apri una porta in ogni tratto di muro tra due stanze
+    for x in walls_x:
+        for top in range(0, height, room_size):
+            bottom = min(top + room_size - 1, height)
+            lab[rng.randrange(top, bottom)][x] = 0
+    for y in walls_y:
+        for left in range(0, width, room_size):
+            right = min(left + room_size - 1, width)
+            lab[y][rng.randrange(left, right)] = 0
+    return lab
+
+
+def random_puzzle(depth: int, seed=0) -> tuple[int, ...]:
+    """Configurazione dell'8-puzzle a `depth` mosse casuali dalla soluzione (quindi risolvibile)"""
+    rng = random.Random(seed)
+    state = puzzle.PuzzleState((1, 2, 3, 4, 5, 6, 7, 8, 0))
+    opposite = {puzzle.PuzzleMoves.UP: puzzle.PuzzleMoves.DOWN,
+                puzzle.PuzzleMoves.DOWN: puzzle.PuzzleMoves.UP,
+                puzzle.PuzzleMoves.LEFT: puzzle.PuzzleMoves.RIGHT,
+                puzzle.PuzzleMoves.RIGHT: puzzle.PuzzleMoves.LEFT}
+    last = None
+    for _ in range(depth):
+        while True:
+            move = rng.choice(list(puzzle.PuzzleMoves))
+            # Non annullare la mossa appena fatta
+            if last is not None and move == opposite[last]:
+                continue
+            new_state = puzzle.PuzzleAction(move).apply(state)
+            if new_state is not None:
+                break
+        state, last = new_state, move
+    return state.slots
+
+
+def random_frogger_board(width=16, density=0.3, seed=0) -> tuple[list[list[int]], list[int]]:
+    """
+    Mappa di Frogger con 8 righe: la prima e l'ultima sono libere,
+    quelle in mezzo hanno macchine a caso e un verso di marcia.
+    """
+    rng = random.Random(seed)
+    height = 8
+    game_map = [[0] * width]
+    directions = [0]
+    for _ in range(height - 2):
+        game_map.append([1 if rng.random() < density else 0 for _ in range(width)])
+        directions.append(rng.choice((-1, 1)))
+    game_map.append([0] * width)
+    directions.append(0)
+    return game_map, directions
+
+
+# ----------------------------------------------------------------------
+# Scenari e modalità di risoluzione
+# ----------------------------------------------------------------------
+
+def _labirinth_problem(lab: list[list[int]], end_pos: tuple[int, int]) -> LabirinthProblem:
+    # Senza diagonali la distanza di Manhattan è ammissibile e consistente
+    def heuristic(state: LabState):
+        return abs(state.x - end_pos[0]) + abs(state.y - end_pos[1])
+    problem = LabirinthProblem(lab, heuristic, end_pos, (0, 0), allow_diagonal=False)
+    problem.batch_heuristic = manhattan_batch(end_pos)
+    return problem
+
+
+def scenarios(size: int, seed: int) -> dict[str, Callable[[], Problem]]:
+    """Ritorna i costruttori dei problemi da misurare, indicizzati per nome"""
+    maze_end = ((size - 1) // 2 * 2, (size - 1) // 2 * 2)
+    return {
+        f"labirinth-random-{size}": lambda: _labirinth_problem(
+            random_labirinth(size, size, seed=seed), (size - 1, size - 1)),
+        f"labirinth-open-{size}": lambda: _labirinth_problem(
+            random_labirinth(size, size, density=0, seed=seed), (size - 1, size - 1)),
+        f"labirinth-maze-{size}": lambda: _labirinth_problem(
+            maze_labirinth(size, size, seed=seed), maze_end),
+        f"labirinth-rooms-{size}": lambda: _labirinth_problem(
+            rooms_labirinth(size, size, seed=seed), (size - 1, size - 1)),
+        "8puzzle-depth-20": lambda: _puzzle_problem(random_puzzle(20, seed)),
+        "frogger-16": lambda: FroggerProblem(*random_frogger_board(seed=seed),
+                                             heuristic=lambda s: s.y),
+    }
+
+
+def _puzzle_problem(slots: tuple[int, ...]) -> Problem:
+    problem = puzzle.EightPuzzleProblem(puzzle.total_manhattan_distance)
+    problem.batch_heuristic = puzzle.total_manhattan_distance_batch
+    problem.initial_state = puzzle.PuzzleState(slots)
+    return problem
+
+
+def _scalar(problem: Problem):
+    # Le modalità normali misurano l'euristica chiamata stato per stato
+    problem.batch_heuristic = None
+    return problem
+
+
+def _dijkstra(problem: Problem):
+    problem.batch_heuristic = None
+    problem.heuristic = lambda s: 0
+    return problem.astar(show=False)
+
+
+# Modalità di risoluzione: ognuna riceve un problema appena costruito
+SOLVER_MODES: dict[str, Callable[[Problem], object]] = {
+    "astar": lambda problem: _scalar(problem).astar(show=False),
+    "astar-heap": lambda problem: _scalar(problem).astar(show=False, queue='heap'),
+    "astar-high-g": lambda problem: _scalar(problem).astar(show=False, tie_break='high-g'),
+    "astar-low-h": lambda problem: _scalar(problem).astar(show=False, tie_break='low-h'),
+    "astar-fifo": lambda problem: _scalar(problem).astar(show=False, tie_break='fifo'),
+    "astar-lifo": lambda problem: _scalar(problem).astar(show=False, tie_break='lifo'),
+    "astar-batch": lambda problem: problem.astar(show=False),
+    "astar-batch-16": lambda problem: problem.astar(show=False, batch_size=16),
+    "astar-weighted-2": lambda problem: _scalar(problem).astar(show=False, weight=2),
+    "greedy": lambda problem: _scalar(problem).greedy_search(show=False),
+    "beam-64": lambda problem: problem.beam_search(64, show=False),
+    "dijkstra": _dijkstra,
+    "external": lambda problem: external_astar(_scalar(problem), max_records=10_000),
+}
+
+
+# ----------------------------------------------------------------------
+# Misurazione
+# ----------------------------------------------------------------------
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentile `p` (tra 0 e 100) con il metodo nearest-rank"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure(make_problem: Callable[[], Problem], mode: Callable[[Problem], object],
+            repeat: int) -> dict[str, float]:
+    """Esegue `repeat` volte una modalità su uno scenario e ne riporta le metriche"""
+    latencies = []
+    expanded = 0
+    solved = 0
+    # Costo totale delle soluzioni, per confrontare le strategie non ottime
+    cost = 0
+    # A* stampa un riepilogo ad ogni ricerca: non deve finire nelle misure
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            problem = make_problem()
+            start = time.perf_counter()
+            solution = mode(problem)
+            latencies.append(time.perf_counter() - start)
+            expanded += problem.stats.get('expanded', 0)
+            if solution is not None:
+                solved += 1
+                cost += sum(a.cost for a in solution)
+
+        # Il picco di memoria si misura a parte: tracemalloc rallenta tutto
+        problem = make_problem()
+        tracemalloc.start()
+        mode(problem)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        "runs": repeat,
+        "solved": solved,
+        "expanded": expanded / repeat,
+        "cost": cost / solved if solved else None,
+        "expansions_per_sec": expanded / total if total > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size=32, seed=0, repeat=5, modes: list[str] = None) -> dict:
+    """Misura ogni modalità su ogni scenario e riporta i risultati pronti per il JSON"""
+    modes = modes or list(SOLVER_MODES)
+    results = {}
+    for name, make_problem in scenarios(size, seed).items():
+        for mode in modes:
+            key = f"{name}/{mode}"
+            results[key] = measure(make_problem, SOLVER_MODES[mode], repeat)
+            r = results[key]
+            print(f"{key:<40} p50={r['p50_ms']:9.2f} ms  exp={r['expanded']:8.0f}  "
+                  f"{r['expansions_per_sec']:10.0f} exp/s  peak={r['peak_kb']:8.1f} KiB")
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "size": size, "seed": seed, "repeat": repeat,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict, threshold=0.1,
+            metrics=("p50_ms", "p90_ms", "peak_kb")) -> list[str]:
+    """
+    Confronta due risultati di `run` e riporta le regressioni, ovvero
+    le metriche peggiorate di più di `threshold` (frazione, 0.1 = 10%).
+    """
+    regressions = []
+    for key, before in old["results"].items():
+        after = new["results"].get(key)
+        if after is None:
+            continue
+        for metric in metrics:
+            a, b = before[metric], after[metric]
+            if a > 0 and (b - a) / a > threshold:
+                regressions.append(f"{key} {metric}: {a:.2f} -> {b:.2f} (+{(b - a) / a:.0%})")
+    return regressions
+
+
+# Tempo massimo di importazione a freddo dei moduli dei risolutori (ms)
+IMPORT_BUDGET_MS = {
+    "astar": 50,
+    "labirinth": 50,
+    "frogger": 50,
+    "8puzzle": 50,
+    "cam": 50,
+}
+
+
+def import_time(module: str, repeat=5) -> float:
+    """
+    Misura in millisecondi il tempo di importazione di un modulo in un
+    interprete nuovo (il migliore su `repeat` prove), letto da `-X importtime`.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              f"__import__({module!r})"],
+                             capture_output=True, text=True, check=True)
+        for line in out.stderr.splitlines():
+            fields = [f.strip() for f in line.split("|")]
+            if len(fields) == 3 and fields[2] == module:
+                best = min(best, int(fields[1]) / 1000)
+    return best
+
+
+def check_imports() -> list[str]:
+    """Riporta i moduli che superano il tempo di importazione previsto"""
+    over = []
+    for module, budget in IMPORT_BUDGET_MS.items():
+        elapsed = import_time(module)
+        print(f"{module:<12} {elapsed:7.2f} ms (budget {budget} ms)")
+        if elapsed > budget:
+            over.append(module)
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bundled search problems")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmark suite")
+    p_run.add_argument("--size", type=int, default=32)
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--repeat", type=int, default=5)
+    p_run.add_argument("--mode", action="append", choices=list(SOLVER_MODES))
+    p_run.add_argument("--out", help="write the results to this JSON file")
+
+    p_cmp = sub.add_parser("compare", help="compare two result files")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=0.1)
+
+    sub.add_parser("imports", help="check the cold import time of the solver modules")
+
+    args = parser.parse_args(argv)
+    if args.command == "imports":
+        over = check_imports()
+        for module in over:
+            print(f"OVER BUDGET {module}")
+        return 1 if over else 0
+    if args.command == "run":
+        results = run(args.size, args.seed, args.repeat, args.mode)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -123,6 +123,8 @@ class CarryBack(Action):
 
 
 class CannibalsAndMissionaries(Problem):
+    # Formato degli stati codificati, per salvarli su disco
+    key_format = '5B'
     initial_state = CamState(3, 3, 0, 0, False)
 
     def possible_actions(self, state: State):
@@ -141,24 +143,50 @@ class CannibalsAndMissionaries(Problem):
                     if 0 < i + j <= 2:
                         yield CarryBack(i, j)
 
+    def encode_state(self, state: CamState) -> tuple[int, int, int, int, int]:
+        return state.ca, state.ma, state.cb, state.mb, int(state.boat)
+
+    def decode_state(self, key: tuple[int, int, int, int, int]) -> CamState:
+        ca, ma, cb, mb, boat = key
+        return CamState(ca, ma, cb, mb, bool(boat))
+
+    def state_count(self) -> int:
+        # Da 0 a 3 persone per tipo e per sponda, più la barca
+        return 4 * 4 * 4 * 4 * 2
+
+    def rank_state(self, state: CamState) -> int:
+        return (((state.ca * 4 + state.ma) * 4 + state.cb) * 4 + state.mb) * 2 + int(state.boat)
+
+    def unrank_state(self, rank: int) -> CamState:
+        rank, boat = divmod(rank, 2)
+        rank, mb = divmod(rank, 4)
+        rank, cb = divmod(rank, 4)
+        ca, ma = divmod(rank, 4)
+        return CamState(ca, ma, cb, mb, bool(boat))
+
 
 def heuristic(state: CamState):
     return state.ca + state.cb
 
 
-problem = CannibalsAndMissionaries(heuristic)
-solution = problem.astar(show=True)
-
-print()
-print("Objective:")
-print(f" + Reach the state {CamState(0, 0, 3, 3, True)}")
-print(f"Best solution in {len(solution)} steps:")
-if solution is None:
-    print(" No solution?")
-else:
-    state = problem.initial_state
-    for i, step in enumerate(solution):
+def main():
+    problem = CannibalsAndMissionaries(heuristic)
+    solution = problem.astar(show=True)
+
+    print()
+    print("Objective:")
+    print(f" + Reach the state {CamState(0, 0, 3, 3, True)}")
+    print(f"Best solution in {len(solution)} steps:")
+    if solution is None:
+        print(" No solution?")
+    else:
+        state = problem.initial_state
+        for i, step in enumerate(solution):
+            print("\t", state)
+            state = step.apply(state)
+            print(f"{i+1:3}) {step}")
         print("\t", state)
-        state = step.apply(state)
-        print(f"{i+1:3}) {step}")
-    print("\t", state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Salvataggio periodico dello stato di una ricerca A*, per riprenderla
+#
+# Un `Checkpointer` scrive su un file binario la frontiera, la tabella
+# degli stati visitati e i contatori della ricerca. Il file viene scritto
+# da un processo figlio creato con fork: il figlio vede una copia della
+# memoria della ricerca (condivisa con il padre finché non viene
+# modificata), e la ricerca continua mentre il figlio scrive. Ogni file
+# viene scritto a parte e poi rinominato, così un'interruzione durante
+# la scrittura lascia intatto il salvataggio precedente.
+#
+#   problem.astar(show=False, checkpoint="search.ckpt", checkpoint_interval=30)
+#
+# Se la ricerca viene interrotta, la stessa chiamata la riprende dal file,
+# e riporta lo stesso risultato che avrebbe riportato senza interruzioni.
+#
+# Gli stati vengono salvati con `encode_state` (il problema deve definire
+# `key_format`) insieme ai riferimenti agli stati precedenti; le azioni
+# vengono ricostruite alla ripresa applicando di nuovo quelle possibili.
+import gc
+import os
+import signal
+import struct
+import time
+from array import array
+
+from astar import BucketPQueue, Problem, State, StatePQueue
+
+MAGIC = b'ACKP'
+FORMAT_VERSION = 1
+
+# Tipi di frontiera
+QUEUES = {StatePQueue: 0, BucketPQueue: 1}
+
+# magic, versione, tipo di frontiera, formato delle chiavi, stati estratti,
+# stati inseriti in frontiera, secondi di ricerca, nodo dello stato finale
+# (-1 se non trovato), numero di nodi, di stati in frontiera e di visitati
+HEADER = struct.Struct('<4sHH16sQQdqQQQ')
+# Ogni nodo: indice del nodo precedente (-1 per lo stato iniziale), hash,
+# ordine di inserimento, g e h; segue la chiave dello stato
+NODE = '<qqQdd'
+
+
+def _number(x: float) -> int | float:
+    # I valori interi tornano interi, così la coda a bucket li accetta
+    return int(x) if x.is_integer() else x
+
+
+class Checkpointer:
+    """
+    Salvataggi periodici di una ricerca sul file `path`.
+
+    + `interval`: secondi minimi tra due salvataggi
+    + `fork`: se scrivere i salvataggi in un processo figlio (default
+                `True` dove `os.fork` esiste), senza fermare la ricerca;
+                altrimenti vengono scritti direttamente
+    """
+    path: str
+    interval: float
+    fork: bool
+    # Salvataggi iniziati durante la ricerca
+    saved: int
+
+    def __init__(self, path: str, interval: float = 60.0, fork=True):
+        self.path = path
+        self.interval = interval
+        self.fork = fork and hasattr(os, 'fork')
+        self.saved = 0
+        self._last = time.perf_counter()
+        # Processo figlio che sta scrivendo, se c'è
+        self._child: int | None = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def due(self) -> bool:
+        """Ritorna se è il momento di un nuovo salvataggio"""
+        if time.perf_counter() - self._last < self.interval:
+            return False
+        if self._child is not None:
+            # Il salvataggio precedente non è ancora finito: aspetta il prossimo turno
+            pid, _ = os.waitpid(self._child, os.WNOHANG)
+            if pid == 0:
+                return False
+            self._child = None
+        return True
+
+    def save(self, problem: Problem, fringe: StatePQueue | BucketPQueue,
+             visited_g: dict[int, int], final_state: State | None,
+             extracted_count: int, elapsed: float):
+        """Salva lo stato della ricerca (tra due espansioni)"""
+        self._last = time.perf_counter()
+        self.saved += 1
+        if not self.fork:
+            self._write(problem, fringe, visited_g, final_state, extracted_count, elapsed)
+            return
+
+        pid = os.fork()
+        if pid != 0:
+            self._child = pid
+            return
+        # Processo figlio: un Ctrl-C rivolto alla ricerca non deve interrompere
+        # la scrittura, e il garbage collector toccherebbe (copiandole) tutte
+        # le pagine condivise con la ricerca
+        status = 1
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            gc.disable()
+            self._write(problem, fringe, visited_g, final_state, extracted_count, elapsed)
+            status = 0
+        finally:
+            os._exit(status)
+
+    def wait(self):
+        """Aspetta la fine del salvataggio in corso"""
+        if self._child is not None:
+            os.waitpid(self._child, 0)
+            self._child = None
+
+    def finish(self):
+        """Chiamata a ricerca completata: il salvataggio non serve più"""
+        self.wait()
+        if self.exists():
+            os.remove(self.path)
+
+    def _write(self, problem: Problem, fringe: StatePQueue | BucketPQueue,
+               visited_g: dict[int, int], final_state: State | None,
+               extracted_count: int, elapsed: float):
+        queued = fringe.snapshot()
+
+        # Nodi da salvare: gli stati in frontiera, lo stato finale e tutti
+        # quelli precedenti, ognuno dopo il proprio stato precedente
+        nodes: list[State] = []
+        index: dict[int, int] = {}
+        for s in queued + ([final_state] if final_state is not None else []):
+            chain = []
+            while s is not None and id(s) not in index:
+                chain.append(s)
+                s = s.parent
+            for n in reversed(chain):
+                index[id(n)] = len(nodes)
+                nodes.append(n)
+
+        node = struct.Struct(NODE + problem.key_format)
+        final = index[id(final_state)] if final_state is not None else -1
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, QUEUES[type(fringe)],
+                                problem.key_format.encode(), extracted_count, fringe.inserted,
+                                elapsed, final, len(nodes), len(queued), len(visited_g)))
+            for n in nodes:
+                parent = index[id(n.parent)] if n.parent is not None else -1
+                f.write(node.pack(parent, hash(n), n.seq, n.g, n.h, *problem.encode_state(n)))
+            array('q', (index[id(s)] for s in queued)).tofile(f)
+            array('q', visited_g.keys()).tofile(f)
+            array('d', visited_g.values()).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def load(self, problem: Problem, cost=None) -> dict:
+        """
+        Legge l'ultimo salvataggio e ricostruisce la ricerca. Riporta un
+        dizionario con `fringe` (la frontiera, con `cost` come funzione di
+        costo se è uno heap), `visited_g`, `final_state`, `extracted_count`,
+        `elapsed` e `initial_state`.
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        (magic, version, kind, key_format, extracted_count, inserted, elapsed,
+         final, count, queued, visited) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a search checkpoint")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has format version {version}, expected {FORMAT_VERSION}")
+        if key_format.rstrip(b'\0').decode() != problem.key_format:
+            raise ValueError(f"{self.path} was saved by a problem with different state keys")
+
+        node = struct.Struct(NODE + problem.key_format)
+        offset = HEADER.size
+        records = [node.unpack_from(data, offset + i * node.size) for i in range(count)]
+        offset += count * node.size
+
+        # Gli stati vengono ricostruiti applicando di nuovo le azioni ai
+        # precedenti, così hanno gli stessi riferimenti (azione compresa)
+        children: dict[int, list[int]] = {}
+        for i, (parent, *_) in enumerate(records):
+            children.setdefault(parent, []).append(i)
+        nodes: list[State | None] = [None] * count
+        for i, (parent, key, seq, g, h, *state_key) in enumerate(records):
+            if parent < 0:
+                nodes[i] = problem.decode_state(tuple(state_key))
+            elif nodes[i] is None:
+                self._expand(problem, nodes[parent], children[parent], records, nodes)
+            n = nodes[i]
+            if hash(n) != key:
+                raise ValueError(f"State hashes of {type(problem).__name__} are not stable "
+                                 "across processes, the checkpoint cannot be restored")
+            n.seq, n.g, n.h = seq, _number(g), _number(h)
+
+        indices = array('q')
+        indices.frombytes(data[offset:offset + queued * 8])
+        offset += queued * 8
+        keys = array('q')
+        keys.frombytes(data[offset:offset + visited * 8])
+        offset += visited * 8
+        values = array('d')
+        values.frombytes(data[offset:offset + visited * 8])
+
+        fringe = StatePQueue(cost) if kind == QUEUES[StatePQueue] else BucketPQueue()
+        fringe.restore([nodes[i] for i in indices], inserted)
+        roots = [n for n, r in zip(nodes, records) if r[0] < 0]
+        return {
+            'fringe': fringe,
+            'visited_g': dict(zip(keys, map(_number, values))),
+            'final_state': nodes[final] if final >= 0 else None,
+            'extracted_count': extracted_count,
+            'elapsed': elapsed,
+            'initial_state': roots[0] if roots else None,
+        }
+
+    @staticmethod
+    def _expand(problem: Problem, parent: State, pending: list[int],
+                records: list[tuple], nodes: list[State | None]):
+        # Una sola espansione del precedente ricostruisce tutti i suoi figli salvati
+        wanted: dict[tuple, list[int]] = {}
+        for i in pending:
+            wanted.setdefault(tuple(records[i][5:]), []).append(i)
+        for a in problem.possible_actions(parent):
+            new_state = a.apply(parent)
+            if new_state is None:
+                continue
+            candidates = wanted.get(problem.encode_state(new_state))
+            if not candidates:
+                continue
+            # Tra azioni che portano allo stesso stato, quella con lo stesso costo
+            for j, i in enumerate(candidates):
+                if records[i][3] == parent.g + a.cost or len(candidates) == 1:
+                    nodes[i] = new_state
+                    del candidates[j]
+                    break
+        missing = [i for i in pending if nodes[i] is None]
+        if missing:
+            raise ValueError(f"Cannot rebuild {len(missing)} saved states from their parents")
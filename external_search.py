@@ -0,0 +1,321 @@
+# Ricerca A* in memoria esterna, con rilevamento dei duplicati ritardato
+#
+# La frontiera è divisa in strati per (f, g), espansi per f crescente e, a
+# parità di f, per g decrescente (così l'arrivo viene raggiunto appena
+# possibile tra gli stati con f ottimo). Gli stati generati vengono
+# accumulati in memoria e, quando superano il limite, ordinati e scritti
+# su disco in "run" ordinate. Quando uno strato viene espanso, le sue run
+# vengono unite (lette tramite mmap) eliminando i duplicati, e gli stati
+# già chiusi vengono scartati cercandoli, per chiavi crescenti, nelle run
+# ordinate degli stati chiusi. Gli stati chiusi più recenti restano in
+# memoria finché non superano a loro volta il limite, anche a metà di uno
+# strato: così in memoria restano al più circa 3 * `max_records` stati
+# alla volta (lo strato in espansione, gli stati generati e i chiusi recenti).
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from typing import Generator
+
+from astar import Action, Problem, State
+
+
+class _RunFile:
+    """File di record a dimensione fissa ordinati, letto tramite mmap"""
+    path: str
+    record: struct.Struct
+
+    def __init__(self, path: str, record: struct.Struct):
+        self.path = path
+        self.record = record
+
+    @staticmethod
+    def write(path: str, record: struct.Struct, records) -> '_RunFile':
+        writer = _RunWriter(path, record)
+        for r in records:
+            writer.append(r)
+        return writer.close()
+
+    def __iter__(self) -> Generator[tuple, None, None]:
+        if os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from self.record.iter_unpack(mm)
+
+    def find(self, key: tuple) -> tuple | None:
+        """Cerca per bisezione il record con questa chiave"""
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return None
+        k = len(key)
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                lo, hi = 0, size // self.record.size
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    r = self.record.unpack_from(mm, mid * self.record.size)
+                    if r[:k] < key:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                if lo * self.record.size < size:
+                    r = self.record.unpack_from(mm, lo * self.record.size)
+                    if r[:k] == key:
+                        return r
+        return None
+
+    def remove(self):
+        os.remove(self.path)
+
+
+class _RunWriter:
+    """Scrive una run un record alla volta, senza tenerla in memoria"""
+
+    def __init__(self, path: str, record: struct.Struct):
+        self.path = path
+        self.record = record
+        self.file = open(path, 'wb')
+        self.chunk = []
+
+    def append(self, r: tuple):
+        self.chunk.append(self.record.pack(*r))
+        if len(self.chunk) >= 4096:
+            self.file.write(b"".join(self.chunk))
+            self.chunk = []
+
+    def close(self) -> _RunFile:
+        self.file.write(b"".join(self.chunk))
+        self.file.close()
+        return _RunFile(self.path, self.record)
+
+
+class _ClosedCursor:
+    """
+    Cerca chiavi crescenti in una run di stati chiusi: ogni ricerca parte
+    da dove è finita la precedente, con passi che raddoppiano e poi per
+    bisezione, così uno strato con m chiavi costa O(m log(n / m)) letture
+    invece di scorrere gli n record della run.
+    """
+
+    def __init__(self, run: _RunFile, k: int):
+        self.k = k
+        self.record = run.record
+        self.count = os.path.getsize(run.path) // run.record.size
+        self.pos = 0
+        self.mm = None
+        if self.count:
+            with open(run.path, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _key(self, i: int) -> tuple:
+        return self.record.unpack_from(self.mm, i * self.record.size)[:self.k]
+
+    def contains(self, key: tuple) -> bool:
+        n = self.count
+        lo = hi = self.pos
+        step = 1
+        while hi < n and self._key(hi) < key:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        hi = min(hi, n)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.pos = lo
+        return lo < n and self._key(lo) == key
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+
+
+def external_astar(problem: Problem, workdir: str = None, max_records: int = 1_000_000,
+                   max_closed_runs: int = 8, state: State = None) -> list[Action] | None:
+    """
+    Risolve il problema con A* tenendo frontiera e stati chiusi su disco.
+
+    + `workdir`: cartella in cui scrivere le run (di default una cartella
+                temporanea, eliminata alla fine)
+    + `max_records`: numero massimo di stati tenuti in memoria prima di
+                scriverli su disco
+    + `max_closed_runs`: numero di run di stati chiusi oltre il quale
+                vengono unite in una sola
+
+    In memoria restano al più circa 3 * `max_records` stati, anche con
+    strati molto larghi. Ogni stato estratto viene cercato in tutte le run
+    dei chiusi (al più `max_closed_runs` + 1), con un costo logaritmico
+    nella loro dimensione: il costo di uno strato cresce quindi con il
+    numero di run, e quello della ricerca con run × strati.
+
+    Il problema deve definire `encode_state`, `decode_state` e `key_format`;
+    costi ed euristica devono essere interi e l'euristica consistente
+    (con `h = 0` la ricerca diventa una visita a costo uniforme di tutto
+    lo spazio raggiungibile). Riporta il percorso ottimo come lista di
+    azioni, oppure `None` se non c'è soluzione.
+    """
+    if not state:
+        state = problem.initial_state
+    if state.is_final():
+        return []
+
+    start_key = problem.encode_state(state)
+    k = len(start_key)
+    # Ogni record è (chiave dello stato, chiave dello stato precedente)
+    record = struct.Struct('>' + problem.key_format * 2)
+
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="astar-")
+    os.makedirs(workdir, exist_ok=True)
+    files = 0
+
+    def new_path() -> str:
+        nonlocal files
+        files += 1
+        return os.path.join(workdir, f"run-{files:06}.bin")
+
+    # Strati della frontiera, indicizzati per (f, -g)
+    buffers: dict[tuple[int, int], list[tuple]] = {}
+    runs: dict[tuple[int, int], list[_RunFile]] = {}
+    buffered = 0
+    # Stati chiusi: su disco e, gli ultimi, in memoria (chiave -> record)
+    closed: list[_RunFile] = []
+    recent: dict[tuple, tuple] = {}
+
+    stats = {'expanded': 0, 'runs_written': 0, 'closed_merges': 0, 'peak_buffered': 0}
+    start_time = time.perf_counter()
+
+    def spill():
+        nonlocal buffered
+        for layer, records in buffers.items():
+            records.sort()
+            runs.setdefault(layer, []).append(_RunFile.write(new_path(), record, records))
+            stats['runs_written'] += 1
+        buffers.clear()
+        buffered = 0
+
+    def push(layer: tuple[int, int], r: tuple):
+        nonlocal buffered
+        buffers.setdefault(layer, []).append(r)
+        buffered += 1
+        stats['peak_buffered'] = max(stats['peak_buffered'], buffered)
+        if buffered >= max_records:
+            spill()
+
+    def find_closed(key: tuple) -> tuple | None:
+        if key in recent:
+            return recent[key]
+        for run in closed:
+            r = run.find(key)
+            if r is not None:
+                return r
+        return None
+
+    def close_recent():
+        # Scrive su disco i chiusi recenti, unendo le run se sono troppe
+        nonlocal closed
+        closed.append(_RunFile.write(new_path(), record, sorted(recent.values())))
+        stats['runs_written'] += 1
+        recent.clear()
+        if len(closed) > max_closed_runs:
+            merged = _RunFile.write(new_path(), record, heapq.merge(*closed))
+            for run in closed:
+                run.remove()
+            closed = [merged]
+            stats['closed_merges'] += 1
+
+    # La chiave precedente dello stato iniziale è sé stesso
+    push((problem.heuristic(state), 0), start_key + start_key)
+    goal: tuple | None = None
+
+    try:
+        while goal is None and (buffers or runs):
+            layer = min(set(buffers) | set(runs))
+            f, g = layer[0], -layer[1]
+            in_memory = buffers.pop(layer, [])
+            in_memory.sort()
+            buffered -= len(in_memory)
+            layer_runs = runs.pop(layer, [])
+            sources = [iter(in_memory)] + [iter(run) for run in layer_runs]
+
+            cursors = [_ClosedCursor(run, k) for run in closed]
+            last = None
+
+            for r in heapq.merge(*sources):
+                key = r[:k]
+                # Duplicato nello stesso strato
+                if key == last:
+                    continue
+                last = key
+                # Già espanso in uno strato precedente
+                if key in recent or any(c.contains(key) for c in cursors):
+                    continue
+                recent[key] = r
+                if len(recent) >= max_records:
+                    # Strato molto largo: le chiavi che seguono sono maggiori,
+                    # quindi nuovi cursori dall'inizio delle run bastano
+                    for c in cursors:
+                        c.close()
+                    close_recent()
+                    cursors = [_ClosedCursor(run, k) for run in closed]
+
+                s = problem.decode_state(key)
+                if s.is_final():
+                    goal = r
+                    break
+
+                stats['expanded'] += 1
+                for a in problem.possible_actions(s):
+                    new_state = a.apply(s)
+                    if new_state is None:
+                        continue
+                    new_g = g + a.cost
+                    h = problem.heuristic(new_state)
+                    push((new_g + h, -new_g), problem.encode_state(new_state) + key)
+
+            for c in cursors:
+                c.close()
+            for run in layer_runs:
+                run.remove()
+
+        if goal is None:
+            return None
+
+        # Risali la catena dei predecessori cercandoli nelle run dei chiusi
+        keys = [goal[:k]]
+        parent = goal[k:]
+        while parent != keys[-1]:
+            keys.append(parent)
+            parent = find_closed(parent)[k:]
+        keys.reverse()
+
+        # Per ogni passo, l'azione più economica che lo compie
+        path: list[Action] = []
+        for a_key, b_key in zip(keys, keys[1:]):
+            s = problem.decode_state(a_key)
+            best = None
+            for a in problem.possible_actions(s):
+                new_state = a.apply(s)
+                if new_state is not None and problem.encode_state(new_state) == b_key:
+                    if best is None or a.cost < best.cost:
+                        best = a
+            path.append(best)
+        return path
+    finally:
+        stats['elapsed'] = time.perf_counter() - start_time
+        problem.stats = stats
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            for layer_runs in runs.values():
+                for run in layer_runs:
+                    run.remove()
+            for run in closed:
+                run.remove()
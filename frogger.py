@@ -95,6 +95,8 @@ class FroggerAction(Action):
 
 
 class FroggerProblem(Problem):
+    # Formato degli stati codificati, per salvarli su disco
+    key_format = '3I'
     # Mappa del gioco
     game_map: list[list[int]]
     # Movimento delle macchine per ogni riga
@@ -116,3 +118,21 @@ class FroggerProblem(Problem):
     def possible_actions(self, _):
         for move in FroggerMove:
             yield FroggerAction(move)
+
+    def encode_state(self, state: FroggerState) -> tuple[int, int, int]:
+        return state.x, state.y, state.t
+
+    def decode_state(self, key: tuple[int, int, int]) -> FroggerState:
+        return FroggerState(self, *key)
+
+    def state_count(self) -> int:
+        # Il tempo va da 0 a width - 1
+        return self.width * self.height * self.width
+
+    def rank_state(self, state: FroggerState) -> int:
+        return (state.t * self.height + state.y) * self.width + state.x
+
+    def unrank_state(self, rank: int) -> FroggerState:
+        rank, x = divmod(rank, self.width)
+        t, y = divmod(rank, self.height)
+        return FroggerState(self, x, y, t)
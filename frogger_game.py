@@ -1,42 +1,54 @@
 # TODO sistemare check collisioni
-from pipes import stepkinds
-
-import pygame
-import os
-import numpy as np
-import collections
 import time
 
 from frogger import FroggerProblem
 
-pygame.font.init()
-pygame.mixer.init()
-myfont = pygame.font.SysFont('Comic Sans MS', 30)
-win_surface = myfont.render('YOU WON', False, (255, 255, 255))
-lose_surface = myfont.render('YOU LOST', False, (255, 255, 255))
+# pygame viene importato solo da chi disegna la finestra: così la
+# simulazione e il modulo si possono usare anche senza display
 
 RATE_TH = 5
 WIDTH, HEIGHT = 640, 320
-WIN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("First Game!")
 # FPS = 30
 FPS = 3
 
+# Mappa iniziale del gioco (1 = macchina)
+BOARD = [
+    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1],
+    [0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 1, 1, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 1],
+    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [1, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0],
+    [1, 1, 0, 0, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+]
+# Verso in cui si spostano le macchine ad ogni passo, per ogni riga
+TRAFFIC_DIRECTIONS = [0, 1, 1, -1, -1, 1, 1, 0]
+
+# Finestra e scritte, create da `init_display`
+WIN = None
+win_surface = None
+lose_surface = None
+
+
+def init_display():
+    """Inizializza pygame e apre la finestra di gioco"""
+    global WIN, win_surface, lose_surface
+    import pygame
+
+    pygame.font.init()
+    pygame.mixer.init()
+    myfont = pygame.font.SysFont('Comic Sans MS', 30)
+    win_surface = myfont.render('YOU WON', False, (255, 255, 255))
+    lose_surface = myfont.render('YOU LOST', False, (255, 255, 255))
+
+    WIN = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("First Game!")
+
 
 class frogger_game:
     def __init__(self):
-        self.state_matrix = np.asarray([
-
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1],
-            [0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 1, 1, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 1],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [1, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0],
-            [1, 1, 0, 0, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-
-        ])
+        self.state_matrix = [list(row) for row in BOARD]
         self.frog_pos = (7, 7)
         self.statemap = {}
         self.path = None
@@ -45,25 +57,11 @@ class frogger_game:
     def step(self, action):
         lose = False
         win = False
-        r1 = collections.deque(self.state_matrix[1])
-        r2 = collections.deque(self.state_matrix[2])
-        r3 = collections.deque(self.state_matrix[3])
-        r4 = collections.deque(self.state_matrix[4])
-        r5 = collections.deque(self.state_matrix[5])
-        r6 = collections.deque(self.state_matrix[6])
-        r1.rotate(1)
-        r2.rotate(1)
-        r3.rotate(-1)
-        r4.rotate(-1)
-        r5.rotate(1)
-        r6.rotate(1)
-        r1 = list(r1)
-        r2 = list(r2)
-        r3 = list(r3)
-        r4 = list(r4)
-        r5 = list(r5)
-        r6 = list(r6)
-        self.state_matrix = np.asarray([self.state_matrix[0], r1, r2, r3, r4, r5, r6, self.state_matrix[7]])
+        # Sposta le macchine di ogni riga nel verso del traffico
+        for r, d in enumerate(TRAFFIC_DIRECTIONS):
+            if d:
+                row = self.state_matrix[r]
+                self.state_matrix[r] = row[-d:] + row[:-d]
 
         if (action == 1):
             self.frog_pos = (self.frog_pos[0], max(0, self.frog_pos[1] - 2))
@@ -107,9 +105,7 @@ class frogger_game:
     def A_star_agent(self):
         # fill this for the A* agent
         # TODO Leggila dall'oggetto game
-        traffic_directions = [0, 1, 1, -1, -1, 1, 1, 0]
-
-        problem = FroggerProblem(self.state_matrix, traffic_directions, heuristic=self.h)
+        problem = FroggerProblem(self.state_matrix, TRAFFIC_DIRECTIONS, heuristic=self.h)
         solution = problem.astar(show=True)
 
         if solution == None:
@@ -125,6 +121,8 @@ class frogger_game:
         return solution
 
 def draw_window(game):
+    import pygame
+
     WIN.fill((0, 0, 0))
 
     for r in range(len(game.state_matrix)):
@@ -137,6 +135,8 @@ def draw_window(game):
 
 
 def draw_win():
+    import pygame
+
     # WIN.fill((0, 0, 0))
     WIN.blit(win_surface, (220, 140))
     pygame.display.update()
@@ -146,6 +146,8 @@ def draw_win():
 
 
 def draw_lost():
+    import pygame
+
     # WIN.fill((0, 0, 0))
     WIN.blit(lose_surface, (220, 140))
     pygame.display.update()
@@ -155,6 +157,9 @@ def draw_lost():
 
 
 def main():
+    import pygame
+
+    init_display()
     clock = pygame.time.Clock()
     run = True
     game = frogger_game()
@@ -198,4 +203,5 @@ def main():
             lost, win = game.step(action)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
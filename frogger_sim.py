@@ -0,0 +1,243 @@
+# Simulatore di Frogger senza finestra, per valutare gli agenti su
+# migliaia di partite: ogni passo avanza tutte le partite insieme con NumPy
+#
+#   python frogger_sim.py --episodes 5000
+import argparse
+import contextlib
+import io
+import time
+from typing import Callable
+
+import numpy as np
+
+from frogger import FroggerMove, FroggerProblem, FroggerState
+from frogger_game import BOARD, TRAFFIC_DIRECTIONS
+
+
+class FroggerSim:
+    """
+    Gruppo di partite di Frogger giocate in parallelo.
+
+    Le regole sono quelle di `frogger_game.step`: ad ogni passo le
+    macchine si spostano, poi la rana si muove (restando dentro la
+    mappa) e perde se finisce su una macchina, vince se arriva
+    alla prima riga. Invece di ruotare le righe, la posizione delle
+    macchine al tempo `t` viene calcolata dalla mappa iniziale.
+    """
+    # Mappe iniziali (partite x righe x colonne)
+    boards: np.ndarray
+    # Verso del traffico di ogni riga (partite x righe)
+    directions: np.ndarray
+    t: int
+
+    # Posizione della rana in ogni partita
+    rows: np.ndarray
+    cols: np.ndarray
+
+    # Stato di ogni partita
+    won: np.ndarray
+    lost: np.ndarray
+    steps: np.ndarray
+
+    def __init__(self, boards: np.ndarray, directions: np.ndarray, start=(7, 7)):
+        self.boards = np.asarray(boards, dtype=bool)
+        self.directions = np.asarray(directions, dtype=np.int64)
+        if self.boards.ndim == 2:
+            self.boards = self.boards[None]
+        if self.directions.ndim == 1:
+            self.directions = np.broadcast_to(self.directions, self.boards.shape[:2])
+        self.start = start
+        self.reset()
+
+    @property
+    def size(self) -> int:
+        return self.boards.shape[0]
+
+    @property
+    def height(self) -> int:
+        return self.boards.shape[1]
+
+    @property
+    def width(self) -> int:
+        return self.boards.shape[2]
+
+    @property
+    def done(self) -> np.ndarray:
+        return self.won | self.lost
+
+    def reset(self):
+        n = self.size
+        self.t = 0
+        self.rows = np.full(n, self.start[0])
+        self.cols = np.full(n, self.start[1])
+        self.won = np.zeros(n, dtype=bool)
+        self.lost = np.zeros(n, dtype=bool)
+        self.steps = np.zeros(n, dtype=np.int64)
+
+    def cars(self, t: int = None) -> np.ndarray:
+        """Ritorna la posizione delle macchine al tempo `t` (di default quello attuale)"""
+        if t is None:
+            t = self.t
+        columns = np.arange(self.width)
+        shifted = (columns[None, None, :] - self.directions[:, :, None] * t) % self.width
+        return np.take_along_axis(self.boards, shifted, axis=2)
+
+    def step(self, actions: np.ndarray):
+        """
+        Esegue un passo di tutte le partite non ancora terminate.
+        Le azioni sono codificate come in `frogger_game`:
+        0-Nothing, 1-left, 2-up, 3-right, 4-down
+        """
+        active = ~self.done
+        self.t += 1
+        rows, cols = self.rows.copy(), self.cols.copy()
+
+        cols = np.where(actions == 1, np.maximum(0, cols - 2), cols)
+        rows = np.where(actions == 2, np.maximum(0, rows - 1), rows)
+        cols = np.where(actions == 3, np.minimum(self.width - 1, cols + 2), cols)
+        rows = np.where(actions == 4, np.minimum(self.height - 1, rows + 1), rows)
+
+        self.rows = np.where(active, rows, self.rows)
+        self.cols = np.where(active, cols, self.cols)
+        self.steps += active
+
+        hit = self.cars()[np.arange(self.size), self.rows, self.cols]
+        # Come nel gioco, la collisione conta più dell'arrivo
+        self.lost |= active & hit
+        self.won |= active & ~hit & (self.rows == 0)
+
+
+# Un agente riceve il simulatore e riporta un'azione per ogni partita
+Agent_t = Callable[[FroggerSim], np.ndarray]
+
+
+def simple_reactive(sim: FroggerSim) -> np.ndarray:
+    """Versione vettoriale di `frogger_game.simple_reactive`"""
+    cars = sim.cars()
+    n = np.arange(sim.size)
+    above = np.maximum(0, sim.rows - 1)
+    middle = (sim.rows >= 4) & (sim.rows <= 5)
+    # Guarda la casella in alto dalla parte da cui arrivano le macchine
+    look = np.where(middle, sim.cols + 1, sim.cols - 1) % sim.width
+    free = ~cars[n, above, look]
+    return np.where(free, 2, 0)
+
+
+class AStarPlanner:
+    """
+    Agente che all'inizio della partita pianifica l'intero percorso
+    con `FroggerProblem.astar` e poi lo esegue una mossa per volta.
+    """
+    heuristic: Callable
+    plans: list[list[int]]
+    # Tempo di pianificazione di ogni partita, in secondi
+    planning_time: list[float]
+
+    def __init__(self, heuristic=lambda s: s.y):
+        self.heuristic = heuristic
+        self.plans = []
+        self.planning_time = []
+
+    def reset(self, sim: FroggerSim):
+        self.plans = []
+        self.planning_time = []
+        for board, directions in zip(sim.boards, sim.directions):
+            game_map = board.astype(int).tolist()
+            problem = FroggerProblem(game_map, directions.tolist(), self.heuristic)
+            problem.initial_state = FroggerState(problem, sim.start[1], sim.start[0], 0)
+
+            start = time.perf_counter()
+            # A* stampa un riepilogo ad ogni ricerca
+            with contextlib.redirect_stdout(io.StringIO()):
+                solution = problem.astar(show=False)
+            self.planning_time.append(time.perf_counter() - start)
+
+            self.plans.append([a.move.value for a in solution] if solution else [])
+
+    def __call__(self, sim: FroggerSim) -> np.ndarray:
+        actions = np.full(sim.size, FroggerMove.Nothing.value)
+        for i, plan in enumerate(self.plans):
+            if sim.t < len(plan):
+                actions[i] = plan[sim.t]
+        return actions
+
+
+def random_boards(n: int, width=16, height=8, density=0.3,
+                  seed=0) -> tuple[np.ndarray, np.ndarray]:
+    """Genera `n` mappe casuali con la prima e l'ultima riga libere"""
+    rng = np.random.default_rng(seed)
+    boards = rng.random((n, height, width)) < density
+    boards[:, 0] = boards[:, -1] = False
+    directions = rng.choice(np.array([-1, 1]), size=(n, height))
+    directions[:, 0] = directions[:, -1] = 0
+    return boards, directions
+
+
+def evaluate(agent: Agent_t, sim: FroggerSim, max_steps=100) -> dict[str, float]:
+    """
+    Gioca tutte le partite del simulatore con l'agente dato e riporta
+    percentuale di vittorie, passi medi e tempo speso dall'agente.
+    """
+    sim.reset()
+    agent_time = 0.0
+    start = time.perf_counter()
+
+    reset = getattr(agent, 'reset', None)
+    if reset is not None:
+        t0 = time.perf_counter()
+        reset(sim)
+        agent_time += time.perf_counter() - t0
+
+    decisions = 0
+    while not sim.done.all() and sim.t < max_steps:
+        t0 = time.perf_counter()
+        actions = agent(sim)
+        agent_time += time.perf_counter() - t0
+        decisions += int((~sim.done).sum())
+        sim.step(actions)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "episodes": sim.size,
+        "win_rate": float(sim.won.mean()),
+        "loss_rate": float(sim.lost.mean()),
+        "mean_steps": float(sim.steps.mean()),
+        "planning_ms_per_episode": agent_time / sim.size * 1000,
+        "decision_us": agent_time / max(1, decisions) * 1e6,
+        "episodes_per_sec": sim.size / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+AGENTS: dict[str, Callable[[], Agent_t]] = {
+    "simple_reactive": lambda: simple_reactive,
+    "astar": AStarPlanner,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate Frogger agents without a window")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=16)
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=100)
+    parser.add_argument("--agent", action="append", choices=list(AGENTS))
+    args = parser.parse_args(argv)
+
+    boards, directions = random_boards(args.episodes, args.width, density=args.density,
+                                       seed=args.seed)
+    scenarios = {
+        "frogger_game board": FroggerSim(BOARD, TRAFFIC_DIRECTIONS),
+        f"{args.episodes} random boards": FroggerSim(boards, directions),
+    }
+    for name, sim in scenarios.items():
+        print(name)
+        for agent_name in args.agent or list(AGENTS):
+            r = evaluate(AGENTS[agent_name](), sim, args.max_steps)
+            print(f"  {agent_name:<16} win={r['win_rate']:6.1%}  steps={r['mean_steps']:5.1f}  "
+                  f"plan={r['planning_ms_per_episode']:8.3f} ms/episode  "
+                  f"{r['episodes_per_sec']:9.0f} episodes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Ricerca per frontiere: enumera tutto lo spazio degli stati raggiungibile
+#
+# Visita in ampiezza (costi unitari) o a costo uniforme con bucket (costi
+# interi) che tiene in memoria solo gli strati non ancora espansi, come
+# indici degli stati (`Problem.rank_state`), e una bitmap degli stati già
+# visitati. Ogni stato raggiunto viene passato con la sua distanza ad una
+# callback, oppure scritto su file.
+#
+#   python frontier.py --size 64
+import argparse
+import struct
+import time
+from array import array
+from typing import BinaryIO, Callable
+
+from astar import Problem, State
+
+
+# Riceve la chiave di uno stato (`Problem.encode_state`) e la sua distanza
+Visit_t = Callable[[tuple, int], None]
+
+
+def frontier_search(problem: Problem, state: State = None, callback: Visit_t = None,
+                    out: BinaryIO = None, unit_cost: bool = None) -> dict[str, float]:
+    """
+    Visita tutti gli stati raggiungibili da `state` (di default lo stato
+    iniziale), in ordine di distanza.
+
+    + `callback`: chiamata con (chiave dello stato, distanza) per ogni stato
+    + `out`: file binario su cui scrivere un record per ogni stato, con la
+                chiave nel formato `key_format` seguita dalla distanza
+                (un intero senza segno a 32 bit, big-endian)
+    + `unit_cost`: se tutte le azioni costano 1 la visita è in ampiezza;
+                di default lo dice `problem.has_unit_costs()`, oppure
+                viene dedotto dalle azioni dello stato iniziale
+
+    Il problema deve implementare `rank_state`, `unrank_state`,
+    `state_count` ed `encode_state`, e i costi devono essere interi.
+    Lo stato finale non interrompe la visita. Riporta (e salva in
+    `problem.stats`) il numero di stati visitati, la distanza massima,
+    il picco di stati in frontiera e il tempo impiegato.
+    """
+    if not state:
+        state = problem.initial_state
+    if unit_cost is None:
+        unit_cost = problem.has_unit_costs()
+    if unit_cost is None:
+        unit_cost = all(a.cost == 1 for a in problem.possible_actions(state))
+
+    record = struct.Struct('>' + problem.key_format + 'I') if out is not None else None
+    rank, unrank = problem.rank_state, problem.unrank_state
+    possible_actions = problem.possible_actions
+    encode = problem.encode_state
+
+    # Bitmap degli stati visitati, un bit per indice
+    visited = bytearray((problem.state_count() + 7) // 8)
+    # Strati non ancora espansi, per distanza
+    layers: dict[int, array] = {0: array('q', [rank(state)])}
+    if unit_cost:
+        r = layers[0][0]
+        visited[r >> 3] |= 1 << (r & 7)
+
+    stats = {'states': 0, 'max_distance': 0, 'peak_frontier': 1}
+    start_time = time.perf_counter()
+    chunk = []
+
+    while layers:
+        distance = min(layers)
+        layer = layers.pop(distance)
+        count = 0
+
+        for r in layer:
+            if not unit_cost:
+                # Con costi diversi lo stato è chiuso solo quando viene estratto
+                if visited[r >> 3] & (1 << (r & 7)):
+                    continue
+                visited[r >> 3] |= 1 << (r & 7)
+            count += 1
+
+            s = unrank(r)
+            if callback is not None or record is not None:
+                key = encode(s)
+                if callback is not None:
+                    callback(key, distance)
+                if record is not None:
+                    chunk.append(record.pack(*key, distance))
+                    if len(chunk) >= 4096:
+                        out.write(b"".join(chunk))
+                        chunk = []
+
+            for a in possible_actions(s):
+                new_state = a.apply(s)
+                if new_state is None:
+                    continue
+                new_r = rank(new_state)
+                byte, bit = new_r >> 3, 1 << (new_r & 7)
+                if visited[byte] & bit:
+                    continue
+                if unit_cost:
+                    if a.cost != 1:
+                        raise ValueError(f"Action {a} costs {a.cost}, use unit_cost=False")
+                    # In ampiezza lo stato è chiuso appena generato
+                    visited[byte] |= bit
+                new_distance = distance + a.cost
+                next_layer = layers.get(new_distance)
+                if next_layer is None:
+                    next_layer = layers[new_distance] = array('q')
+                next_layer.append(new_r)
+
+        if count:
+            stats['states'] += count
+            stats['max_distance'] = distance
+        stats['peak_frontier'] = max(stats['peak_frontier'],
+                                     sum(len(l) for l in layers.values()))
+
+    if chunk:
+        out.write(b"".join(chunk))
+
+    elapsed = time.perf_counter() - start_time
+    stats['elapsed'] = elapsed
+    stats['states_per_sec'] = stats['states'] / elapsed if elapsed > 0 else 0.0
+    problem.stats = stats
+    return stats
+
+
+def read_distances(path: str, key_format: str):
+    """Legge i record (chiave, distanza) scritti da `frontier_search` su file"""
+    record = struct.Struct('>' + key_format + 'I')
+    with open(path, 'rb') as f:
+        data = f.read()
+    for r in record.iter_unpack(data):
+        yield r[:-1], r[-1]
+
+
+def main(argv=None):
+    from benchmark import scenarios
+
+    parser = argparse.ArgumentParser(description="Enumerate the reachable state space of each scenario")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append")
+    args = parser.parse_args(argv)
+
+    available = scenarios(args.size, args.seed)
+    for name in args.scenario or list(available):
+        stats = frontier_search(available[name]())
+        print(f"{name:<24} {stats['states']:>9} states  depth={stats['max_distance']:<5} "
+              f"frontier={stats['peak_frontier']:<7} {stats['states_per_sec']:>10.0f} states/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Controllo di ammissibilità e consistenza delle euristiche
+#
+# Gli stati vengono campionati con passeggiate casuali a partire dallo
+# stato iniziale; il costo esatto h* per arrivare ad uno stato finale
+# viene calcolato con una ricerca all'indietro sul grafo degli stati
+# raggiungibili, esplorato in anticipo. Su ogni stato campionato si
+# controlla che h <= h*, e su ogni arco uscente che h(s) <= c + h(s').
+#
+#   python heuristic_check.py --walks 200
+import argparse
+import heapq
+import importlib
+import math
+import random
+import time
+from typing import Callable
+
+from astar import CostFunction_t, Problem, State
+
+
+def explore(problem: Problem, state: State = None,
+            max_states: int = 500_000) -> tuple[dict[tuple, float], bool]:
+    """
+    Calcola il costo esatto h* da ogni stato raggiungibile da `state` fino
+    ad uno stato finale. Prima visita in ampiezza il grafo degli stati
+    (al più `max_states`), salvando gli archi al contrario, poi lo
+    percorre all'indietro con Dijkstra a partire da tutti gli stati finali.
+
+    Riporta h* per chiave dello stato (`Problem.encode_state`; `math.inf`
+    se non c'è un percorso verso l'arrivo) e se l'esplorazione è completa.
+    Se non lo è, i valori sono solo limiti superiori del costo esatto.
+    """
+    if not state:
+        state = problem.initial_state
+    encode = problem.encode_state
+
+    index: dict[tuple, int] = {encode(state): 0}
+    states = [state]
+    # Per ogni stato, la lista degli (stati precedenti, costo dell'arco)
+    reverse: list[list[tuple[int, int]]] = [[]]
+    finals = []
+    complete = True
+
+    i = 0
+    while i < len(states):
+        s = states[i]
+        if s.is_final():
+            finals.append(i)
+        for a in problem.possible_actions(s):
+            new_state = a.apply(s)
+            if new_state is None:
+                continue
+            key = encode(new_state)
+            j = index.get(key)
+            if j is None:
+                if len(states) >= max_states:
+                    complete = False
+                    continue
+                j = index[key] = len(states)
+                states.append(new_state)
+                reverse.append([])
+            reverse[j].append((i, a.cost))
+        i += 1
+
+    distance = [math.inf] * len(states)
+    fringe = []
+    for i in finals:
+        distance[i] = 0
+        fringe.append((0, i))
+    while fringe:
+        d, i = heapq.heappop(fringe)
+        if d > distance[i]:
+            continue
+        for j, cost in reverse[i]:
+            if d + cost < distance[j]:
+                distance[j] = d + cost
+                heapq.heappush(fringe, (d + cost, j))
+
+    return {key: distance[i] for key, i in index.items()}, complete
+
+
+def random_walks(problem: Problem, walks: int, walk_length: int,
+                 seed=0, state: State = None) -> list[State]:
+    """Campiona gli stati visitati da `walks` passeggiate casuali lunghe al più `walk_length`"""
+    if not state:
+        state = problem.initial_state
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(walks):
+        s = state
+        samples.append(s)
+        for _ in range(walk_length):
+            successors = [n for n in (a.apply(s) for a in problem.possible_actions(s)) if n is not None]
+            if not successors:
+                break
+            s = rng.choice(successors)
+            samples.append(s)
+    return samples
+
+
+def check_heuristic(problem: Problem, heuristic: CostFunction_t = None, walks: int = 100,
+                    walk_length: int = 50, seed=0, max_states: int = 500_000,
+                    exact: tuple[dict[tuple, float], bool] = None) -> dict[str, float]:
+    """
+    Controlla l'euristica (di default quella del problema) sugli stati
+    campionati con `random_walks`.
+
+    + `exact`: risultato di `explore` (costi esatti e se l'esplorazione
+                è completa), per confrontare più euristiche sullo stesso
+                problema senza ripetere l'esplorazione
+
+    Riporta il numero di violazioni di ammissibilità (h > h*) e di
+    consistenza (h(s) > c + h(s') su un arco uscente da uno stato
+    campionato), la sovrastima peggiore, il rapporto medio h/h*, gli
+    stati finali con h diversa da 0 e il tempo medio di una chiamata.
+    Gli stati senza un costo esatto noto (fuori da un'esplorazione
+    incompleta, o senza percorso verso l'arrivo al suo interno) non
+    vengono controllati per l'ammissibilità e sono contati in `unknown`.
+    """
+    heuristic = heuristic or problem.heuristic
+    if exact is None:
+        exact = explore(problem, max_states=max_states)
+    if isinstance(exact, dict):
+        raise TypeError("exact must be the (costs, complete) pair returned by explore")
+    exact, complete = exact
+    encode = problem.encode_state
+
+    samples = random_walks(problem, walks, walk_length, seed)
+    unique = {encode(s): s for s in samples}
+
+    report = {
+        'samples': len(unique), 'complete': complete,
+        'inadmissible': 0, 'max_overestimate': 0, 'inconsistent': 0, 'edges': 0,
+        'nonzero_goals': 0, 'dead_ends': 0, 'unknown': 0,
+    }
+    ratios = []
+    for key, s in unique.items():
+        h = heuristic(s)
+        h_star = exact.get(key)
+        if s.is_final() and h != 0:
+            report['nonzero_goals'] += 1
+        if h_star is None or h_star == math.inf and not complete:
+            # Stato non esplorato, o il percorso può passare per stati non esplorati
+            report['unknown'] += 1
+        elif h_star == math.inf:
+            # Nessun percorso verso l'arrivo: qualsiasi stima è ammissibile
+            report['dead_ends'] += 1
+        else:
+            if h > h_star:
+                report['inadmissible'] += 1
+                report['max_overestimate'] = max(report['max_overestimate'], h - h_star)
+            if h_star > 0:
+                ratios.append(h / h_star)
+
+        for a in problem.possible_actions(s):
+            new_state = a.apply(s)
+            if new_state is None:
+                continue
+            report['edges'] += 1
+            if h > a.cost + heuristic(new_state):
+                report['inconsistent'] += 1
+
+    report['mean_ratio'] = sum(ratios) / len(ratios) if ratios else math.nan
+    report['min_ratio'] = min(ratios, default=math.nan)
+
+    # Costo di una chiamata, misurato a parte per non contare i controlli
+    states = list(unique.values())
+    start = time.perf_counter()
+    for s in states:
+        heuristic(s)
+    report['eval_us'] = (time.perf_counter() - start) / max(1, len(states)) * 1e6
+    return report
+
+
+def _bundled() -> dict[str, tuple[Callable[[], Problem], dict[str, CostFunction_t]]]:
+    """Problemi e euristiche dei moduli del progetto, indicizzati per nome"""
+    from benchmark import random_frogger_board, random_labirinth, random_puzzle
+    from cam import CannibalsAndMissionaries, heuristic as cam_heuristic
+    from frogger import FroggerProblem
+    from labirinth import LabirinthProblem
+    puzzle = importlib.import_module('8puzzle')
+
+    def labirinth(allow_diagonal: bool):
+        end = (31, 31)
+        return LabirinthProblem(random_labirinth(32, 32, seed=0), None, end,
+                                allow_diagonal=allow_diagonal)
+
+    def eight_puzzle():
+        problem = puzzle.EightPuzzleProblem(None)
+        problem.initial_state = puzzle.PuzzleState(random_puzzle(20, 0))
+        return problem
+
+    lab_heuristics = {
+        "manhattan": lambda s: abs(s.x - 31) + abs(s.y - 31),
+        "euclidean": lambda s: math.sqrt((s.x - 31) ** 2 + (s.y - 31) ** 2),
+    }
+    return {
+        "labirinth": (lambda: labirinth(False), lab_heuristics),
+        "labirinth-diagonal": (lambda: labirinth(True), lab_heuristics),
+        "8puzzle": (eight_puzzle, {
+            "misplaced_tiles": puzzle.misplaced_tiles,
+            "total_manhattan_distance": puzzle.total_manhattan_distance,
+        }),
+        "cam": (lambda: CannibalsAndMissionaries(None), {"heuristic": cam_heuristic}),
+        "frogger": (lambda: FroggerProblem(*random_frogger_board(seed=0), heuristic=None), {
+            "y": lambda s: s.y,
+            "y - 1 (frogger_game)": lambda s: s.y - 1,
+        }),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check admissibility and consistency of the bundled heuristics")
+    parser.add_argument("--walks", type=int, default=100)
+    parser.add_argument("--walk-length", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-states", type=int, default=500_000)
+    parser.add_argument("--problem", action="append")
+    args = parser.parse_args(argv)
+
+    bundled = _bundled()
+    for name in args.problem or list(bundled):
+        make, heuristics = bundled[name]
+        problem = make()
+        exact = explore(problem, max_states=args.max_states)
+        costs, complete = exact
+        print(f"{name} ({len(costs)} states{'' if complete else ', truncated'})")
+        for h_name, h in heuristics.items():
+            r = check_heuristic(problem, h, args.walks, args.walk_length, args.seed, exact=exact)
+            unknown = f"  unknown={r['unknown']}" if r['unknown'] else ""
+            print(f"  {h_name:<26} inadmissible={r['inadmissible']:<5} "
+                  f"(max +{r['max_overestimate']:g})  inconsistent={r['inconsistent']:<5} "
+                  f"nonzero goals={r['nonzero_goals']:<3} h/h*={r['mean_ratio']:.3f}  "
+                  f"{r['eval_us']:.2f} us/call{unknown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
-from copy import copy
+from collections import OrderedDict, deque
+import hashlib
 import math
-from tracemalloc import start
-from turtle import width
+import re
+from typing import TYPE_CHECKING
 from astar import CostFunction_t, State, Action, Problem
 
+# NumPy serve solo per l'indice delle componenti e per i campi di
+# distanza: viene importato quando serve, così il modulo si carica in fretta
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class LabState(State):
     problem: 'LabirinthProblem'
@@ -44,14 +50,32 @@ MOVES = {
     'north-west':   (-1, -1, 2, '↖'),
 }
 
+# Codici compatti delle mosse, usati per codificare i percorsi
+MOVE_CODES = {
+    'north':        'N',
+    'north-east':   'NE',
+    'east':         'E',
+    'south-east':   'SE',
+    'south':        'S',
+    'south-west':   'SW',
+    'west':         'W',
+    'north-west':   'NW',
+}
+
 class LabAction(Action):
     dx: int
     dy: int
     name: str
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, cost: float = None):
+        """
+        + `cost`: costo della mossa, se diverso da quello di `MOVES`
+                    (ad esempio per il terreno della casella di arrivo)
+        """
         self.name = name
         self.dx, self.dy, self.cost, _ = MOVES[name]
+        if cost is not None:
+            self.cost = cost
 
     def apply(self, state: LabState) -> LabState:
         x, y = state.x, state.y
@@ -62,98 +86,660 @@ class LabAction(Action):
             return None
         new_state.parent = state
         new_state.action = self
+        # Con il terreno, il costo dipende dalla casella di arrivo: l'azione
+        # può essere condivisa tra più stati, quindi non va modificata
+        move_costs = state.problem.move_costs
+        if move_costs is not None:
+            cost = move_costs[self.name][y * state.problem.width + x]
+            if cost != self.cost:
+                new_state.action = LabAction(self.name, cost)
         return new_state
 
     def __str__(self):
         return f"Move {self.name}"
 
 
+def map_fingerprint(labirinth) -> bytes:
+    """
+    Impronta del contenuto della mappa: due mappe con le stesse caselle
+    hanno la stessa impronta, qualsiasi sia l'oggetto che le contiene.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in labirinth:
+        try:
+            digest.update(bytes(row))
+        except (TypeError, ValueError):
+            # Caselle che non stanno in un byte (o non numeriche)
+            digest.update(repr(list(row)).encode())
+        # Separa le righe, così mappe di forma diversa restano diverse
+        digest.update(b"\xff")
+    return digest.digest()
+
+
+class GridComponents:
+    """
+    Indice delle componenti connesse delle caselle libere di un labirinto.
+
+    Viene calcolato una volta sola per mappa e permette di sapere in
+    tempo costante se due caselle sono collegate. Le modifiche alla
+    mappa vanno fatte con `open_cell` e `close_cell`, che aggiornano
+    le etichette in modo incrementale.
+    """
+    labirinth: list[list[int]]
+    width: int
+    height: int
+    allow_diagonal: bool
+
+    # Etichetta di ogni casella (indice y * width + x), -1 per i muri
+    labels: 'np.ndarray'
+    # Union-find sulle etichette, usato per unire le componenti
+    # quando viene aperta una casella senza rietichettare la mappa
+    parent: dict[int, int]
+    # Numero di modifiche alla mappa fatte tramite questo indice
+    version: int
+    # Prima etichetta libera, per le parti staccate da `close_cell`
+    next_label: int
+
+    def __init__(self, labirinth: list[list[int]], allow_diagonal=False,
+                 labels: 'np.ndarray' = None):
+        """
+        + `labels`: etichette già calcolate per questa mappa (ad esempio
+                    lette da un file di `mapfile`), per non ricalcolarle
+        """
+        self.labirinth = labirinth
+        self.width = len(labirinth[0])
+        self.height = len(labirinth)
+        self.allow_diagonal = allow_diagonal
+        self.parent = {}
+        self.version = 0
+        self.labels = labels if labels is not None else self._label_all()
+        self.next_label = max(self.width * self.height, int(self.labels.max(initial=-1)) + 1)
+        # Impronta della mappa, con la versione a cui si riferisce
+        self._fingerprint: tuple[int, bytes] | None = None
+
+    def fingerprint(self) -> bytes:
+        """Ritorna `map_fingerprint` della mappa, ricalcolata solo dopo una modifica"""
+        if self._fingerprint is None or self._fingerprint[0] != self.version:
+            self._fingerprint = (self.version, map_fingerprint(self.labirinth))
+        return self._fingerprint[1]
+
+    def neighbours(self):
+        """Ritorna gli spostamenti (dx, dy) che collegano due caselle"""
+        for move, (dx, dy, _, _) in MOVES.items():
+            if not self.allow_diagonal and '-' in move:
+                continue
+            yield dx, dy
+
+    def _label_all(self) -> 'np.ndarray':
+        import numpy as np
+
+        w, h = self.width, self.height
+        free = (np.asarray(self.labirinth) == 0).reshape(-1)
+        index = np.arange(w * h).reshape(h, w)
+
+        # Coppie di caselle libere adiacenti (ogni arco una sola volta)
+        a_list, b_list = [], []
+        for dx, dy in self.neighbours():
+            if dy < 0 or (dy == 0 and dx < 0):
+                continue
+            a = index[max(0, -dy):h - max(0, dy), max(0, -dx):w - max(0, dx)]
+            b = index[max(0, dy):h - max(0, -dy), max(0, dx):w - max(0, -dx)]
+            a, b = a.reshape(-1), b.reshape(-1)
+            both = free[a] & free[b]
+            a_list.append(a[both])
+            b_list.append(b[both])
+        a = np.concatenate(a_list) if a_list else np.zeros(0, dtype=int)
+        b = np.concatenate(b_list) if b_list else np.zeros(0, dtype=int)
+
+        # Ogni casella parte come radice di sé stessa, poi le radici
+        # vengono agganciate alla radice vicina più piccola e i
+        # puntatori compressi, finché non cambia più nulla
+        labels = np.arange(w * h)
+        while True:
+            la, lb = labels[a], labels[b]
+            smallest = np.minimum(la, lb)
+            hooked = labels.copy()
+            np.minimum.at(hooked, la, smallest)
+            np.minimum.at(hooked, lb, smallest)
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+
+        labels[~free] = -1
+        return labels
+
+    def _find(self, label: int) -> int:
+        root = label
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        # Comprimi il percorso
+        while label != root:
+            label, self.parent[label] = self.parent.get(label, label), root
+        return root
+
+    def label(self, x: int, y: int) -> int:
+        """Ritorna l'etichetta della componente della casella, o -1 se è un muro"""
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return -1
+        label = int(self.labels[y * self.width + x])
+        return -1 if label < 0 else self._find(label)
+
+    def connected(self, a: tuple[int, int], b: tuple[int, int]) -> bool:
+        """Ritorna se esiste un percorso tra le caselle `a` e `b`"""
+        la = self.label(*a)
+        return la >= 0 and la == self.label(*b)
+
+    def open_cell(self, x: int, y: int):
+        """Libera la casella (x, y) e unisce le componenti vicine"""
+        if self.label(x, y) >= 0:
+            return
+        self.labirinth[y][x] = 0
+        # Un'etichetta nuova: l'indice della casella può essere ancora
+        # l'etichetta della componente di cui faceva parte prima di chiuderla
+        i = self.next_label
+        self.next_label += 1
+        self.labels[y * self.width + x] = i
+        self.parent[i] = i
+
+        for dx, dy in self.neighbours():
+            other = self.label(x + dx, y + dy)
+            if other >= 0:
+                self.parent[other] = self._find(i)
+        self.version += 1
+
+    def close_cell(self, x: int, y: int):
+        """
+        Chiude la casella (x, y), dividendo se serve la sua componente.
+
+        Parte una visita da ogni vicino libero, e le visite procedono a
+        turno, una casella alla volta; quelle che si incontrano vengono
+        unite. Appena resta una sola visita non esaurita, le altre hanno
+        trovato le parti staccate dalla componente, che ricevono nuove
+        etichette, mentre la parte rimasta tiene la vecchia: il costo è
+        proporzionale al numero di vicini per la dimensione delle parti
+        più piccole, non a quella di tutta la componente.
+        """
+        if self.label(x, y) < 0:
+            return
+        self.labirinth[y][x] = 1
+        self.labels[y * self.width + x] = -1
+        self.version += 1
+
+        starts = []
+        for dx, dy in self.neighbours():
+            if self.label(x + dx, y + dy) >= 0:
+                starts.append((y + dy) * self.width + x + dx)
+        if len(starts) < 2:
+            # Un solo vicino (o nessuno): la componente non si divide
+            return
+        # Visita che ha raggiunto ogni casella, e visite unite tra loro
+        owner = {cell: i for i, cell in enumerate(starts)}
+        merged = list(range(len(starts)))
+        frontiers = [deque([cell]) for cell in starts]
+
+        def group(i: int) -> int:
+            while merged[i] != i:
+                merged[i] = merged[merged[i]]
+                i = merged[i]
+            return i
+
+        def active_groups() -> set[int]:
+            return {group(i) for i, frontier in enumerate(frontiers) if frontier}
+
+        active = active_groups()
+        while len(active) > 1:
+            for i, frontier in enumerate(frontiers):
+                if not frontier:
+                    continue
+                cell = frontier.popleft()
+                cx, cy = cell % self.width, cell // self.width
+                for dx, dy in self.neighbours():
+                    if self.label(cx + dx, cy + dy) < 0:
+                        continue
+                    n = (cy + dy) * self.width + cx + dx
+                    other = owner.get(n)
+                    if other is None:
+                        owner[n] = i
+                        frontier.append(n)
+                    elif group(other) != group(i):
+                        merged[group(other)] = group(i)
+            active = active_groups()
+
+        # Le visite esaurite hanno trovato tutte le caselle della loro parte
+        parts: dict[int, list[int]] = {}
+        for cell, i in owner.items():
+            parts.setdefault(group(i), []).append(cell)
+        kept = active.pop() if active else next(iter(parts))
+        for g, cells in parts.items():
+            if g == kept:
+                continue
+            # Un'etichetta mai usata, che nessuna casella rimasta può avere
+            label = self.next_label
+            self.next_label += 1
+            self.parent[label] = label
+            self.labels[cells] = label
+
+
 class LabirinthProblem(Problem):
+    # Formato degli stati codificati, per salvarli su disco
+    key_format = '2I'
     labirinth: list[list[int]]
     width: int
     height: int
+    components: GridComponents | None
+    # Costo di attraversamento di ogni casella (opzionale)
+    terrain: 'np.ndarray | None' = None
+    # Costo di ogni mossa verso ogni casella, già moltiplicato per il
+    # terreno: una lista piatta per mossa, indicizzata con y * width + x.
+    # Le liste di Python occupano più di un array NumPy (un riferimento
+    # di 8 byte per casella, più l'oggetto se il costo non è un intero
+    # piccolo), ma leggerne un elemento da Python costa molto meno di
+    # un'indicizzazione scalare di NumPy; piatte, basta un accesso solo
+    move_costs: dict[str, list[float]] | None = None
+    # Fattore per cui viene moltiplicata l'euristica data (il costo
+    # minimo del terreno, così resta ammissibile)
+    heuristic_scale: float = 1
 
     def __init__(self, labirinth: list[list[int]],
                  heuristic: CostFunction_t,
                  end_pos: tuple[int, int], start_pos=(0, 0),
-                 allow_diagonal = False):
+                 allow_diagonal = False,
+                 components: GridComponents = None,
+                 terrain: 'np.ndarray' = None):
+        """
+        + `terrain`: matrice `height` x `width` con il costo per entrare in
+                    ogni casella libera: il costo di una mossa diventa quello
+                    di `MOVES` per il costo della casella di arrivo, e
+                    l'euristica (che deve essere ammissibile per i costi di
+                    `MOVES`) viene moltiplicata per il costo minimo, così
+                    come i valori di un'eventuale `batch_heuristic`.
+        """
         self.labirinth = labirinth
         self.width = len(labirinth[0])
         self.height = len(labirinth)
         self.heuristic = heuristic
         self.allow_diagonal = allow_diagonal
+        self.components = components
+        if terrain is not None:
+            self._set_terrain(terrain)
 
         self.initial_state = LabState(self, start_pos[0], start_pos[1])
         self.end_pos = end_pos
 
+    def _set_terrain(self, terrain: 'np.ndarray'):
+        import numpy as np
+
+        terrain = np.asarray(terrain)
+        if terrain.shape != (self.height, self.width):
+            raise ValueError(f"Terrain shape {terrain.shape} does not match the "
+                             f"labirinth ({self.height}, {self.width})")
+        free = np.asarray(self.labirinth) == 0
+        if not free.any():
+            return
+        if (terrain[free] <= 0).any():
+            raise ValueError("Terrain costs of free cells must be positive")
+
+        self.terrain = terrain
+        self.move_costs = {move: (terrain * cost).ravel().tolist()
+                           for move, (_, _, cost, _) in MOVES.items()}
+        # .item() riporta un int o un float di Python, così la coda a
+        # bucket resta utilizzabile con costi interi
+        self.heuristic_scale = terrain[free].min().item()
+        if self.heuristic_scale != 1:
+            heuristic, scale = self.heuristic, self.heuristic_scale
+            self.heuristic = lambda state: scale * heuristic(state)
+
+    def evaluate_heuristic(self, states: list[LabState]) -> list[int]:
+        h = super().evaluate_heuristic(states)
+        # `heuristic` è già scalata, `batch_heuristic` (assegnata anche dopo) no
+        if self.batch_heuristic is None or self.heuristic_scale == 1:
+            return h
+        scale = self.heuristic_scale
+        return [scale * v for v in h]
+
     def possible_actions(self, state: LabState):
+        base = state.y * self.width + state.x
         for move in MOVES:
             if not self.allow_diagonal and '-' in move:
                 continue
-            yield LabAction(move)
+            if self.move_costs is None:
+                yield LabAction(move)
+                continue
+            # Il costo è già quello verso la casella di arrivo, così
+            # le ricerche possono leggerlo dall'azione applicata
+            dx, dy, _, _ = MOVES[move]
+            x, y = state.x + dx, state.y + dy
+            if 0 <= x < self.width and 0 <= y < self.height:
+                yield LabAction(move, self.move_costs[move][base + dy * self.width + dx])
+
+    def has_unit_costs(self) -> bool:
+        # Le diagonali costano 2, e il terreno moltiplica il costo delle mosse
+        if self.allow_diagonal:
+            return False
+        if self.terrain is None:
+            return True
+        import numpy as np
+        free = np.asarray(self.labirinth) == 0
+        return bool((self.terrain[free] == 1).all())
+
+    def encode_state(self, state: LabState) -> tuple[int, int]:
+        return state.x, state.y
+
+    def decode_state(self, key: tuple[int, int]) -> LabState:
+        return LabState(self, key[0], key[1])
+
+    def state_count(self) -> int:
+        return self.width * self.height
+
+    def rank_state(self, state: LabState) -> int:
+        return state.y * self.width + state.x
+
+    def unrank_state(self, rank: int) -> LabState:
+        return LabState(self, rank % self.width, rank // self.width)
+
+    def distance_field(self, goals: list[tuple[int, int]] = None) -> 'np.ndarray':
+        """
+        Calcola con una sola ricerca il costo minimo per arrivare dalla
+        posizione iniziale ad ogni casella (o solo a quelle in `goals`).
+
+        Riporta una matrice `height` x `width` con i costi, dove le
+        caselle non raggiunte valgono `inf`.
+        """
+        targets = None
+        if goals is not None:
+            targets = {hash(LabState(self, x, y)) for x, y in goals}
+        settled = self.uniform_cost(self.initial_state, targets)
+
+        import numpy as np
+        field = np.full((self.height, self.width), np.inf)
+        for s in settled.values():
+            field[s.y, s.x] = s.g
+        return field
+
+    def is_unreachable(self, state: LabState) -> bool:
+        # Senza indice delle componenti non si può dire nulla
+        if self.components is None or self.components.allow_diagonal != self.allow_diagonal:
+            return False
+        return not self.components.connected((state.x, state.y), self.end_pos)
+
+
+def euclidean_batch(end_pos: tuple[int, int]):
+    """Versione vettoriale dell'euristica di `solve_labirinth`, per `batch_heuristic`"""
+    import numpy as np
+    end = np.array(end_pos)
+
+    def heuristic(packed: 'np.ndarray') -> 'np.ndarray':
+        return np.floor(np.sqrt(((packed - end)**2).sum(axis=1))).astype(int)
+    return heuristic
+
+
+def manhattan_batch(end_pos: tuple[int, int]):
+    """Distanza di Manhattan da `end_pos` in forma vettoriale, per `batch_heuristic`"""
+    import numpy as np
+    end = np.array(end_pos)
+
+    def heuristic(packed: 'np.ndarray') -> 'np.ndarray':
+        return np.abs(packed - end).sum(axis=1)
+    return heuristic
+
+
+class CachedPath:
+    """Percorso ottimo memorizzato nella `PathCache`"""
+    # Caselle attraversate, dalla partenza all'arrivo
+    positions: list[tuple[int, int]]
+    actions: list[LabAction]
+    # Costo per arrivare ad ogni casella del percorso
+    costs: list[int]
+    # Posizione di ogni casella nella lista `positions`
+    index: dict[tuple[int, int], int]
+
+    def __init__(self, start_pos: tuple[int, int], actions: list[LabAction]):
+        self.actions = actions
+        self.positions = [start_pos]
+        self.costs = [0]
+        x, y = start_pos
+        for a in actions:
+            x, y = x + a.dx, y + a.dy
+            self.positions.append((x, y))
+            self.costs.append(self.costs[-1] + a.cost)
+        self.index = {p: i for i, p in enumerate(self.positions)}
+
+
+class PathCache:
+    """
+    Cache LRU dei percorsi ottimi trovati su una stessa mappa.
+
+    Le chiavi sono (mappa, diagonali, partenza, arrivo), dove la mappa
+    è una chiave che ne identifica il contenuto (ad esempio la sua
+    `map_fingerprint`): così la stessa cache può servire mappe diverse,
+    e i percorsi calcolati prima di una modifica non vengono più usati.
+    Oltre alle richieste identiche, serve anche quelle la cui partenza
+    e il cui arrivo stanno, in quest'ordine, su un percorso già in
+    cache, dato che ogni tratto di un percorso ottimo è ottimo.
+    """
+    max_entries: int
+    entries: OrderedDict[tuple, CachedPath]
+    stats: dict[str, int]
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'subpath_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def lookup(self, map_key, allow_diagonal: bool,
+               start_pos: tuple[int, int], end_pos: tuple[int, int]) -> list[LabAction] | None:
+        """Ritorna il percorso da `start_pos` a `end_pos` se è ricavabile dalla cache"""
+        key = (map_key, allow_diagonal, start_pos, end_pos)
+        cached = self.entries.get(key)
+        if cached is not None:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return list(cached.actions)
+
+        for entry, cached in self.entries.items():
+            m, diagonal, _, _ = entry
+            if m != map_key or diagonal != allow_diagonal:
+                continue
+            i, j = cached.index.get(start_pos), cached.index.get(end_pos)
+            if i is not None and j is not None and i <= j:
+                # Anche un percorso usato solo per i suoi tratti è in uso
+                self.entries.move_to_end(entry)
+                self.stats['subpath_hits'] += 1
+                return cached.actions[i:j]
+
+        self.stats['misses'] += 1
+        return None
+
+    def store(self, map_key, allow_diagonal: bool,
+              start_pos: tuple[int, int], end_pos: tuple[int, int], actions: list[LabAction]):
+        """Memorizza un percorso ottimo, eliminando il meno usato se la cache è piena"""
+        key = (map_key, allow_diagonal, start_pos, end_pos)
+        self.entries[key] = CachedPath(start_pos, actions)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def exact_costs(self, map_key, allow_diagonal: bool,
+                    end_pos: tuple[int, int]) -> dict[tuple[int, int], int]:
+        """
+        Ritorna il costo esatto per arrivare a `end_pos` da ogni casella
+        che si trova su un percorso in cache diretto a `end_pos`.
+        """
+        exact = {}
+        for (m, diagonal, _, goal), cached in self.entries.items():
+            if m != map_key or diagonal != allow_diagonal or goal != end_pos:
+                continue
+            total = cached.costs[-1]
+            for p, cost in zip(cached.positions, cached.costs):
+                exact[p] = total - cost
+        return exact
 
 
 # Utility per risolvere un labirinto (sfrutta A*)
-def solve_labirinth(labirinth, start_pos, end_pos, show_steps=True, allow_diagonal=True):
+def solve_labirinth(labirinth, start_pos, end_pos, show_steps=True, allow_diagonal=True,
+                    components: GridComponents = None, cache: PathCache = None,
+                    terrain: 'np.ndarray' = None):
     def heuristic(state: LabState):
         return math.floor(math.sqrt((state.x - end_pos[0])**2 + (state.y - end_pos[1])**2))
 
-    problem = LabirinthProblem(labirinth, heuristic, end_pos, start_pos, allow_diagonal)
-    solution = problem.astar(show=False)
+    solution = None
+    # I percorsi in cache non tengono conto del terreno
+    if terrain is not None:
+        cache = None
+    if cache is not None:
+        # La chiave identifica il contenuto della mappa, non l'oggetto:
+        # la stessa lista modificata non deve riusare i vecchi percorsi
+        map_key = components.fingerprint() if components is not None else map_fingerprint(labirinth)
+        solution = cache.lookup(map_key, allow_diagonal, start_pos, end_pos)
+
+    if solution is None:
+        # I percorsi in cache verso lo stesso arrivo danno il costo
+        # esatto delle loro caselle: usalo per stringere l'euristica
+        exact = {}
+        if cache is not None:
+            exact = cache.exact_costs(map_key, allow_diagonal, end_pos)
+        if exact:
+            euclidean = heuristic
+            def heuristic(state: LabState):
+                return max(euclidean(state), exact.get((state.x, state.y), 0))
+
+        problem = LabirinthProblem(labirinth, heuristic, end_pos, start_pos, allow_diagonal,
+                                   components, terrain)
+        solution = problem.astar(show=False)
+
+        if cache is not None and solution is not None:
+            cache.store(map_key, allow_diagonal, start_pos, end_pos, solution)
 
     if solution is None:
         print(" There is no solution!")
         return
 
-    solved = copy(labirinth)
-    x, y = start_pos
     cost = 0
     for i, a in enumerate(solution):
-        solved[y][x] = MOVES[a.name][3]
-
-        # Applica l'azione
-        x += a.dx
-        y += a.dy
         cost += a.cost
-
         if show_steps:
             print(f"{i:3}) {a}")
 
-    solved[y][x] = "*"
-
     print(f"Solution is {len(solution)} steps (total cost={cost})")
-    for row in solved:
+    print(render_path(labirinth, start_pos, solution, terrain))
+
+
+def run_lengths(actions: list[LabAction]) -> list[tuple[str, int]]:
+    """Raggruppa le mosse consecutive uguali in coppie (mossa, ripetizioni)"""
+    runs: list[tuple[str, int]] = []
+    for a in actions:
+        if runs and runs[-1][0] == a.name:
+            runs[-1] = (a.name, runs[-1][1] + 1)
+        else:
+            runs.append((a.name, 1))
+    return runs
+
+
+def encode_path(actions: list[LabAction]) -> str:
+    """Codifica un percorso in forma compatta, ad esempio `E3SE1S12`"""
+    return "".join(f"{MOVE_CODES[name]}{count}" for name, count in run_lengths(actions))
+
+
+def decode_path(encoded: str) -> list[LabAction]:
+    """Ricostruisce il percorso codificato con `encode_path`"""
+    names = {code: name for name, code in MOVE_CODES.items()}
+    actions: list[LabAction] = []
+    for code, count in re.findall(r"([NSEW]+)(\d+)", encoded):
+        # La stessa azione per tutte le mosse uguali: `apply` non la
+        # modifica, e con il terreno il costo vero è quello dell'azione
+        # dello stato a cui arriva
+        action = LabAction(names[code])
+        actions.extend([action] * int(count))
+    return actions
+
+
+# Sfumature delle caselle libere in base al costo del terreno, dal più basso
+TERRAIN_SHADES = " ░▒▓"
+
+
+def render_path(labirinth, start_pos: tuple[int, int], actions: list[LabAction],
+                terrain: 'np.ndarray' = None) -> str:
+    """
+    Disegna il percorso sul labirinto e riporta il disegno come stringa.
+
+    Le caselle del percorso vengono tenute in un dizionario a parte,
+    quindi la mappa non viene né copiata né modificata. Con `terrain`,
+    le caselle libere vengono sfumate in base al loro costo.
+    """
+    shades = None
+    if terrain is not None:
+        import numpy as np
+        terrain = np.asarray(terrain, dtype=float)
+        free = np.asarray(labirinth) == 0
+        low, high = terrain[free].min(), terrain[free].max()
+        levels = len(TERRAIN_SHADES) - 1
+        scaled = (terrain - low) / (high - low) * levels if high > low else np.zeros_like(terrain)
+        shades = np.clip(np.rint(scaled), 0, levels).astype(int).tolist()
+
+    path: dict[tuple[int, int], str] = {}
+    x, y = start_pos
+    for a in actions:
+        path[(x, y)] = MOVES[a.name][3]
+        x, y = x + a.dx, y + a.dy
+    path[(x, y)] = "*"
+
+    lines = []
+    for y, row in enumerate(labirinth):
+        line = []
         for x, n in enumerate(row):
-            if n == 1: print("█", end="")
-            elif n == 0: print(" ", end="")
-            else: print(f"{n}", end="")
-        print()
-
-
-
-labirinth = [
-    [0, 0, 1, 0, 0],
-    [0, 0, 1, 0, 1],
-    [0, 0, 1, 0, 0],
-    [0, 0, 1, 0, 0],
-    [0, 0, 0, 0, 0],
-]
-start_pos = (0, 0)
-end_pos = (4, 0)
-
-solve_labirinth(labirinth, start_pos, end_pos, show_steps=False, allow_diagonal=True)
-
-
-labirinth = [
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-    [1, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1, 1],
-    [1, 1, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
-    [1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 0, 1],
-    [1, 1, 1, 0, 0, 0, 0, 1, 1, 1, 1, 1],
-    [1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1],
-    [1, 0, 1, 0, 0, 0, 0, 0, 1, 1, 0, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1],
-]
-start_pos = (1, 1)
-end_pos = (10, 7)
-solve_labirinth(labirinth, start_pos, end_pos, show_steps=False, allow_diagonal=False)
+            c = path.get((x, y))
+            if c is not None: line.append(c)
+            elif n == 1: line.append("█")
+            elif n == 0: line.append(TERRAIN_SHADES[shades[y][x]] if shades else " ")
+            else: line.append(f"{n}")
+        lines.append("".join(line))
+    return "\n".join(lines)
+
+
+def main():
+    labirinth = [
+        [0, 0, 1, 0, 0],
+        [0, 0, 1, 0, 1],
+        [0, 0, 1, 0, 0],
+        [0, 0, 1, 0, 0],
+        [0, 0, 0, 0, 0],
+    ]
+    start_pos = (0, 0)
+    end_pos = (4, 0)
+
+    solve_labirinth(labirinth, start_pos, end_pos, show_steps=False, allow_diagonal=True)
+
+
+    labirinth = [
+        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        [1, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1, 1],
+        [1, 1, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+        [1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 0, 1],
+        [1, 1, 1, 0, 0, 0, 0, 1, 1, 1, 1, 1],
+        [1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1],
+        [1, 0, 1, 0, 0, 0, 0, 0, 1, 1, 0, 1],
+        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1],
+    ]
+    start_pos = (1, 1)
+    end_pos = (10, 7)
+    solve_labirinth(labirinth, start_pos, end_pos, show_steps=False, allow_diagonal=False)
+
+
+    # Labirinto senza muri, con una palude costosa al centro
+    labirinth = [[0] * 12 for _ in range(8)]
+    terrain = [[1] * 12 for _ in range(8)]
+    for y in range(1, 7):
+        for x in range(3, 9):
+            terrain[y][x] = 5 if 2 <= y <= 5 and 4 <= x <= 7 else 3
+    solve_labirinth(labirinth, (0, 4), (11, 4), show_steps=False, allow_diagonal=False,
+                    terrain=terrain)
+
+
+if __name__ == "__main__":
+    main()
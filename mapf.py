@@ -0,0 +1,434 @@
+# Ricerca di percorsi per più agenti sullo stesso labirinto (MAPF)
+#
+# Gli agenti vengono pianificati uno alla volta, in ordine di priorità,
+# con A* nello spazio-tempo: ogni stato è (x, y, t), e un agente può
+# muoversi in una delle quattro direzioni oppure restare fermo. I percorsi
+# già pianificati occupano una tabella di prenotazioni condivisa indicizzata
+# per (casella, t), che gli agenti successivi devono rispettare
+# (Cooperative A*). Con una finestra, le prenotazioni valgono solo per i
+# prossimi `window` passi e gli agenti ripianificano periodicamente
+# (Windowed Hierarchical Cooperative A*).
+#
+#   python mapf.py --size 64 --agents 10 --agents 100 --agents 500
+import argparse
+import contextlib
+import io
+import math
+import random
+import time
+
+from astar import Action, Problem, State
+from labirinth import MOVES, GridComponents
+
+# Gli agenti si muovono solo in orizzontale e in verticale: ogni mossa
+# (o attesa) dura un passo di tempo e costa 1
+SPACE_TIME_MOVES = {
+    'wait': (0, 0),
+    **{name: (dx, dy) for name, (dx, dy, _, _) in MOVES.items() if '-' not in name},
+}
+
+
+class ReservationTable:
+    """
+    Caselle occupate dagli agenti nel tempo.
+
+    Ogni prenotazione è indicizzata da un solo intero,
+    `(t * height + y) * width + x`, in un dizionario. Un agente arrivato
+    alla sua destinazione vi resta "parcheggiato" da un certo istante in
+    poi, senza prenotare ogni passo successivo.
+    """
+    width: int
+    height: int
+    # Agente che occupa la casella all'istante t
+    cells: dict[int, int]
+    # Per ogni casella (y * width + x): (agente, istante da cui è parcheggiato)
+    parked: dict[int, tuple[int, int]]
+    # Ultimo istante in cui la casella è prenotata
+    last: dict[int, int]
+
+    def __init__(self, width: int, height: int):
+        self.width, self.height = width, height
+        self.cells = {}
+        self.parked = {}
+        self.last = {}
+
+    def reserve(self, x: int, y: int, t: int, agent: int):
+        cell = y * self.width + x
+        self.cells[t * self.width * self.height + cell] = agent
+        if t > self.last.get(cell, -1):
+            self.last[cell] = t
+
+    def park(self, x: int, y: int, t: int, agent: int):
+        """Occupa la casella dall'istante `t` in poi"""
+        self.parked[y * self.width + x] = (agent, t)
+
+    def owner(self, x: int, y: int, t: int) -> int | None:
+        """Ritorna l'agente che occupa la casella all'istante `t`, se c'è"""
+        cell = y * self.width + x
+        agent = self.cells.get(t * self.width * self.height + cell)
+        if agent is not None:
+            return agent
+        parked = self.parked.get(cell)
+        if parked is not None and t >= parked[1]:
+            return parked[0]
+        return None
+
+    def free_after(self, x: int, y: int, t: int, agent: int) -> bool:
+        """Ritorna se l'agente può fermarsi per sempre nella casella dall'istante `t`"""
+        cell = y * self.width + x
+        parked = self.parked.get(cell)
+        if parked is not None and parked[0] != agent:
+            return False
+        if self.last.get(cell, -1) <= t:
+            return True
+        # Qualche prenotazione successiva: controlla se è di altri
+        return all(self.owner(x, y, u) in (None, agent) for u in range(t + 1, self.last[cell] + 1))
+
+    def __len__(self) -> int:
+        return len(self.cells) + len(self.parked)
+
+
+class SpaceTimeState(State):
+    problem: 'SpaceTimeProblem'
+    x: int
+    y: int
+    t: int
+
+    def __init__(self, problem: 'SpaceTimeProblem', x: int, y: int, t: int):
+        self.problem = problem
+        self.x, self.y, self.t = x, y, t
+
+    def is_final(self) -> bool:
+        p = self.problem
+        if (self.x, self.y) != p.goal:
+            return False
+        return p.reservations.free_after(self.x, self.y, self.t, p.agent)
+
+    def is_invalid(self) -> bool:
+        p = self.problem
+        x, y, t = self.x, self.y, self.t
+        if x < 0 or x >= p.width or y < 0 or y >= p.height:
+            return True
+        if p.labirinth[y][x] != 0 or t > p.deadline:
+            return True
+        # Oltre la finestra le prenotazioni non contano
+        if t > p.horizon:
+            return False
+        return p.reservations.owner(x, y, t) not in (None, p.agent)
+
+    def __hash__(self) -> int:
+        # Oltre la finestra lo stato non dipende più dal tempo
+        return hash((self.x, self.y, min(self.t, self.problem.horizon + 1)))
+
+    def __str__(self):
+        return f"[{self.x}, {self.y}] at t={self.t}"
+
+
+class SpaceTimeAction(Action):
+    name: str
+    dx: int
+    dy: int
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dx, self.dy = SPACE_TIME_MOVES[name]
+
+    def apply(self, state: SpaceTimeState) -> SpaceTimeState:
+        p = state.problem
+        new_state = SpaceTimeState(p, state.x + self.dx, state.y + self.dy, state.t + 1)
+        if new_state.is_invalid():
+            return None
+
+        # Due agenti non possono scambiarsi di posto nello stesso passo
+        if self.name != 'wait' and new_state.t <= p.horizon:
+            other = p.reservations.owner(new_state.x, new_state.y, state.t)
+            if other is not None and other != p.agent and \
+                    p.reservations.owner(state.x, state.y, new_state.t) == other:
+                return None
+
+        new_state.parent = state
+        new_state.action = self
+        return new_state
+
+    def __str__(self):
+        return self.name
+
+
+class SpaceTimeProblem(Problem):
+    """
+    Percorso di un agente nel labirinto, evitando le caselle prenotate
+    dagli altri agenti. L'euristica è la distanza esatta dalla
+    destinazione ignorando gli altri agenti (`distance_to`).
+    """
+    # Formato degli stati codificati, per salvarli su disco
+    key_format = '3I'
+    labirinth: list[list[int]]
+    width: int
+    height: int
+    agent: int
+    goal: tuple[int, int]
+    reservations: ReservationTable
+    # Ultimo istante in cui contano le prenotazioni
+    horizon: float
+    # Ultimo istante oltre il quale l'agente rinuncia
+    deadline: float
+
+    def __init__(self, labirinth: list[list[int]], agent: int, start: tuple[int, int],
+                 goal: tuple[int, int], t0: int, reservations: ReservationTable,
+                 field: list[list[float]], horizon: float = math.inf, deadline: float = math.inf):
+        self.labirinth = labirinth
+        self.width, self.height = len(labirinth[0]), len(labirinth)
+        self.agent = agent
+        self.goal = goal
+        self.reservations = reservations
+        self.horizon = horizon
+        self.deadline = deadline
+        self.field = field
+        self.heuristic = lambda s: field[s.y][s.x]
+        self.initial_state = SpaceTimeState(self, start[0], start[1], t0)
+
+    def possible_actions(self, state: SpaceTimeState):
+        for name in SPACE_TIME_MOVES:
+            yield SpaceTimeAction(name)
+
+    def encode_state(self, state: SpaceTimeState) -> tuple[int, int, int]:
+        return state.x, state.y, state.t
+
+    def decode_state(self, key: tuple[int, int, int]) -> SpaceTimeState:
+        return SpaceTimeState(self, *key)
+
+    def is_unreachable(self, state: SpaceTimeState) -> bool:
+        # Destinazione isolata, oppure occupata per sempre da un altro agente
+        if self.field[state.y][state.x] == math.inf:
+            return True
+        parked = self.reservations.parked.get(self.goal[1] * self.width + self.goal[0])
+        return parked is not None and parked[0] != self.agent
+
+
+def distance_to(labirinth, goal: tuple[int, int]) -> list[list[float]]:
+    """
+    Distanza (in passi, senza diagonali) di ogni casella da `goal`,
+    calcolata con una visita in ampiezza vettoriale sull'intera mappa.
+    Le caselle da cui `goal` non è raggiungibile valgono `inf`.
+    """
+    import numpy as np
+
+    free = np.asarray(labirinth) == 0
+    field = np.full(free.shape, np.inf)
+    frontier = np.zeros(free.shape, dtype=bool)
+    frontier[goal[1], goal[0]] = True
+    distance = 0
+    while frontier.any():
+        field[frontier] = distance
+        grown = np.zeros_like(frontier)
+        grown[1:] |= frontier[:-1]
+        grown[:-1] |= frontier[1:]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & free & (field == np.inf)
+        distance += 1
+    # Distanze intere, così A* può usare la coda a bucket
+    return [[int(d) if d != math.inf else math.inf for d in row] for row in field.tolist()]
+
+
+Agent_t = tuple[tuple[int, int], tuple[int, int]]
+
+
+def plan_agents(labirinth: list[list[int]], agents: list[Agent_t], window: int = None,
+                step: int = None, max_steps: int = None) -> tuple[list[list[tuple[int, int]]], dict]:
+    """
+    Pianifica i percorsi senza collisioni degli agenti, dati come
+    coppie (partenza, destinazione).
+
+    + `window`: passi per cui valgono le prenotazioni (di default tutti:
+                Cooperative A*, una sola pianificazione per agente)
+    + `step`: passi eseguiti prima di ripianificare, con la finestra
+                (di default metà della finestra)
+    + `max_steps`: durata massima della simulazione (di default
+                4 * (larghezza + altezza))
+
+    Riporta, per ogni agente, la sua posizione ad ogni istante (tutti i
+    percorsi hanno la stessa lunghezza, e gli agenti arrivati restano
+    fermi), e le statistiche: agenti arrivati, makespan, somma dei
+    costi, ripianificazioni, stati espansi e tempo impiegato.
+    Gli agenti che non trovano un percorso restano fermi dove sono.
+    """
+    width, height = len(labirinth[0]), len(labirinth)
+    if max_steps is None:
+        max_steps = 4 * (width + height)
+    if window is not None and step is None:
+        step = max(1, window // 2)
+
+    fields = {}
+    for _, goal in agents:
+        if goal not in fields:
+            fields[goal] = distance_to(labirinth, goal)
+
+    positions = [start for start, _ in agents]
+    paths = [[start] for start in positions]
+    stats = {'agents': len(agents), 'searches': 0, 'replans': 0, 'expanded': 0}
+    start_time = time.perf_counter()
+
+    t = 0
+    while True:
+        active = [i for i, (_, goal) in enumerate(agents) if positions[i] != goal]
+        if not active or t >= max_steps:
+            break
+        horizon = t + window if window is not None else math.inf
+
+        # Gli agenti che non trovano un percorso restano fermi: le loro
+        # caselle vengono prenotate e la pianificazione riparte da capo
+        waiting: set[int] = set()
+        while True:
+            reservations = ReservationTable(width, height)
+            for i, (x, y) in enumerate(positions):
+                # Nessuno può entrare al primo passo in una casella occupata
+                reservations.reserve(x, y, t, i)
+                reservations.reserve(x, y, t + 1, i)
+                if i in waiting or i not in active:
+                    reservations.park(x, y, t, i)
+
+            plans: dict[int, list[tuple[int, int]]] = {}
+            failed = None
+            for i in active:
+                if i in waiting:
+                    continue
+                plan = _plan(labirinth, i, positions[i], agents[i][1], t, reservations,
+                             fields[agents[i][1]], horizon, stats)
+                if plan is None:
+                    waiting.add(i)
+                    x, y = positions[i]
+                    # Se nessun percorso già pianificato passa di qui, basta fermarsi
+                    if reservations.free_after(x, y, t, i):
+                        reservations.park(x, y, t, i)
+                        continue
+                    failed = i
+                    break
+                plans[i] = plan
+                for dt, (x, y) in enumerate(plan):
+                    if t + dt > horizon:
+                        break
+                    reservations.reserve(x, y, t + dt, i)
+                if plan[-1] == agents[i][1]:
+                    reservations.park(*plan[-1], t + len(plan) - 1, i)
+
+            if failed is None:
+                break
+            stats['replans'] += 1
+
+        # Esegui i piani fino alla prossima ripianificazione
+        duration = step if window is not None else max((len(p) for p in plans.values()), default=1) - 1
+        duration = max(1, min(duration, max_steps - t))
+        for dt in range(1, duration + 1):
+            for i in range(len(agents)):
+                plan = plans.get(i)
+                if plan is not None:
+                    positions[i] = plan[min(dt, len(plan) - 1)]
+                paths[i].append(positions[i])
+        t += duration
+        if window is None and waiting:
+            # Senza finestra non si ripianifica: chi non ha un percorso resta fermo
+            break
+
+    stats['elapsed'] = time.perf_counter() - start_time
+    stats['arrived'] = sum(1 for i, (_, goal) in enumerate(agents) if positions[i] == goal)
+    # I passi aggiunti dall'ultima finestra dopo l'arrivo di tutti non contano
+    stats['makespan'] = max((_arrival(path) for path in paths), default=0)
+    stats['sum_of_costs'] = sum(_arrival(path) for path in paths)
+    return paths, stats
+
+
+def _plan(labirinth, agent: int, start, goal, t0: int, reservations: ReservationTable,
+          field, horizon: float, stats: dict) -> list[tuple[int, int]] | None:
+    # L'agente rinuncia se impiega molto più della distanza senza ostacoli
+    limit = field[start[1]][start[0]]
+    if limit == math.inf:
+        return None
+    deadline = t0 + 2 * limit + len(field) + len(field[0])
+    problem = SpaceTimeProblem(labirinth, agent, start, goal, t0, reservations, field,
+                               horizon, deadline)
+    with contextlib.redirect_stdout(io.StringIO()):
+        actions = problem.astar(problem.initial_state, show=False)
+    stats['searches'] += 1
+    stats['expanded'] += problem.stats.get('expanded', 0)
+    if actions is None:
+        return None
+
+    plan = [start]
+    x, y = start
+    for a in actions:
+        x, y = x + a.dx, y + a.dy
+        plan.append((x, y))
+    return plan
+
+
+def _arrival(path: list[tuple[int, int]]) -> int:
+    # Il costo di un agente è l'istante in cui arriva per l'ultima volta
+    t = len(path) - 1
+    while t > 0 and path[t - 1] == path[-1]:
+        t -= 1
+    return t
+
+
+def conflicts(paths: list[list[tuple[int, int]]]) -> int:
+    """Conta le collisioni tra i percorsi: stessa casella nello stesso istante o scambi"""
+    count = 0
+    for t in range(max(len(p) for p in paths)):
+        at = lambda p, u: p[min(u, len(p) - 1)]
+        seen = {}
+        for p in paths:
+            cell = at(p, t)
+            count += cell in seen
+            seen[cell] = p
+        if t > 0:
+            moves = {(at(p, t - 1), at(p, t)) for p in paths if at(p, t - 1) != at(p, t)}
+            count += sum(1 for a, b in moves if (b, a) in moves) // 2
+    return count
+
+
+def random_agents(labirinth: list[list[int]], n: int, seed=0) -> list[Agent_t]:
+    """Sceglie partenze e destinazioni distinte nella componente connessa più grande"""
+    width, height = len(labirinth[0]), len(labirinth)
+    index = GridComponents(labirinth)
+    by_label: dict[int, list[tuple[int, int]]] = {}
+    for y in range(height):
+        for x in range(width):
+            label = index.label(x, y)
+            if label >= 0:
+                by_label.setdefault(label, []).append((x, y))
+    cells = max(by_label.values(), key=len, default=[])
+    if len(cells) < n:
+        raise ValueError(f"Only {len(cells)} connected cells for {n} agents")
+
+    rng = random.Random(seed)
+    return list(zip(rng.sample(cells, n), rng.sample(cells, n)))
+
+
+def main(argv=None):
+    from benchmark import random_labirinth, rooms_labirinth
+
+    parser = argparse.ArgumentParser(description="Benchmark cooperative and windowed multi-agent A*")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--agents", type=int, action="append")
+    parser.add_argument("--window", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    maps = {
+        "random": random_labirinth(args.size, args.size, args.density, args.seed),
+        "rooms": rooms_labirinth(args.size, args.size, seed=args.seed),
+    }
+    for map_name, lab in maps.items():
+        for n in args.agents or [10, 50, 100, 200, 500]:
+            agents = random_agents(lab, n, args.seed)
+            for mode, window in (("cooperative", None), (f"window-{args.window}", args.window)):
+                paths, stats = plan_agents(lab, agents, window)
+                print(f"{map_name:<7} agents={n:<4} {mode:<12} arrived={stats['arrived']:<4} "
+                      f"makespan={stats['makespan']:<4} soc={stats['sum_of_costs']:<6} "
+                      f"conflicts={conflicts(paths):<3} replans={stats['replans']:<4} "
+                      f"{stats['elapsed'] * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
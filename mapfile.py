@@ -0,0 +1,249 @@
+# Formato binario delle mappe, letto tramite mmap
+#
+# Un file contiene un'intestazione, la tabella delle tabelle accessorie,
+# le caselle della mappa (un byte per casella, riga per riga) e le
+# tabelle accessorie (ad esempio il verso del traffico di Frogger o le
+# etichette delle componenti connesse). Aprire un file non legge né
+# copia le caselle: le righe della mappa sono viste sulla memoria del
+# file, e i processi che aprono lo stesso file ne condividono le pagine.
+#
+#   grid = MappedGrid("maze.map")
+#   problem = LabirinthProblem(grid, heuristic, end_pos)
+import mmap
+import struct
+import weakref
+from array import array
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b'AMAP'
+FORMAT_VERSION = 1
+
+# Tipi di mappa
+KINDS = {'labirinth': 0, 'frogger': 1}
+
+# magic, versione, tipo, larghezza, altezza, numero di tabelle accessorie
+HEADER = struct.Struct('<4sHHIII')
+# nome, codice del tipo (come in `array`), posizione nel file, elementi
+SIDECAR = struct.Struct('<16s1s7xQQ')
+# Allineamento dei blocchi di dati nel file
+ALIGN = 8
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_map(path: str, cells: 'Iterable[Iterable[int]] | np.ndarray', kind: str = 'labirinth',
+              sidecars: dict[str, tuple[str, Iterable]] = None):
+    """
+    Scrive una mappa nel formato binario.
+
+    + `cells`: righe della mappa (liste di interi tra 0 e 255, oppure
+                una matrice NumPy)
+    + `kind`: tipo di mappa, tra quelli di `KINDS`
+    + `sidecars`: tabelle accessorie, per nome: (codice del tipo come
+                in `array`, valori)
+    """
+    rows = [bytes(bytearray(row)) for row in cells]
+    height, width = len(rows), len(rows[0])
+    if any(len(row) != width for row in rows):
+        raise ValueError("All rows must have the same width")
+
+    tables = [(name, code, array(code, values)) for name, (code, values) in (sidecars or {}).items()]
+    for name, _, _ in tables:
+        if len(name.encode()) > 16:
+            raise ValueError(f"Sidecar name {name!r} is longer than 16 bytes")
+
+    # Posizione di ogni blocco: caselle e poi le tabelle, allineate
+    offset = _align(HEADER.size + SIDECAR.size * len(tables))
+    cells_offset = offset
+    offset = _align(offset + width * height)
+    entries = []
+    for name, code, values in tables:
+        entries.append(SIDECAR.pack(name.encode(), code.encode(), offset, len(values)))
+        offset = _align(offset + len(values) * values.itemsize)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, KINDS[kind], width, height, len(tables)))
+        f.write(b"".join(entries))
+        f.seek(cells_offset)
+        f.write(b"".join(rows))
+        for entry, (_, _, values) in zip(entries, tables):
+            f.seek(SIDECAR.unpack(entry)[2])
+            f.write(values.tobytes())
+        # Completa l'ultimo blocco, così la dimensione del file è quella attesa
+        f.truncate(offset)
+
+
+class MappedGrid:
+    """
+    Mappa letta da un file di `write_map` tramite mmap.
+
+    Si comporta come la lista di righe usata da `LabirinthProblem` e
+    `FroggerProblem`: `grid[y][x]` è il valore di una casella, e ogni
+    riga è una `memoryview` sul file. Le tabelle accessorie sono in
+    `sidecars`, anch'esse come `memoryview`.
+
+    Di default la mappa è in sola lettura; con `writable=True` le
+    modifiche (ad esempio `GridComponents.open_cell`) restano private
+    al processo e non vengono scritte sul file.
+
+    Il file si può chiudere solo quando nessun array NumPy (né altro
+    oggetto) usa più la sua memoria: altrimenti `close` solleva
+    `BufferError` e la mappa resta aperta e utilizzabile.
+    """
+    path: str
+    kind: str
+    width: int
+    height: int
+    # Caselle della mappa, riga per riga
+    cells: memoryview
+    rows: list[memoryview]
+    sidecars: dict[str, memoryview]
+
+    def __init__(self, path: str, writable=False):
+        self.path = path
+        self.writable = writable
+        with open(path, 'rb') as f:
+            access = mmap.ACCESS_COPY if writable else mmap.ACCESS_READ
+            self._mm = mmap.mmap(f.fileno(), 0, access=access)
+
+        magic, version, kind, self.width, self.height, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a map file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        self.kind = {v: k for k, v in KINDS.items()}[kind]
+        self._count = count
+        # Array NumPy creati sulla memoria del file (riferimenti deboli)
+        self._arrays: list[weakref.ref] = []
+        self._open_views()
+
+    def _open_views(self):
+        view = memoryview(self._mm)
+        offset = _align(HEADER.size + SIDECAR.size * self._count)
+        self.cells = view[offset:offset + self.width * self.height]
+        w = self.width
+        self.rows = [self.cells[y * w:(y + 1) * w] for y in range(self.height)]
+
+        self.sidecars = {}
+        for i in range(self._count):
+            name, code, start, length = SIDECAR.unpack_from(self._mm, HEADER.size + i * SIDECAR.size)
+            code = code.decode()
+            size = array(code).itemsize
+            table = view[start:start + length * size]
+            self.sidecars[name.rstrip(b'\0').decode()] = table.cast(code)
+
+    def __len__(self) -> int:
+        return self.height
+
+    def __getitem__(self, y: int) -> memoryview:
+        return self.rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __array__(self, dtype=None, copy=None) -> 'np.ndarray':
+        # `np.asarray` (o `copy=False`) legge direttamente la memoria del file;
+        # `np.array` ne fa una copia, che non impedisce di chiuderlo
+        import numpy as np
+        grid = np.frombuffer(self.cells, dtype=np.uint8).reshape(self.height, self.width)
+        if copy or (dtype is not None and np.dtype(dtype) != grid.dtype):
+            if copy is False:
+                raise ValueError(f"Converting the map to {dtype} requires a copy")
+            return grid.astype(dtype or grid.dtype)
+        self._track(grid)
+        return grid
+
+    def sidecar_array(self, name: str) -> 'np.ndarray':
+        """Ritorna la tabella accessoria come array NumPy, senza copiarla"""
+        import numpy as np
+        table = np.frombuffer(self.sidecars[name], dtype=self.sidecars[name].format)
+        self._track(table)
+        return table
+
+    def _track(self, exported: 'np.ndarray'):
+        self._arrays = [r for r in self._arrays if r() is not None]
+        self._arrays.append(weakref.ref(exported))
+
+    def close(self):
+        """
+        Chiude il file: le righe e le tabelle ottenute dalla mappa non
+        vanno più usate. Se la memoria del file è ancora in uso solleva
+        `BufferError`, senza chiudere nulla.
+        """
+        if self._mm.closed:
+            return
+        # Gli array NumPy (anche quelli derivati, che li tengono in vita)
+        # impedirebbero di rilasciare le viste: controllali prima
+        alive = sum(r() is not None for r in self._arrays)
+        if alive:
+            raise BufferError(f"{alive} NumPy arrays still use the memory "
+                              f"of {self.path}, delete them before closing")
+        try:
+            for view in self.rows + list(self.sidecars.values()) + [self.cells]:
+                view.release()
+            self._mm.close()
+        except BufferError:
+            # La memoria è ancora esportata, ad esempio da `np.frombuffer` su
+            # una riga: il file resta aperto, e le viste rilasciate vengono ricreate
+            self._open_views()
+            raise BufferError(f"The memory of {self.path} is still in use (a buffer "
+                              "over one of its rows or tables is alive)") from None
+        self.rows = []
+        self.sidecars = {}
+
+    def __enter__(self) -> 'MappedGrid':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __reduce__(self):
+        # Nei processi creati con `spawn` il file viene riaperto,
+        # e le pagine restano condivise tramite la cache del sistema
+        return MappedGrid, (self.path, self.writable)
+
+
+def write_labirinth(path: str, labirinth: list[list[int]], components=False):
+    """
+    Scrive un labirinto; con `components=True` salva anche le etichette
+    delle componenti connesse (con e senza diagonali), da passare a
+    `GridComponents` tramite `labirinth_components`.
+    """
+    sidecars = {}
+    if components:
+        from labirinth import GridComponents
+        for allow_diagonal in (False, True):
+            labels = GridComponents(labirinth, allow_diagonal).labels
+            sidecars[_components_name(allow_diagonal)] = ('q', labels.tolist())
+    write_map(path, labirinth, 'labirinth', sidecars)
+
+
+def _components_name(allow_diagonal: bool) -> str:
+    return 'components-diag' if allow_diagonal else 'components'
+
+
+def labirinth_components(grid: MappedGrid, allow_diagonal=False):
+    """
+    Ritorna l'indice delle componenti del labirinto, usando le etichette
+    salvate nel file se ci sono (copiate, perché l'indice le modifica).
+    """
+    from labirinth import GridComponents
+    name = _components_name(allow_diagonal)
+    labels = grid.sidecar_array(name).copy() if name in grid.sidecars else None
+    return GridComponents(grid, allow_diagonal, labels)
+
+
+def write_frogger(path: str, game_map: list[list[int]], directions: list[int]):
+    """Scrive una mappa di Frogger, con il verso del traffico di ogni riga"""
+    write_map(path, game_map, 'frogger', {'directions': ('b', directions)})
+
+
+def frogger_problem(grid: MappedGrid, heuristic):
+    """Crea un `FroggerProblem` sulla mappa, con il verso del traffico salvato nel file"""
+    from frogger import FroggerProblem
+    return FroggerProblem(grid, grid.sidecars['directions'], heuristic)
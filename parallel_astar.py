@@ -0,0 +1,350 @@
+# A* parallelo con distribuzione degli stati per hash (HDA*)
+#
+# Ogni processo possiede gli stati il cui hash, modulo il numero di
+# processi, è il suo indice: ha la propria frontiera e la propria tabella
+# dei costi, ed invia gli stati generati al processo che li possiede in
+# blocchi, attraverso una coda per processo.
+#
+#   python parallel_astar.py --workers 4
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import math
+import multiprocessing as mp
+import pickle
+import queue
+import time
+import traceback
+
+from astar import Action, Problem, State
+
+
+def owner(key: tuple, workers: int) -> int:
+    """
+    Ritorna il processo che possiede lo stato con questa chiave.
+    Le chiavi sono tuple di interi, il cui hash è uguale in tutti i processi.
+    """
+    return hash(key) % workers
+
+
+class _Worker:
+    """Stato di un processo della ricerca"""
+
+    def __init__(self, index: int, problem: Problem, inboxes: list, results,
+                 incumbent, idle, counters, batch_size: int):
+        self.index = index
+        self.problem = problem
+        self.inboxes = inboxes
+        self.results = results
+        self.incumbent = incumbent
+        self.idle = idle
+        self.counters = counters
+        self.batch_size = batch_size
+
+        # Frontiera locale: (f, -g, contatore, chiave, g)
+        self.open: list[tuple] = []
+        self.counter = itertools.count()
+        self.best_g: dict[tuple, float] = {}
+        # Per ogni stato: (chiave dello stato precedente, azione)
+        self.parent: dict[tuple, tuple[tuple | None, Action | None]] = {}
+        # Stati da inviare agli altri processi, uno per destinatario
+        self.outbox: list[list[tuple]] = [[] for _ in inboxes]
+
+        # Miglior soluzione trovata da questo processo:
+        # (costo, chiave dello stato precedente, azione, chiave finale)
+        self.solution: tuple | None = None
+        self.expanded = 0
+
+    def send(self, dest: int):
+        batch = self.outbox[dest]
+        if not batch:
+            return
+        self.outbox[dest] = []
+        # Il contatore va incrementato prima dell'invio, perché il
+        # rilevamento della terminazione non veda messaggi "in volo"
+        with self.counters.get_lock():
+            self.counters[0] += 1
+        self.inboxes[dest].put(('nodes', batch))
+
+    def flush(self):
+        for dest in range(len(self.outbox)):
+            self.send(dest)
+
+    def receive(self, nodes: list[tuple]):
+        for key, g, parent_key, action in nodes:
+            if g >= self.best_g.get(key, math.inf):
+                continue
+            self.best_g[key] = g
+            self.parent[key] = (parent_key, action)
+            state = self.problem.decode_state(key)
+            h = self.problem.heuristic(state)
+            heapq.heappush(self.open, (g + h, -g, next(self.counter), key, g))
+
+    def handle(self, message: tuple) -> bool:
+        """Gestisce un messaggio, riporta `False` se il processo deve terminare"""
+        kind = message[0]
+        if kind == 'nodes':
+            # Prima si segnala di essere attivi, poi di aver ricevuto
+            self.idle[self.index] = 0
+            with self.counters.get_lock():
+                self.counters[1] += 1
+            self.receive(message[1])
+        elif kind == 'trace':
+            key = message[1]
+            self.results.put(('parent', key) + self.parent[key])
+        elif kind == 'report':
+            self.results.put(('report', self.index, self.solution, self.expanded))
+        elif kind == 'stop':
+            return False
+        return True
+
+    def expand(self):
+        f, _, _, key, g = heapq.heappop(self.open)
+        # Stato già raggiunto con un costo minore
+        if g > self.best_g[key]:
+            return
+        # Nessuno stato in frontiera può migliorare la soluzione trovata
+        if f >= self.incumbent.value:
+            self.open.clear()
+            return
+
+        self.expanded += 1
+        problem = self.problem
+        state = problem.decode_state(key)
+        workers = len(self.inboxes)
+        for a in problem.possible_actions(state):
+            new_state = a.apply(state)
+            if new_state is None:
+                continue
+            new_key = problem.encode_state(new_state)
+            new_g = g + a.cost
+
+            if new_state.is_final():
+                with self.incumbent.get_lock():
+                    if new_g < self.incumbent.value:
+                        self.incumbent.value = new_g
+                        self.solution = (new_g, key, a, new_key)
+                continue
+
+            dest = owner(new_key, workers)
+            if dest == self.index:
+                self.receive([(new_key, new_g, key, a)])
+            else:
+                self.outbox[dest].append((new_key, new_g, key, a))
+                if len(self.outbox[dest]) >= self.batch_size:
+                    self.send(dest)
+
+    def run(self):
+        inbox = self.inboxes[self.index]
+        while True:
+            if not self.open:
+                # Prima di fermarsi, invia tutto quello che è in sospeso
+                self.flush()
+                self.idle[self.index] = 1
+                if not self.handle(inbox.get()):
+                    return
+                continue
+
+            while True:
+                try:
+                    message = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if not self.handle(message):
+                    return
+
+            for _ in range(self.batch_size):
+                if not self.open:
+                    break
+                self.expand()
+            self.flush()
+
+
+def _run_worker(index: int, problem: Problem, inboxes: list, results, *args):
+    try:
+        _Worker(index, problem, inboxes, results, *args).run()
+    except BaseException as e:
+        # L'eccezione torna al processo principale, che la solleva
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = RuntimeError(repr(e))
+        results.put(('error', index, e, traceback.format_exc()))
+
+
+def _receive(results, processes: list, timeout: float = None) -> tuple | None:
+    """
+    Ritorna il prossimo messaggio dei processi, oppure `None` se non ne
+    arriva nessuno entro `timeout` (di default attende senza limite).
+    Solleva l'eccezione di un processo fallito, e `RuntimeError` se un
+    processo è terminato senza poterla inviare.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        wait = 0.1 if deadline is None else max(0.0, min(0.1, deadline - time.monotonic()))
+        try:
+            message = results.get(timeout=wait)
+        except queue.Empty:
+            dead = [(i, p.exitcode) for i, p in enumerate(processes) if not p.is_alive()]
+            if dead:
+                # Un'eccezione inviata subito prima di terminare può essere ancora in transito
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    i, code = dead[0]
+                    raise RuntimeError(f"HDA* worker {i} exited with code {code}") from None
+            elif deadline is not None and time.monotonic() >= deadline:
+                return None
+            else:
+                continue
+        if message[0] == 'error':
+            _, i, error, remote = message
+            raise error from RuntimeError(f"in HDA* worker {i}:\n{remote}")
+        return message
+
+
+def _finished(idle, counters) -> bool:
+    """
+    Ritorna se la ricerca è terminata: tutti i processi sono fermi e
+    tutti i blocchi inviati sono stati ricevuti. I contatori vengono
+    letti prima e dopo i flag, così un blocco inviato o ricevuto nel
+    frattempo fa fallire il controllo.
+    """
+    sent, received = counters[0], counters[1]
+    if sent != received:
+        return False
+    if not all(idle):
+        return False
+    return counters[0] == sent and counters[1] == received
+
+
+def hda_star(problem: Problem, workers: int = 4, batch_size: int = 64,
+             state: State = None) -> list[Action] | None:
+    """
+    Risolve il problema con A* distribuito su `workers` processi.
+
+    Il problema deve implementare `encode_state` e `decode_state`, e i
+    processi vengono creati con `fork` (il problema non viene serializzato).
+    La soluzione è ottima se l'euristica è ammissibile: ogni processo
+    scarta gli stati con f maggiore o uguale al costo della migliore
+    soluzione trovata, e la ricerca termina quando tutte le frontiere
+    sono vuote e non ci sono stati in transito. Se un processo solleva
+    un'eccezione (ad esempio dall'euristica) la ricerca si ferma e
+    l'eccezione viene sollevata di nuovo qui.
+    Riporta la lista di azioni, oppure `None` se non c'è soluzione.
+    """
+    if not state:
+        state = problem.initial_state
+    if state.is_final():
+        return []
+
+    ctx = mp.get_context('fork')
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+    incumbent = ctx.Value('d', math.inf)
+    idle = ctx.Array('b', workers)
+    # Blocchi di stati inviati e ricevuti
+    counters = ctx.Array('q', 2)
+
+    start_time = time.perf_counter()
+    start_key = problem.encode_state(state)
+    counters[0] = 1
+    inboxes[owner(start_key, workers)].put(('nodes', [(start_key, 0, None, None)]))
+
+    processes = [ctx.Process(target=_run_worker,
+                             args=(i, problem, inboxes, results, incumbent,
+                                   idle, counters, batch_size), daemon=True)
+                 for i in range(workers)]
+    for p in processes:
+        p.start()
+
+    try:
+        while not _finished(idle, counters):
+            # Durante la ricerca i processi scrivono sui risultati solo se falliscono
+            _receive(results, processes, timeout=0.001)
+
+        # Raccogli la soluzione migliore trovata dai processi
+        for inbox in inboxes:
+            inbox.put(('report',))
+        best = None
+        expanded = 0
+        for _ in range(workers):
+            _, _, solution, count = _receive(results, processes)
+            expanded += count
+            if solution is not None and (best is None or solution[0] < best[0]):
+                best = solution
+
+        path = None
+        if best is not None:
+            # Ricostruisci il percorso chiedendo ad ogni stato il suo predecessore
+            _, key, action, _ = best
+            path = [action]
+            while True:
+                inboxes[owner(key, workers)].put(('trace', key))
+                _, _, key, action = _receive(results, processes)
+                if key is None:
+                    break
+                path.append(action)
+            path.reverse()
+    finally:
+        for inbox in inboxes:
+            inbox.put(('stop',))
+        for p in processes:
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+
+    problem.stats = {'expanded': expanded, 'elapsed': time.perf_counter() - start_time,
+                     'workers': workers}
+    return path
+
+
+def speedup(problem: Problem, workers: int = 4, batch_size: int = 64) -> dict[str, float]:
+    """Confronta tempo e costo della soluzione di `Problem.astar` e di `hda_star`"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = problem.astar(show=False)
+    serial_time = time.perf_counter() - start
+    serial_expanded = problem.stats['expanded']
+
+    start = time.perf_counter()
+    parallel = hda_star(problem, workers, batch_size)
+    parallel_time = time.perf_counter() - start
+
+    cost = lambda path: None if path is None else sum(a.cost for a in path)
+    return {
+        "workers": workers,
+        "serial_ms": serial_time * 1000,
+        "parallel_ms": parallel_time * 1000,
+        "speedup": serial_time / parallel_time,
+        "serial_expanded": serial_expanded,
+        "parallel_expanded": problem.stats['expanded'],
+        "serial_cost": cost(serial),
+        "parallel_cost": cost(parallel),
+    }
+
+
+def main(argv=None):
+    from benchmark import scenarios
+
+    parser = argparse.ArgumentParser(description="Compare HDA* with the serial A* engine")
+    parser.add_argument("--workers", type=int, action="append")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append")
+    args = parser.parse_args(argv)
+
+    available = scenarios(args.size, args.seed)
+    for name in args.scenario or list(available):
+        for workers in args.workers or [2, 4]:
+            r = speedup(available[name](), workers, args.batch_size)
+            print(f"{name:<24} workers={workers}  serial={r['serial_ms']:9.1f} ms  "
+                  f"parallel={r['parallel_ms']:9.1f} ms  speedup={r['speedup']:5.2f}  "
+                  f"cost {r['serial_cost']} / {r['parallel_cost']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Strumentazione della ricerca A*, per capire dove va il tempo
+#
+# Un `SearchProfiler` passato a `Problem.astar` misura ogni fase della
+# ricerca (azioni possibili, applicazione delle azioni, finalità degli
+# stati, euristica, hash e frontiera) avvolgendo i riferimenti locali del
+# ciclo, le azioni e gli stati della ricerca: le classi non vengono
+# modificate, e le altre ricerche nello stesso processo non ne risentono.
+# La validità degli stati (`is_invalid`) viene controllata dentro `apply`,
+# e il suo tempo è compreso in quello di `apply`. Senza profiler la
+# ricerca non cambia.
+#
+#   problem.astar(show=False, profiler=SearchProfiler(sample_every=10))
+#   profiler.write_folded("astar.folded")   # per flamegraph.pl o speedscope
+import time
+from functools import partial
+from typing import Callable
+
+from astar import Action, State
+
+
+# Segna la fine di un generatore in `wrap_generator`
+_END = object()
+
+
+class SearchProfiler:
+    """
+    Tempi e conteggi per fase di una ricerca A*.
+
+    + `sample_every`: misura i tempi solo in un'espansione ogni
+                `sample_every` (i conteggi sono sempre esatti, i tempi
+                vengono moltiplicati di conseguenza)
+    + `delay`: secondi di ricerca prima di iniziare a misurare i tempi,
+                così le ricerche veloci pagano solo i conteggi
+    + `progress`: funzione chiamata ogni `progress_interval` secondi con
+                espansioni, espansioni al secondo, dimensione della
+                frontiera e f dell'ultimo stato estratto
+    """
+    sample_every: int
+    delay: float
+    progress: Callable[[dict[str, float]], None] | None
+    progress_interval: float
+
+    # Numero di chiamate e tempo (in secondi, già riscalato) per fase
+    calls: dict[str, int]
+    times: dict[str, float]
+    # Tempo proprio di ogni pila di fasi, per il flamegraph
+    stacks: dict[tuple[str, ...], float]
+
+    def __init__(self, sample_every: int = 1, delay: float = 0.0,
+                 progress: Callable[[dict[str, float]], None] = None,
+                 progress_interval: float = 1.0):
+        self.sample_every = sample_every
+        self.delay = delay
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.calls = {}
+        self.times = {}
+        self.stacks = {}
+        # Se l'espansione corrente viene misurata
+        self.active = False
+        # Pila delle fasi in corso: (nome, tempo dei figli)
+        self._stack: list[list] = []
+        # `is_final` misurato, per classe di stato
+        self._is_final: dict[type, Callable] = {}
+        self._apply = self.wrap('apply', lambda action, state: action.apply(state))
+        self._start = 0.0
+        self._last_progress = 0.0
+        self._expanded = 0
+
+    def wrap(self, phase: str, fn: Callable) -> Callable:
+        """Ritorna `fn` avvolta in modo da contare e misurare le chiamate come `phase`"""
+        calls, stack = self.calls, self._stack
+        calls.setdefault(phase, 0)
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            calls[phase] += 1
+            if not self.active:
+                return fn(*args, **kwargs)
+            frame = [phase, 0.0]
+            stack.append(frame)
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                self._record(elapsed, frame[1], [f[0] for f in stack] + [phase])
+                if stack:
+                    stack[-1][1] += elapsed
+        return wrapper
+
+    def wrap_generator(self, phase: str, fn: Callable, on_item: Callable = None) -> Callable:
+        """
+        Come `wrap` per le funzioni generatrici: misura solo il tempo speso
+        a produrre gli elementi, non quello di chi li consuma. Se c'è,
+        `on_item` riceve ogni elemento e ritorna quello da produrre.
+        """
+        timed_next = self.wrap(phase, next)
+        calls = self.calls
+
+        def wrapper(*args, **kwargs):
+            calls[phase] += 1
+            it = iter(fn(*args, **kwargs))
+            while True:
+                item = timed_next(it, _END)
+                calls[phase] -= 1
+                if item is _END:
+                    return
+                if on_item is not None:
+                    item = on_item(item)
+                yield item
+        return wrapper
+
+    def _record(self, elapsed: float, children: float, path: list[str]):
+        scaled = elapsed * self.sample_every
+        phase = path[-1]
+        self.times[phase] = self.times.get(phase, 0.0) + scaled
+        key = tuple(path)
+        self.stacks[key] = self.stacks.get(key, 0.0) + (elapsed - children) * self.sample_every
+
+    def instrument_action(self, action: Action) -> '_TimedAction':
+        """
+        Ritorna l'azione avvolta in modo da misurare `apply`: l'azione
+        originale non viene modificata (può essere condivisa).
+        """
+        return _TimedAction(action, self)
+
+    def instrument_state(self, state: State):
+        """
+        Misura `is_final` dello stato, solo su questa istanza: va usata
+        solo sugli stati creati dalla ricerca, non su quelli del chiamante
+        (come lo stato iniziale), che resterebbero legati al profiler.
+        """
+        timed = self._is_final.get(type(state))
+        if timed is None:
+            timed = self._is_final[type(state)] = self.wrap('is_final', type(state).is_final)
+        state.is_final = partial(timed, state)
+
+    def instrument_queue(self, fringe):
+        """Avvolge inserimento ed estrazione della frontiera (anche dopo un cambio di coda)"""
+        if 'insert' not in fringe.__dict__:
+            fringe.insert = self.wrap('fringe.insert', fringe.insert)
+            fringe.remove = self.wrap('fringe.remove', fringe.remove)
+
+    def start(self):
+        self._start = self._last_progress = time.perf_counter()
+        self._expanded = 0
+
+    def expansion(self, fringe_size: int, f: float):
+        """Chiamata dalla ricerca prima di ogni espansione"""
+        self._expanded += 1
+        now = time.perf_counter()
+        elapsed = now - self._start
+        self.active = elapsed >= self.delay and self._expanded % self.sample_every == 0
+        if self.progress is not None and now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.progress({
+                'expanded': self._expanded,
+                'elapsed': elapsed,
+                'expansions_per_sec': self._expanded / elapsed if elapsed > 0 else 0.0,
+                'fringe': fringe_size,
+                'f': f,
+            })
+
+    def stop(self):
+        self.active = False
+        self.times['astar'] = time.perf_counter() - self._start
+
+    def folded(self) -> list[str]:
+        """
+        Ritorna il profilo nel formato "folded stacks" usato da
+        flamegraph.pl e speedscope: una riga per pila di fasi, con
+        il tempo proprio in microsecondi.
+        """
+        total = self.times.get('astar', 0.0)
+        measured = sum(t for path, t in self.stacks.items())
+        lines = [f"astar {max(0, round((total - measured) * 1e6))}"]
+        for path, t in sorted(self.stacks.items()):
+            lines.append(f"astar;{';'.join(path)} {max(0, round(t * 1e6))}")
+        return lines
+
+    def write_folded(self, path: str):
+        with open(path, 'w') as f:
+            f.write("\n".join(self.folded()) + "\n")
+
+    def report(self) -> str:
+        """Ritorna una tabella con chiamate e tempo di ogni fase"""
+        total = self.times.get('astar', 0.0)
+        lines = [f"{'phase':<16} {'calls':>10} {'ms':>10} {'%':>6}"]
+        for phase in sorted(self.calls, key=lambda p: -self.times.get(p, 0.0)):
+            t = self.times.get(phase, 0.0)
+            share = t / total * 100 if total > 0 else 0.0
+            lines.append(f"{phase:<16} {self.calls[phase]:>10} {t * 1000:>10.2f} {share:>6.1f}")
+        lines.append(f"{'total':<16} {'':>10} {total * 1000:>10.2f}")
+        return "\n".join(lines)
+
+
+class _TimedAction:
+    """
+    Azione che misura `apply` e la finalità degli stati che produce;
+    gli altri attributi sono quelli dell'azione originale.
+    """
+    action: Action
+
+    def __init__(self, action: Action, profiler: SearchProfiler):
+        self.action = action
+        self._profiler = profiler
+
+    def apply(self, state: State) -> State | None:
+        new_state = self._profiler._apply(self.action, state)
+        if new_state is not None and new_state is not state:
+            self._profiler.instrument_state(new_state)
+        return new_state
+
+    def __getattr__(self, name: str):
+        return getattr(self.action, name)
+
+    def __str__(self) -> str:
+        return str(self.action)
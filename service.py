@@ -0,0 +1,397 @@
+# Servizio asyncio per risolvere labirinti su richiesta
+#
+# Il servizio ascolta su una porta TCP locale e parla con messaggi JSON,
+# uno per riga. Le ricerche girano in un pool di processi, che tengono in
+# memoria le mappe caricate (con l'indice delle componenti e la cache dei
+# percorsi), così il ciclo degli eventi non viene mai bloccato.
+#
+#   python service.py --port 8765 --workers 4
+#
+# Richieste:
+#   {"id": 1, "op": "load", "map": "m", "labirinth": [[0, 1, ...], ...]}
+#   {"id": 2, "op": "solve", "map": "m", "start": [0, 0], "end": [9, 9],
+#    "diagonal": false, "deadline": 2.0}
+#   {"id": 3, "op": "stats"}
+#
+# Ogni risposta riporta l'`id` della richiesta e uno `status`: una ricerca
+# riceve subito `accepted`, poi `pending` periodicamente finché non
+# termina con `done`, `no_solution`, `timeout`, `busy` o `error`. I
+# messaggi `pending` riportano anche l'avanzamento della ricerca, quando
+# è in corso nel pool: stati espansi (`expanded`), dimensione della
+# frontiera (`fringe`) e f dell'ultimo stato estratto (`f`, un limite
+# inferiore del costo della soluzione).
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+
+from labirinth import (GridComponents, LabirinthProblem, LabState, PathCache,
+                       encode_path)
+
+
+# ----------------------------------------------------------------------
+# Lato processi del pool
+# ----------------------------------------------------------------------
+
+class _ResidentMap:
+    """Mappa tenuta in memoria da un processo del pool"""
+
+    def __init__(self, version: int, labirinth: list[list[int]]):
+        self.version = version
+        self.labirinth = labirinth
+        # Indici delle componenti, per mosse con e senza diagonali
+        self.components: dict[bool, GridComponents] = {}
+        # Una cache per mappa, sostituita insieme alla mappa: la versione basta come chiave
+        self.cache = PathCache()
+
+
+# Mappe caricate in questo processo, per nome
+_MAPS: dict[str, _ResidentMap] = {}
+
+
+def _init_worker(maps: dict[str, tuple[int, list[list[int]]]]):
+    for name, (version, labirinth) in maps.items():
+        _MAPS[name] = _ResidentMap(version, labirinth)
+
+
+def _solve(name: str, version: int, start: tuple[int, int], end: tuple[int, int],
+           diagonal: bool, deadline: float, labirinth: list[list[int]] = None,
+           progress=None, progress_interval: float = 1.0) -> dict:
+    """
+    Risolve una richiesta nel processo del pool. Se la mappa non è ancora
+    in memoria (o è di una versione precedente) riporta `missing`, e il
+    servizio ripete la richiesta allegando la mappa. La ricerca si ferma
+    a `deadline` (un istante di `time.time()`) riportando `timeout`.
+    L'avanzamento viene scritto ogni `progress_interval` secondi in
+    `progress` (un dizionario condiviso), con la richiesta come chiave.
+    """
+    if labirinth is not None:
+        _MAPS[name] = _ResidentMap(version, labirinth)
+    resident = _MAPS.get(name)
+    if resident is None or resident.version != version:
+        return {'status': 'missing'}
+    # La richiesta è rimasta in coda oltre la scadenza
+    if time.time() > deadline:
+        return {'status': 'timeout'}
+
+    start, end = tuple(start), tuple(end)
+    key = (name, version, start, end, diagonal)
+    solution = resident.cache.lookup(resident.version, diagonal, start, end)
+    expanded = 0
+    if solution is None:
+        components = resident.components.get(diagonal)
+        if components is None:
+            components = resident.components[diagonal] = GridComponents(resident.labirinth, diagonal)
+
+        # Con le diagonali che costano 2, Manhattan resta ammissibile
+        def heuristic(state: LabState):
+            return abs(state.x - end[0]) + abs(state.y - end[1])
+
+        def report(values: dict[str, float]):
+            progress[key] = {k: values[k] for k in ('expanded', 'fringe', 'f')}
+
+        problem = LabirinthProblem(resident.labirinth, heuristic, end, start, diagonal,
+                                   components)
+        with contextlib.redirect_stdout(io.StringIO()):
+            solution = problem.astar(show=False, deadline=deadline,
+                                     progress=report if progress is not None else None,
+                                     progress_interval=progress_interval)
+        expanded = problem.stats.get('expanded', 0)
+        if problem.stats.get('timeout'):
+            return {'status': 'timeout', 'expanded': expanded}
+        if solution is None:
+            return {'status': 'no_solution', 'expanded': expanded}
+        resident.cache.store(resident.version, diagonal, start, end, solution)
+
+    return {
+        'status': 'done',
+        'cost': sum(a.cost for a in solution),
+        'path': encode_path(solution),
+        'expanded': expanded,
+        'worker': os.getpid(),
+    }
+
+
+# ----------------------------------------------------------------------
+# Servizio
+# ----------------------------------------------------------------------
+
+class SolverService:
+    """
+    Front end asyncio del pool di processi.
+
+    + `workers`: processi del pool
+    + `max_pending`: numero massimo di ricerche distinte in corso; oltre
+                questo limite le nuove richieste vengono rifiutate con `busy`
+    + `default_deadline`: secondi concessi ad una ricerca senza `deadline`
+    + `heartbeat`: secondi tra due messaggi `pending` della stessa ricerca
+
+    Le richieste identiche in corso vengono unite: la ricerca parte una
+    volta sola e tutti i richiedenti ricevono lo stesso risultato. La
+    ricerca condivisa dura fino alla scadenza più lontana tra quelle dei
+    richiedenti: se scade prima che uno arrivato dopo abbia esaurito il
+    suo tempo, riparte da capo fino alla nuova scadenza.
+    """
+    maps: dict[str, tuple[int, list[list[int]]]]
+    # Ricerche in corso, per (mappa, versione, partenza, arrivo, diagonali)
+    inflight: dict[tuple, asyncio.Future]
+    # Scadenza più lontana tra i richiedenti di ogni ricerca in corso
+    deadlines: dict[tuple, float]
+
+    def __init__(self, maps: dict[str, list[list[int]]] = None, workers: int = 4,
+                 max_pending: int = 64, default_deadline: float = 10.0,
+                 heartbeat: float = 0.5):
+        self.maps = {name: (0, lab) for name, lab in (maps or {}).items()}
+        self.workers = workers
+        self.max_pending = max_pending
+        self.default_deadline = default_deadline
+        self.heartbeat = heartbeat
+        self.inflight = {}
+        self.deadlines = {}
+        self.stats = {'requests': 0, 'searches': 0, 'coalesced': 0, 'rejected': 0,
+                      'timeouts': 0, 'retries': 0, 'map_transfers': 0}
+        self.pool: ProcessPoolExecutor | None = None
+        # Avanzamento delle ricerche in corso nel pool, per richiesta
+        self.manager: SyncManager | None = None
+        self.progress: dict | None = None
+        # Connessioni aperte, chiuse quando il servizio si ferma
+        self.connections: set[asyncio.Task] = set()
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Avvia pool e server, e riporta la porta su cui ascolta"""
+        # Le mappe già note vengono passate una volta ad ogni processo
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.maps,))
+        self.manager = mp.Manager()
+        self.progress = self.manager.dict()
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for task in list(self.connections):
+                task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.pool is not None:
+            # shutdown aspetta la fine delle ricerche in corso: fuori dal
+            # ciclo degli eventi, che nel frattempo resta libero
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(self.pool.shutdown,
+                                                               cancel_futures=True))
+        if self.manager is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.manager.shutdown)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+
+        async def send(message: dict):
+            async with lock:
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+
+        tasks = set()
+        self.connections.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await send({'id': None, 'status': 'error', 'error': str(e)})
+                    continue
+                # Ogni richiesta viene gestita a parte, così una ricerca
+                # lenta non blocca le altre della stessa connessione
+                task = asyncio.create_task(self._handle(request, send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Il servizio si sta fermando
+            for task in tasks:
+                task.cancel()
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _handle(self, request: dict, send):
+        self.stats['requests'] += 1
+        if not isinstance(request, dict):
+            await send({'id': None, 'status': 'error',
+                        'error': f"request must be a JSON object, not {type(request).__name__}"})
+            return
+        rid = request.get('id')
+        op = request.get('op')
+        try:
+            if op == 'load':
+                version = self.maps.get(request['map'], (-1, None))[0] + 1
+                self.maps[request['map']] = (version, request['labirinth'])
+                await send({'id': rid, 'status': 'done', 'version': version})
+            elif op == 'solve':
+                await self._handle_solve(request, send)
+            elif op == 'stats':
+                await send({'id': rid, 'status': 'done', 'inflight': len(self.inflight),
+                            **self.stats})
+            else:
+                await send({'id': rid, 'status': 'error', 'error': f"unknown op {op!r}"})
+        except (KeyError, TypeError, ValueError) as e:
+            await send({'id': rid, 'status': 'error', 'error': repr(e)})
+
+    async def _handle_solve(self, request: dict, send):
+        rid = request.get('id')
+        name = request['map']
+        if name not in self.maps:
+            await send({'id': rid, 'status': 'error', 'error': f"unknown map {name!r}"})
+            return
+        version = self.maps[name][0]
+        start, end = tuple(request['start']), tuple(request['end'])
+        diagonal = bool(request.get('diagonal', False))
+        timeout = float(request.get('deadline', self.default_deadline))
+        key = (name, version, start, end, diagonal)
+
+        future = self.inflight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.stats['coalesced'] += 1
+            self.deadlines[key] = max(self.deadlines[key], time.time() + timeout)
+        elif len(self.inflight) >= self.max_pending:
+            self.stats['rejected'] += 1
+            await send({'id': rid, 'status': 'busy', 'inflight': len(self.inflight)})
+            return
+        else:
+            self.stats['searches'] += 1
+            self.deadlines[key] = time.time() + timeout
+            future = asyncio.ensure_future(self._search(key))
+            self.inflight[key] = future
+
+            def finished(search: asyncio.Future):
+                self.inflight.pop(key, None)
+                self.deadlines.pop(key, None)
+                # L'errore viene inoltrato dai richiedenti: se sono già
+                # scaduti tutti, non va segnalato come mai letto
+                if not search.cancelled():
+                    search.exception()
+            future.add_done_callback(finished)
+
+        await send({'id': rid, 'status': 'accepted', 'coalesced': coalesced})
+        started = time.perf_counter()
+        deadline = started + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stats['timeouts'] += 1
+                await send({'id': rid, 'status': 'timeout'})
+                return
+            # A differenza di wait_for, wait non cancella la ricerca (condivisa
+            # con gli altri richiedenti) quando scade; senza shield, un suo
+            # errore non resta in un future che nessuno legge
+            done, _ = await asyncio.wait([future], timeout=min(self.heartbeat, remaining))
+            if done:
+                break
+            # L'avanzamento viene letto fuori dal ciclo degli eventi (è una
+            # chiamata al processo del manager)
+            values = await asyncio.get_running_loop().run_in_executor(
+                None, self.progress.get, key, {})
+            await send({'id': rid, 'status': 'pending', **values,
+                        'elapsed': time.perf_counter() - started})
+
+        try:
+            result = future.result()
+        except Exception as e:
+            # Ad esempio `BrokenProcessPool` o `MemoryError` dal processo del
+            # pool: il richiedente deve comunque ricevere una risposta finale
+            await send({'id': rid, 'status': 'error', 'error': repr(e), 'coalesced': coalesced,
+                        'elapsed': time.perf_counter() - started})
+            return
+        if result['status'] == 'timeout':
+            self.stats['timeouts'] += 1
+        await send({'id': rid, **result, 'coalesced': coalesced,
+                    'elapsed': time.perf_counter() - started})
+
+    async def _search(self, key: tuple) -> dict:
+        name, version, start, end, diagonal = key
+        loop = asyncio.get_running_loop()
+        while True:
+            deadline = self.deadlines[key]
+            result = await loop.run_in_executor(self.pool, _solve, name, version, start, end,
+                                                diagonal, deadline, None, self.progress,
+                                                self.heartbeat)
+            if result['status'] == 'missing':
+                # Il processo non ha ancora la mappa: rimandala insieme alla richiesta
+                self.stats['map_transfers'] += 1
+                labirinth = self.maps[name][1]
+                result = await loop.run_in_executor(self.pool, _solve, name, version, start,
+                                                    end, diagonal, deadline, labirinth,
+                                                    self.progress, self.heartbeat)
+            await loop.run_in_executor(None, self.progress.pop, key, None)
+            # Un richiedente unito nel frattempo ha più tempo: riprova per lui
+            if result['status'] != 'timeout' or self.deadlines[key] <= deadline:
+                return result
+            self.stats['retries'] += 1
+
+
+async def request(port: int, messages: list[dict], host: str = '127.0.0.1') -> list[dict]:
+    """
+    Invia le richieste al servizio sulla stessa connessione e riporta
+    tutte le risposte ricevute, fino a quella finale di ogni richiesta.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    for message in messages:
+        writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+
+    # Le richieste che non sono oggetti ricevono un errore con `id` nullo
+    open_ids = {m.get('id') if isinstance(m, dict) else None for m in messages}
+    responses = []
+    while open_ids:
+        line = await reader.readline()
+        if not line:
+            break
+        response = json.loads(line)
+        responses.append(response)
+        if response['status'] not in ('accepted', 'pending'):
+            open_ids.discard(response.get('id'))
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+async def _serve_forever(args):
+    from benchmark import maze_labirinth, random_labirinth
+
+    maps = {
+        f"random-{args.size}": random_labirinth(args.size, args.size, seed=args.seed),
+        f"maze-{args.size}": maze_labirinth(args.size, args.size, seed=args.seed),
+    }
+    service = SolverService(maps, args.workers, args.max_pending)
+    port = await service.start(args.host, args.port)
+    print(f"Serving {', '.join(maps)} on {args.host}:{port} with {args.workers} workers")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve labyrinth solve requests over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_serve_forever(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+# Test di regressione per la ricerca A*
+#
+#   python -m pytest -q
+import contextlib
+import heapq
+import io
+import math
+import random
+import time
+
+import pytest
+
+from benchmark import random_labirinth
+from external_search import external_astar
+from frontier import frontier_search
+from labirinth import (MOVES, LabirinthProblem, LabState, PathCache, decode_path,
+                       euclidean_batch, map_fingerprint, solve_labirinth)
+
+
+def _random_labirinth(size: int, seed: int, density=0.3) -> list[list[int]]:
+    rng = random.Random(seed)
+    lab = [[1 if rng.random() < density else 0 for _ in range(size)] for _ in range(size)]
+    lab[0][0] = lab[size - 1][size - 1] = 0
+    return lab
+
+
+def _euclidean(end_pos: tuple[int, int]):
+    def heuristic(state: LabState):
+        return math.floor(math.hypot(state.x - end_pos[0], state.y - end_pos[1]))
+    return heuristic
+
+
+def _manhattan(end_pos: tuple[int, int]):
+    def heuristic(state: LabState):
+        return abs(state.x - end_pos[0]) + abs(state.y - end_pos[1])
+    return heuristic
+
+
+def _solve(problem: LabirinthProblem, **options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return problem.astar(show=False, **options)
+
+
+def _optimum(lab: list[list[int]], start_pos: tuple[int, int], end_pos: tuple[int, int],
+             allow_diagonal: bool) -> float:
+    # Dijkstra sulla griglia, indipendente dal motore di ricerca
+    moves = [(dx, dy, cost) for dx, dy, cost, _ in MOVES.values()
+             if allow_diagonal or dx == 0 or dy == 0]
+    best = {start_pos: 0}
+    queue = [(0, start_pos)]
+    while queue:
+        g, (x, y) = heapq.heappop(queue)
+        if (x, y) == end_pos:
+            return g
+        if g > best[(x, y)]:
+            continue
+        for dx, dy, cost in moves:
+            nx, ny = x + dx, y + dy
+            if 0 <= ny < len(lab) and 0 <= nx < len(lab[0]) and lab[ny][nx] == 0:
+                if g + cost < best.get((nx, ny), math.inf):
+                    best[(nx, ny)] = g + cost
+                    heapq.heappush(queue, (g + cost, (nx, ny)))
+    return math.inf
+
+
+def _cost(solution) -> float:
+    return sum(a.cost for a in solution) if solution is not None else math.inf
+
+
+@pytest.mark.parametrize("allow_diagonal", [False, True])
+@pytest.mark.parametrize("seed", range(40))
+def test_astar_is_optimal(seed, allow_diagonal):
+    size = 24
+    lab = _random_labirinth(size, seed)
+    end_pos = (size - 1, size - 1)
+    heuristic = _euclidean(end_pos) if allow_diagonal else _manhattan(end_pos)
+    problem = LabirinthProblem(lab, heuristic, end_pos, (0, 0), allow_diagonal)
+
+    assert _cost(_solve(problem)) == _optimum(lab, (0, 0), end_pos, allow_diagonal)
+
+
+def test_astar_inconsistent_heuristic():
+    # Euristica ammissibile ma non consistente: senza riaperture
+    # il percorso trovato passa per la casella con h = 0 sbagliata
+    lab = [[0] * 8 for _ in range(8)]
+    end_pos = (7, 7)
+    manhattan = _manhattan(end_pos)
+
+    def heuristic(state: LabState):
+        return manhattan(state) if (state.x + state.y) % 3 else 0
+
+    problem = LabirinthProblem(lab, heuristic, end_pos, (0, 0), allow_diagonal=True)
+    assert _cost(_solve(problem)) == _optimum(lab, (0, 0), end_pos, True)
+
+
+def _cached_solve(lab, start_pos, end_pos, cache: PathCache):
+    # Una copia per ogni chiamata: la chiave dipende solo dal contenuto
+    with contextlib.redirect_stdout(io.StringIO()):
+        solve_labirinth([list(row) for row in lab], start_pos, end_pos,
+                        show_steps=False, cache=cache)
+    return cache.lookup(map_fingerprint(lab), True, start_pos, end_pos)
+
+
+def test_path_cache_follows_map_changes():
+    # Un muro aggiunto dopo non deve essere attraversato da un percorso in cache
+    lab = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    cache = PathCache()
+    _cached_solve(lab, (0, 0), (0, 2), cache)
+    lab[1] = [1, 1, 0]
+    solution = _cached_solve(lab, (0, 0), (0, 2), cache)
+
+    x, y = 0, 0
+    for a in solution:
+        x, y = x + a.dx, y + a.dy
+        assert lab[y][x] == 0
+    assert (x, y) == (0, 2)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cached_solutions_are_optimal(seed):
+    # I percorsi ricavati dalla cache (e quelli trovati con l'euristica
+    # stretta dai costi esatti in cache) devono restare ottimi
+    size = 16
+    lab = _random_labirinth(size, seed)
+    end_pos = (size - 1, size - 1)
+    cache = PathCache()
+    for start in [(0, 0), (0, size // 2), (size // 2, 0), (1, 1), (size // 2, size // 2)]:
+        if lab[start[1]][start[0]] != 0:
+            continue
+        solution = _cached_solve(lab, start, end_pos, cache)
+        assert _cost(solution) == _optimum(lab, start, end_pos, True)
+
+
+@pytest.mark.parametrize("batch_size", [4, 8])
+@pytest.mark.parametrize("size", [8, 10, 12, 13, 16])
+def test_batched_astar_is_optimal(size, batch_size):
+    # Il blocco estrae anche stati che non hanno f minimo: la ricerca non
+    # deve fermarsi finché i successori del blocco non sono in frontiera
+    # (ad esempio con size=13 e seed=42 trovava un percorso di costo 26)
+    end_pos = (size - 1, size - 1)
+    for seed in range(150):
+        lab = random_labirinth(size, size, seed=seed)
+        problem = LabirinthProblem(lab, _euclidean(end_pos), end_pos, (0, 0), allow_diagonal=True)
+        problem.batch_heuristic = euclidean_batch(end_pos)
+
+        solution = _solve(problem, batch_size=batch_size)
+        optimum = problem.distance_field([end_pos])[end_pos[1], end_pos[0]]
+        assert _cost(solution) == optimum, f"seed {seed}"
+
+
+def test_terrain_costs_do_not_change_shared_actions():
+    # Le azioni di `decode_path` sono condivise tra le mosse uguali
+    lab = [[0, 0, 0, 0]]
+    problem = LabirinthProblem(lab, lambda s: 0, (3, 0), (0, 0), terrain=[[1, 5, 1, 9]])
+    state, costs = problem.initial_state, []
+    for a in decode_path('E3'):
+        state = a.apply(state)
+        costs.append(state.action.cost)
+    assert costs == [5, 1, 9]
+    assert [a.cost for a in decode_path('E3')] == [1, 1, 1]
+    assert [a.cost for a in _solve(problem)] == [5, 1, 9]
+
+
+@pytest.mark.parametrize("allow_diagonal", [False, True])
+def test_frontier_search_on_terrain(allow_diagonal):
+    # Con il terreno le mosse non costano 1 anche senza diagonali
+    import numpy as np
+
+    size = 12
+    lab = random_labirinth(size, size, seed=3)
+    terrain = np.random.default_rng(3).integers(1, 4, (size, size))
+    terrain[0, 1] = terrain[1, 0] = terrain[1, 1] = 1
+    problem = LabirinthProblem(lab, lambda s: 0, (size - 1, size - 1), (0, 0), allow_diagonal,
+                               terrain=terrain)
+    distances = {}
+    frontier_search(problem, callback=lambda key, d: distances.__setitem__(key, d))
+    field = problem.distance_field()
+    assert distances == {(x, y): field[y, x] for y in range(size) for x in range(size)
+                         if field[y, x] < math.inf}
+
+
+def test_astar_deadline():
+    lab = random_labirinth(64, 64, seed=0)
+    end_pos = (63, 63)
+    problem = LabirinthProblem(lab, _manhattan(end_pos), end_pos, (0, 0))
+    assert _solve(problem, deadline=time.time() - 1) is None
+    assert problem.stats['timeout'] and problem.stats['expanded'] == 0
+    assert _solve(problem, deadline=time.time() + 60) is not None
+    assert not problem.stats['timeout']
+
+
+@pytest.mark.parametrize("max_records", [8, 64])
+def test_external_astar_spills_wide_layers(max_records):
+    # Con h = 0 ogni strato è largo quanto una diagonale della griglia:
+    # i chiusi vanno scritti su disco anche a metà strato
+    size = 40
+    lab = [[0] * size for _ in range(size)]
+    for y in range(4, size - 4):
+        lab[y][size // 2] = 1
+    end_pos = (size - 1, size - 1)
+    problem = LabirinthProblem(lab, lambda s: 0, end_pos, (0, 0))
+    solution = external_astar(problem, max_records=max_records, max_closed_runs=2)
+    assert _cost(solution) == _optimum(lab, (0, 0), end_pos, False)
+    assert problem.stats['peak_buffered'] <= max_records
+
+
+def test_profiler_leaves_classes_unchanged():
+    # Il profiler misura solo la sua ricerca: le classi restano quelle
+    # originali, anche per le ricerche senza profiler nello stesso processo
+    from labirinth import LabAction
+    from profiling import SearchProfiler
+
+    lab = random_labirinth(32, 32, seed=1)
+    end_pos = (31, 31)
+    problem = LabirinthProblem(lab, _manhattan(end_pos), end_pos, (0, 0))
+    classes = dict(vars(LabState)), dict(vars(LabAction))
+    profiler = SearchProfiler()
+    solution = _solve(problem, profiler=profiler)
+
+    assert (dict(vars(LabState)), dict(vars(LabAction))) == classes
+    # Lo stato iniziale è del chiamante: non deve restare legato al profiler
+    assert 'is_final' not in vars(problem.initial_state)
+    assert _cost(solution) == _optimum(lab, (0, 0), end_pos, False)
+    assert all(type(a) is LabAction for a in solution)
+    assert profiler.calls['apply'] > 0 and profiler.calls['is_final'] > 0
+
+
+def test_check_heuristic_with_truncated_exploration():
+    # Con un'esplorazione incompleta il rapporto lo deve dire anche quando
+    # i costi esatti vengono passati, e gli stati non esplorati non sono vicoli ciechi
+    from heuristic_check import check_heuristic, explore
+
+    lab = [[0] * 16 for _ in range(16)]
+    end_pos = (15, 15)
+    problem = LabirinthProblem(lab, _manhattan(end_pos), end_pos, (0, 0))
+    exact = explore(problem, max_states=50)
+    assert not exact[1]
+
+    report = check_heuristic(problem, walks=20, walk_length=30, exact=exact)
+    assert not report['complete']
+    assert report['unknown'] > 0 and report['dead_ends'] == 0
+    assert report['inadmissible'] == 0
+    explored = check_heuristic(problem, walks=20, walk_length=30, max_states=50)
+    assert {k: v for k, v in explored.items() if k != 'eval_us'} == \
+        {k: v for k, v in report.items() if k != 'eval_us'}
+    with pytest.raises(TypeError):
+        check_heuristic(problem, exact=exact[0])
+
+
+def test_hda_star_worker_errors_are_raised():
+    # Un'eccezione in un processo non deve lasciare la ricerca in attesa
+    from parallel_astar import hda_star
+
+    def heuristic(state: LabState):
+        if state.x + state.y > 10:
+            raise RuntimeError("heuristic failed")
+        return 0
+
+    problem = LabirinthProblem(random_labirinth(32, 32, seed=0), heuristic, (31, 31), (0, 0))
+    with pytest.raises(RuntimeError, match="heuristic failed"):
+        hda_star(problem, workers=3)
+
+
+def test_mapped_grid_array_copies(tmp_path):
+    # Solo la vista senza copia usa la memoria del file e ne impedisce la chiusura
+    import numpy as np
+    from mapfile import MappedGrid, write_labirinth
+
+    lab = random_labirinth(8, 8, seed=0)
+    write_labirinth(str(tmp_path / "lab.map"), lab)
+    grid = MappedGrid(str(tmp_path / "lab.map"))
+    copies = [np.array(grid), np.array(grid, copy=True), np.asarray(grid, dtype=np.int64)]
+    view = np.asarray(grid)
+    assert np.shares_memory(view, np.asarray(grid))
+    assert not any(np.shares_memory(c, view) for c in copies)
+    assert all((c == np.array(lab)).all() for c in copies + [view])
+
+    with pytest.raises(BufferError):
+        grid.close()
+    del view
+    grid.close()
+    assert copies[0].sum() == np.array(lab).sum()
+
+
+def test_windowed_makespan_ignores_padding():
+    # L'ultima finestra allunga tutti i percorsi anche dopo l'arrivo dell'ultimo agente
+    from mapf import plan_agents, random_agents
+
+    lab = random_labirinth(32, 32, 0.2, 0)
+    agents = random_agents(lab, 10, 0)
+    paths, stats = plan_agents(lab, agents, window=16)
+    assert stats['arrived'] == len(agents)
+    arrivals = [next(t for t in range(len(p)) if set(p[t:]) == {goal})
+                for p, (_, goal) in zip(paths, agents)]
+    assert stats['makespan'] == max(arrivals) < len(paths[0]) - 1
+
+
+def test_astar_progress():
+    lab = random_labirinth(64, 64, seed=0)
+    end_pos = (63, 63)
+    problem = LabirinthProblem(lab, _manhattan(end_pos), end_pos, (0, 0))
+    reports = []
+    solution = _solve(problem, progress=reports.append, progress_interval=0)
+    # Un avviso per estrazione dalla frontiera, prima di espandere
+    assert reports[0]['expanded'] == 0
+    assert reports[-1]['expanded'] <= problem.stats['expanded'] <= len(reports)
+    assert all(a['expanded'] <= b['expanded'] for a, b in zip(reports, reports[1:]))
+    # Con un'euristica consistente f non diminuisce
+    assert all(a['f'] <= b['f'] for a, b in zip(reports, reports[1:]))
+    assert reports[-1]['f'] <= _cost(solution)
+
+
+def test_service_rejects_non_object_requests():
+    import asyncio
+    from service import SolverService, request
+
+    async def run():
+        service = SolverService({'m': [[0, 0], [0, 0]]}, workers=1)
+        port = await service.start()
+        try:
+            return await request(port, [[1, 2], 5, {'id': 1, 'op': 'solve', 'map': 'm',
+                                                    'start': [0, 0], 'end': [1, 1]}])
+        finally:
+            await service.stop()
+
+    responses = asyncio.run(run())
+    errors = [r for r in responses if r['id'] is None]
+    assert len(errors) == 2 and all(r['status'] == 'error' for r in errors)
+    assert responses[-1]['id'] == 1 and responses[-1]['status'] == 'done'
+
+
+def test_batch_heuristic_is_scaled_on_terrain():
+    # Con il terreno l'euristica a blocchi deve valere quanto quella scalare
+    import numpy as np
+
+    size = 16
+    end_pos = (size - 1, size - 1)
+    lab = random_labirinth(size, size, seed=5)
+    terrain = np.random.default_rng(5).integers(3, 6, (size, size))
+    problem = LabirinthProblem(lab, _euclidean(end_pos), end_pos, (0, 0), True, terrain=terrain)
+    problem.batch_heuristic = euclidean_batch(end_pos)
+    states = [LabState(problem, x, y) for y in range(size) for x in range(size) if lab[y][x] == 0]
+    assert problem.evaluate_heuristic(states) == [problem.heuristic(s) for s in states]
+
+    optimum = problem.distance_field([end_pos])[end_pos[1], end_pos[0]]
+    assert _cost(_solve(problem, batch_size=4)) == optimum
+
+
+def test_path_cache_subpath_hits_refresh_entries():
+    # Un percorso che serve solo tratti non deve essere il primo ad essere eliminato
+    lab = [[0] * 8 for _ in range(8)]
+    cache = PathCache(max_entries=2)
+    _cached_solve(lab, (0, 0), (7, 0), cache)
+    _cached_solve(lab, (0, 7), (7, 7), cache)
+    _cached_solve(lab, (2, 0), (5, 0), cache)
+    _cached_solve(lab, (0, 3), (7, 3), cache)
+
+    fingerprint = map_fingerprint(lab)
+    assert cache.stats['subpath_hits'] == 2
+    assert (fingerprint, True, (0, 0), (7, 0)) in cache.entries
+    assert (fingerprint, True, (0, 7), (7, 7)) not in cache.entries
+
+
+@pytest.mark.parametrize("allow_diagonal", [False, True])
+def test_grid_components_edits(allow_diagonal):
+    # Dopo ogni modifica le componenti sono quelle ricalcolate da capo
+    from labirinth import GridComponents
+
+    rng = random.Random(int(allow_diagonal))
+    lab = random_labirinth(20, 20, 0.3, seed=7)
+    index = GridComponents(lab, allow_diagonal)
+    for _ in range(200):
+        x, y = rng.randrange(20), rng.randrange(20)
+        (index.open_cell if rng.random() < 0.4 else index.close_cell)(x, y)
+        fresh = GridComponents([list(row) for row in lab], allow_diagonal)
+        pairs = {(index.label(x, y), fresh.label(x, y)) for y in range(20) for x in range(20)}
+        assert len({a for a, _ in pairs}) == len({b for _, b in pairs}) == len(pairs)
+
+
+def test_close_cell_relabels_only_the_detached_part():
+    # Staccare una sacca da una mappa grande non deve toccare il resto
+    from labirinth import GridComponents
+
+    size = 400
+    lab = [[0] * size for _ in range(size)]
+    lab[1][0] = lab[1][1] = 1
+    index = GridComponents(lab)
+    before = index.labels.copy()
+    # (2, 0) è l'unico passaggio verso la sacca di (0, 0) e (1, 0)
+    index.close_cell(2, 0)
+
+    changed = {i for i in range(size * size) if before[i] != index.labels[i]}
+    assert changed == {0, 1, 2}
+    assert not index.connected((0, 0), (5, 5))
+    assert index.connected((1, 0), (0, 0)) and index.connected((3, 0), (5, 5))
+    assert index.connected((2, 1), (399, 399))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_theta_star_invalid_endpoints(lazy):
+    from anyangle import theta_star
+
+    lab = [[1, 0, 0], [0, 0, 0], [0, 0, 0]]
+    for start, end in [((0, 0), (2, 2)), ((2, 2), (0, 0)), ((1, 1), (5, 5))]:
+        problem = LabirinthProblem(lab, lambda s: 0, end, start)
+        assert theta_star(problem, lazy=lazy) is None
+    problem = LabirinthProblem(lab, lambda s: 0, (2, 2), (1, 0))
+    assert theta_star(problem, lazy=lazy)[-1] == (2, 2)